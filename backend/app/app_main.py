@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -16,8 +18,8 @@ from core.database import engine, Base
 # 导入所有模型以确保它们被注册
 from models import (
     User, ChatSession, ChatMessage, ChatAttachment, LongTermMemory,
-    KnowledgeBase, Document, IndustryStats, CompanyData, PolicyData,
-    ResearchCheckpoint
+    KnowledgeBase, Document, IngestionJob, ChunkEmbedding, IndustryStats, CompanyData, PolicyData,
+    ResearchCheckpoint, ResearchCheckpointDelta
 )
 
 # 创建所有数据表（如果不存在）
@@ -50,6 +52,63 @@ app.include_router(search_router)
 app.include_router(chat_router)
 app.include_router(research_router)
 
+@app.on_event("startup")
+async def start_research_workers():
+    """按 RESEARCH_WORKERS 派生本地研究任务 worker 进程"""
+    from service.deep_research_v2.worker import start_research_workers as start_workers
+    start_workers()
+
+
+@app.on_event("startup")
+async def start_ingestion_workers():
+    """按 INGESTION_WORKERS 派生本地文档入库 worker 进程"""
+    from service.ingestion_service import start_ingestion_workers as start_workers
+    start_workers()
+
+
+@app.on_event("shutdown")
+async def stop_ingestion_workers():
+    """通知本地文档入库 worker 进程退出"""
+    from service.ingestion_service import stop_ingestion_workers as stop_workers
+    await asyncio.to_thread(stop_workers)
+
+
+@app.on_event("startup")
+async def warm_chart_sandbox():
+    """内联模式下研究在 API 进程中执行，后台预热图表沙箱进程（队列模式下由研究 worker 进程预热）"""
+    from service.deep_research_v2.jobs import RESEARCH_JOB_QUEUE
+    from service.deep_research_v2.sandbox_pool import warm_sandbox_pool
+    if not RESEARCH_JOB_QUEUE:
+        warm_sandbox_pool()
+
+
+@app.on_event("shutdown")
+async def close_extraction_pool():
+    """关闭本地文档解析进程池"""
+    from service.local_extraction_service import shutdown_extraction_pool
+    shutdown_extraction_pool()
+
+
+@app.on_event("shutdown")
+async def stop_research_workers():
+    """通知本地研究任务 worker 进程退出"""
+    from service.deep_research_v2.worker import stop_research_workers as stop_workers
+    await asyncio.to_thread(stop_workers)
+
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    """关闭共享的 LLM 连接池、网页抓取连接、正文提取进程池和图表沙箱进程"""
+    from service.deep_research_v2.llm_client import get_llm_pool
+    from service.deep_research_v2.web_fetcher import get_web_fetcher
+    from service.deep_research_v2.html_extract import shutdown_extract_pool
+    from service.deep_research_v2.sandbox_pool import shutdown_sandbox_pool
+    await get_llm_pool().aclose()
+    await get_web_fetcher().aclose()
+    shutdown_extract_pool()
+    shutdown_sandbox_pool()
+
+
 @app.get("/hello")
 async def hello_world():
     """
@@ -1,12 +1,17 @@
 """Redis 客户端"""
 import os
 import json
+import asyncio
+import weakref
 from typing import Optional, Any
 import redis
+import redis.asyncio as aioredis
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "") or None
+# 异步连接用于 pub/sub 和阻塞读取事件流，每个研究会话和订阅者各占一个连接
+REDIS_ASYNC_MAX_CONNECTIONS = int(os.getenv("REDIS_ASYNC_MAX_CONNECTIONS", "200"))
 
 # 创建 Redis 连接池
 redis_pool = redis.ConnectionPool(
@@ -23,6 +28,26 @@ def get_redis_client() -> redis.Redis:
     return redis.Redis(connection_pool=redis_pool)
 
 
+# 异步连接池绑定在创建它的事件循环上，每个事件循环一个
+_async_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.ConnectionPool]" = weakref.WeakKeyDictionary()
+
+
+def get_async_redis_client() -> aioredis.Redis:
+    """获取异步 Redis 客户端（必须在事件循环中调用）"""
+    loop = asyncio.get_running_loop()
+    pool = _async_pools.get(loop)
+    if pool is None:
+        pool = aioredis.ConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD,
+            decode_responses=True,
+            max_connections=REDIS_ASYNC_MAX_CONNECTIONS
+        )
+        _async_pools[loop] = pool
+    return aioredis.Redis(connection_pool=pool)
+
+
 class RedisCache:
     """Redis 缓存工具类"""
 
@@ -1,8 +1,8 @@
 from .user import User
 from .chat import ChatSession, ChatMessage, ChatAttachment, LongTermMemory
-from .knowledge import KnowledgeBase, Document
+from .knowledge import KnowledgeBase, Document, IngestionJob, ChunkEmbedding
 from .industry_data import IndustryStats, CompanyData, PolicyData
-from .research import ResearchCheckpoint
+from .research import ResearchCheckpoint, ResearchCheckpointDelta
 
 __all__ = [
     "User",
@@ -12,8 +12,11 @@ __all__ = [
     "LongTermMemory",
     "KnowledgeBase",
     "Document",
+    "IngestionJob",
+    "ChunkEmbedding",
     "IndustryStats",
     "CompanyData",
     "PolicyData",
     "ResearchCheckpoint",
+    "ResearchCheckpointDelta",
 ]
@@ -1,7 +1,7 @@
 """知识库相关模型"""
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, BigInteger
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, BigInteger, Index, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -45,3 +45,57 @@ class Document(Base):
     # 关系
     knowledge_base = relationship("KnowledgeBase", back_populates="documents")
     user = relationship("User", back_populates="documents")
+
+
+class IngestionJob(Base):
+    """文档入库任务模型 - 由入库 worker 进程领取执行"""
+    __tablename__ = "ingestion_jobs"
+    __table_args__ = (Index("ix_ingestion_jobs_status_next_run", "status", "next_run_at"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    knowledge_base_id = Column(UUID(as_uuid=True), ForeignKey("knowledge_bases.id", ondelete="CASCADE"), index=True)
+    index_name = Column(String(255), nullable=False)  # Milvus 集合名
+    file_path = Column(String(500), nullable=False)
+    status = Column(String(16), default="queued")  # queued, running, completed, failed
+    stage = Column(String(32))  # parsing, chunking, embedding, inserting
+    progress = Column(Integer, default=0)  # 0-100
+    attempts = Column(Integer, default=0)  # 已执行次数
+    max_attempts = Column(Integer, default=3)
+    worker_id = Column(String(128))  # 执行中的 worker
+    error_message = Column(Text)
+    next_run_at = Column(DateTime, default=datetime.utcnow)  # 重试时推迟
+    heartbeat_at = Column(DateTime)  # worker 心跳，超时视为 worker 已退出
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "id": str(self.id),
+            "document_id": str(self.document_id) if self.document_id else None,
+            "knowledge_base_id": str(self.knowledge_base_id) if self.knowledge_base_id else None,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress or 0,
+            "attempts": self.attempts or 0,
+            "max_attempts": self.max_attempts,
+            "error_message": self.error_message,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class ChunkEmbedding(Base):
+    """切片向量缓存 - 按切片内容哈希缓存向量，重新入库时内容未变的切片不再调用向量化接口"""
+    __tablename__ = "chunk_embeddings"
+
+    model = Column(String(64), primary_key=True)  # 向量模型及维度，如 text-embedding-v4:1024
+    content_hash = Column(String(64), primary_key=True)  # 切片内容的 SHA-256
+    vector = Column(LargeBinary, nullable=False)  # float32 字节
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,7 +1,7 @@
 """研究检查点模型"""
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 
@@ -18,7 +18,7 @@ class ResearchCheckpoint(Base):
     query = Column(Text, nullable=False)  # 原始查询
     phase = Column(String(32), nullable=False)  # planning/researching/analyzing/writing/reviewing/completed
     iteration = Column(Integer, default=0)  # 当前迭代次数
-    state_json = Column(JSONB, nullable=False)  # 完整的 ResearchState
+    state_json = Column(JSONB, nullable=False)  # ResearchState 基线快照（需叠加增量）
     status = Column(String(16), default="running")  # running/paused/completed/failed
     error_message = Column(Text)  # 错误信息（如果失败）
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -41,3 +41,16 @@ class ResearchCheckpoint(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+class ResearchCheckpointDelta(Base):
+    """研究检查点增量 - 基线快照之后每次保存的状态变化，按 seq 顺序叠加"""
+    __tablename__ = "research_checkpoint_deltas"
+    __table_args__ = (UniqueConstraint("session_id", "seq", name="uq_checkpoint_delta_seq"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(64), index=True, nullable=False)  # 研究会话 ID
+    seq = Column(Integer, nullable=False)  # 增量序号（压缩后重新从 1 开始）
+    phase = Column(String(32))  # 保存时所处阶段
+    delta_json = Column(JSONB, nullable=False)  # 增量内容 {set, patch, extend, update, remove, delete}
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,6 +1,7 @@
 """聊天附件路由"""
 import os
 import shutil
+import asyncio
 from typing import List, Optional
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks, Form
@@ -11,6 +12,7 @@ from models.chat import ChatAttachment, ChatSession
 from models.user import User
 from router.auth_router import get_current_user
 from schemas.chat import AttachmentResponse, AttachmentListResponse
+from service.local_extraction_service import extract_text, supports
 
 router = APIRouter(prefix="/attachments", tags=["聊天附件"])
 
@@ -67,17 +69,19 @@ async def process_attachment(attachment_id: str, file_path: str, db_session_fact
             content_text = ""
             ext = get_file_extension(att.filename)
 
-            # 简单的文本提取（可以扩展为使用 DocMind）
             if ext in {'.txt', '.md', '.py', '.js', '.ts', '.json', '.yaml', '.yml', '.xml', '.csv', '.html'}:
                 # 直接读取文本文件
                 with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                     content_text = f.read()
+            elif ext in {'.pdf', '.docx', '.xlsx'} and supports(att.filename):
+                # 本地解析（在解析进程池中执行，不阻塞事件循环，也不占用 API 进程的 GIL）
+                content_text = await asyncio.to_thread(extract_text, file_path, att.filename)
+                if not content_text.strip():
+                    content_text = f"[文件无可提取的文本: {att.filename}]"
             elif ext == '.pdf':
-                # PDF 需要特殊处理，这里暂时跳过
-                # 可以后续集成 DocMind 或 PyPDF2
                 content_text = f"[PDF 文件: {att.filename}]"
             elif ext in {'.docx', '.doc'}:
-                # Word 文档需要特殊处理
+                # 旧版 .doc 格式无法本地解析
                 content_text = f"[Word 文档: {att.filename}]"
             elif ext in {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}:
                 # 图片文件
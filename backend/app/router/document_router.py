@@ -56,8 +56,8 @@ async def upload_document(
                 detail=f"Unsupported file type: {file_extension}. Supported types: {', '.join(sorted(SUPPORTED_FILE_TYPES))}"
             )
         
-        # 生成唯一的文档ID
-        document_id = str(uuid.uuid4())
+        # 文档ID由索引名和文件名决定：重新上传同名文件时与已写入的切片比对，只写入变化的切片
+        document_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{index_name}/{file.filename}"))
         
         # 保存上传的文件到临时位置
         temp_file_path = f"/tmp/{file.filename}"
@@ -70,6 +70,7 @@ async def upload_document(
             file_path=temp_file_path,
             file_name=file.filename,
             index_name=index_name,
+            doc_id=document_id,
             chunk_size=500
         )
 
@@ -1,9 +1,11 @@
 """知识库管理路由"""
 import os
 import shutil
+import asyncio
 from typing import List
-from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
+from uuid import UUID, uuid4
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from core.database import get_db
@@ -17,6 +19,13 @@ from schemas.knowledge import (
     KnowledgeBaseWithDocuments,
     DocumentResponse,
     DocumentUploadResponse,
+    IngestionJobResponse,
+)
+from service.ingestion_service import (
+    enqueue_ingestion,
+    cancel_queued_ingestion,
+    get_ingestion_job,
+    EVENT_CHANNEL_PREFIX,
 )
 
 router = APIRouter(prefix="/knowledge-bases", tags=["知识库管理"])
@@ -41,6 +50,12 @@ def get_file_extension(filename: str) -> str:
     return os.path.splitext(filename)[1].lower()
 
 
+def save_upload(source, file_path: str) -> None:
+    """把上传文件写入磁盘（阻塞操作，在线程中调用）"""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(source, buffer)
+
+
 def kb_to_response(kb: KnowledgeBase) -> KnowledgeBaseResponse:
     """将知识库模型转换为响应"""
     return KnowledgeBaseResponse(
@@ -69,54 +84,6 @@ def doc_to_response(doc: Document) -> DocumentResponse:
     )
 
 
-async def process_document(document_id: str, file_path: str, kb_name: str, db_session_factory):
-    """后台处理文档（使用 DocMind 解析、向量化、存储到ES）"""
-    from service.docmind_service import process_document_with_docmind
-
-    # 创建新的数据库会话
-    db = db_session_factory()
-    try:
-        # 获取文档记录
-        doc = db.query(Document).filter(Document.id == document_id).first()
-        if not doc:
-            return
-
-        # 更新状态为处理中
-        doc.status = "processing"
-        db.commit()
-
-        try:
-            # 使用知识库名称作为ES索引名
-            index_name = f"kb_{kb_name}".lower().replace(" ", "_")
-
-            # 使用 DocMind 处理文档
-            result = process_document_with_docmind(
-                file_path=file_path,
-                file_name=doc.filename,
-                index_name=index_name,
-            )
-
-            if result["success"]:
-                doc.status = "completed"
-                doc.chunk_count = result["document_count"]
-                doc.error_message = None
-            else:
-                doc.status = "failed"
-                doc.error_message = result["message"]
-
-        except Exception as e:
-            doc.status = "failed"
-            doc.error_message = str(e)
-
-        db.commit()
-
-    finally:
-        db.close()
-        # 清理临时文件
-        if os.path.exists(file_path):
-            os.remove(file_path)
-
-
 @router.get("", response_model=List[KnowledgeBaseResponse])
 async def get_knowledge_bases(
     current_user: User = Depends(get_current_user_required),
@@ -286,7 +253,6 @@ async def delete_knowledge_base(
 @router.post("/{kb_id}/documents", response_model=DocumentUploadResponse)
 async def upload_document(
     kb_id: str,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user_required),
     db: Session = Depends(get_db),
@@ -320,11 +286,10 @@ async def upload_document(
             detail=f"不支持的文件类型: {ext}，支持的类型: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
-    # 保存文件到临时目录
-    file_path = os.path.join(UPLOAD_DIR, f"{kb_uuid}_{file.filename}")
+    # 保存文件到临时目录（每次上传独立路径，同名文件的入库任务互不覆盖、互不删除）
+    file_path = os.path.join(UPLOAD_DIR, f"{kb_uuid}_{uuid4().hex}_{file.filename}")
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await asyncio.to_thread(save_upload, file.file, file_path)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -334,41 +299,56 @@ async def upload_document(
     # 获取文件大小
     file_size = os.path.getsize(file_path)
 
-    # 创建文档记录
-    doc = Document(
-        knowledge_base_id=kb_uuid,
-        user_id=current_user.id,
-        filename=file.filename,
-        file_type=ext[1:] if ext else None,  # 去掉点
-        file_size=file_size,
-        file_path=file_path,
-        status="pending",
-    )
-    db.add(doc)
+    # 同一知识库中已有同名文档时沿用原记录重新入库：切片按文档 ID 和内容比对，
+    # 只向量化新增或修改的切片，并删除旧版本中已不存在的切片
+    doc = db.query(Document).filter(
+        Document.knowledge_base_id == kb_uuid,
+        Document.filename == file.filename
+    ).order_by(Document.created_at.desc()).with_for_update().first()
+
+    if doc is not None:
+        if not cancel_queued_ingestion(db, doc.id):
+            db.rollback()
+            await asyncio.to_thread(os.remove, file_path)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="同名文档正在处理中，请处理完成后再上传"
+            )
+        doc.file_type = ext[1:] if ext else None
+        doc.file_size = file_size
+        doc.file_path = file_path
+        doc.status = "pending"
+        doc.error_message = None
+        message = "同名文档已存在，正在后台重新处理"
+    else:
+        # 创建文档记录
+        doc = Document(
+            knowledge_base_id=kb_uuid,
+            user_id=current_user.id,
+            filename=file.filename,
+            file_type=ext[1:] if ext else None,  # 去掉点
+            file_size=file_size,
+            file_path=file_path,
+            status="pending",
+        )
+        db.add(doc)
 
-    # 更新知识库文档计数
-    kb.document_count = (kb.document_count or 0) + 1
+        # 更新知识库文档计数
+        kb.document_count = (kb.document_count or 0) + 1
+        message = "文档已上传，正在后台处理中"
 
     db.commit()
     db.refresh(doc)
 
-    # 获取数据库会话工厂
-    from core.database import SessionLocal
-
-    # 在后台处理文档
-    background_tasks.add_task(
-        process_document,
-        str(doc.id),
-        file_path,
-        kb.name,
-        SessionLocal
-    )
+    # 创建入库任务，由入库 worker 进程解析和向量化
+    job = enqueue_ingestion(db, doc, kb.name)
 
     return DocumentUploadResponse(
         id=str(doc.id),
         filename=doc.filename,
         process_status="pending",
-        message="文档已上传，正在后台处理中"
+        message=message,
+        job_id=str(job.id)
     )
 
 
@@ -406,6 +386,100 @@ async def get_documents(
     return [doc_to_response(doc) for doc in documents]
 
 
+@router.get("/{kb_id}/documents/{doc_id}/ingestion", response_model=IngestionJobResponse)
+async def get_document_ingestion(
+    kb_id: str,
+    doc_id: str,
+    current_user: User = Depends(get_current_user_required),
+    db: Session = Depends(get_db),
+):
+    """获取文档入库任务状态（进度、重试次数、错误信息）"""
+    try:
+        kb_uuid = UUID(kb_id)
+        doc_uuid = UUID(doc_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的ID格式"
+        )
+
+    # 验证知识库存在
+    kb = db.query(KnowledgeBase).filter(
+        KnowledgeBase.id == kb_uuid,
+        KnowledgeBase.user_id == current_user.id
+    ).first()
+
+    if not kb:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="知识库不存在"
+        )
+
+    job = get_ingestion_job(db, doc_uuid)
+    if not job or job.knowledge_base_id != kb_uuid:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="入库任务不存在"
+        )
+
+    return IngestionJobResponse(**job.to_dict())
+
+
+@router.get("/{kb_id}/ingestion/events")
+async def stream_ingestion_events(
+    kb_id: str,
+    current_user: User = Depends(get_current_user_required),
+    db: Session = Depends(get_db),
+):
+    """订阅知识库的入库进度事件（SSE）"""
+    try:
+        kb_uuid = UUID(kb_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的知识库ID格式"
+        )
+
+    kb = db.query(KnowledgeBase).filter(
+        KnowledgeBase.id == kb_uuid,
+        KnowledgeBase.user_id == current_user.id
+    ).first()
+
+    if not kb:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="知识库不存在"
+        )
+
+    from core.redis_client import get_async_redis_client
+
+    async def event_generator():
+        pubsub = get_async_redis_client().pubsub()
+        channel = f"{EVENT_CHANNEL_PREFIX}{kb_uuid}"
+        await pubsub.subscribe(channel)
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=15.0)
+                if message is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                data = message.get("data")
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                yield f"data: {data}\n\n"
+        except asyncio.CancelledError:
+            raise
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.delete("/{kb_id}/documents/{doc_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_document(
     kb_id: str,
@@ -1,22 +1,42 @@
 from typing import Dict, Any, Optional, Literal
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-from starlette.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
+from starlette.status import (
+    HTTP_200_OK, HTTP_304_NOT_MODIFIED, HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND,
+    HTTP_429_TOO_MANY_REQUESTS, HTTP_500_INTERNAL_SERVER_ERROR, HTTP_503_SERVICE_UNAVAILABLE
+)
+import os
+import asyncio
 import logging
+import uuid
 
 from service import ResearchService, ServiceConfig
 from service.dr_g import serialize_event  # 导入序列化函数
 from core.redis_client import cache  # 导入 Redis 缓存
+from service.blob_store import get_blob_store, is_valid_key, content_type_for
+from service.search_cache import get_search_cache_stats
 
 # V2 导入
 from service.deep_research_v2.service import DeepResearchV2Service
+from service.deep_research_v2.event_bus import cancel_local_session, publish_cancel, CANCEL_KEY_PREFIX
+from service.deep_research_v2.event_stream import get_event_stream_store
+from service.deep_research_v2.jobs import get_job_manager, JobRejected
+from router.auth_router import get_current_user
+from models.user import User
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ResearchRouter")
 
-# 取消标志 key 前缀
-CANCEL_KEY_PREFIX = "research:cancel:"
+# 未登录用户的匿名标识（前端生成并保存在 localStorage 中）
+ANONYMOUS_ID_HEADER = "x-anonymous-id"
+# 可信反向代理地址（逗号分隔）；来自这些地址的请求按 X-Forwarded-For 中的客户端地址识别未登录用户
+TRUSTED_PROXIES = {
+    addr.strip() for addr in os.getenv("RESEARCH_TRUSTED_PROXIES", "").split(",") if addr.strip()
+}
+
+# 内容寻址的 blob 永不变化，可长期缓存
+BLOB_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 # 创建路由实例
 router = APIRouter(prefix="/research", tags=["research"])
@@ -30,6 +50,7 @@ class ResearchRequest(BaseModel):
     search_web: Optional[bool] = True  # 是否搜索网络
     search_local: Optional[bool] = True  # 是否搜索本地知识库
     version: Optional[Literal["v1", "v2"]] = "v2"  # 版本选择 (v2: 多智能体架构，推荐)
+    session_id: Optional[str] = None  # 会话ID（V2 断线重连时传入，配合 Last-Event-ID 续传）
 
     class Config:
         json_schema_extra = {
@@ -60,10 +81,118 @@ def get_research_service_v2():
     # 直接创建服务，配置从 llm_config.py 读取
     return DeepResearchV2Service()
 
+
+def get_user_key(request: Request, current_user: Optional[User]) -> str:
+    """
+    并发限制和会话归属使用的用户标识
+
+    登录用户使用用户 ID；未登录用户优先使用请求头中的匿名标识，
+    没有时使用客户端地址（经可信代理转发时取 X-Forwarded-For 中最后一个非代理地址）。
+    反向代理或 Vite 开发代理后面所有请求的来源地址相同，只按来源地址识别会让所有未登录用户共享并发名额。
+    """
+    if current_user is not None:
+        return f"user:{current_user.id}"
+
+    anonymous_id = request.headers.get(ANONYMOUS_ID_HEADER)
+    if anonymous_id:
+        try:
+            return f"anon:{uuid.UUID(anonymous_id)}"
+        except ValueError:
+            pass
+
+    host = request.client.host if request.client else "unknown"
+    if host in TRUSTED_PROXIES:
+        forwarded = [addr.strip() for addr in request.headers.get("x-forwarded-for", "").split(",") if addr.strip()]
+        while forwarded and forwarded[-1] in TRUSTED_PROXIES:
+            forwarded.pop()
+        if forwarded:
+            host = forwarded[-1]
+    return f"ip:{host}"
+
+
+async def ensure_session_owner(session_id: str, user_key: str) -> None:
+    """
+    校验研究会话属于当前用户，不属于时返回 403
+
+    按任务记录中的提交者判断；任务记录已过期时按检查点的用户判断，两者都没有记录时不限制。
+    """
+    owner = await get_job_manager().get_owner(session_id)
+    if owner is None:
+        from service.checkpoint_service import get_checkpoint_service
+        info = await asyncio.to_thread(get_checkpoint_service().get_checkpoint_info, session_id)
+        if info and info.get("user_id"):
+            owner = f"user:{info['user_id']}"
+    if owner is not None and owner != user_key:
+        logger.warning(f"Research session {session_id} access denied for {user_key}")
+        raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="Not allowed to access this research session")
+
+
+async def open_research_stream_v2(
+    query: str,
+    user_key: str,
+    session_id: Optional[str] = None,
+    kb_name: Optional[str] = None,
+    resume: bool = False,
+    last_event_id: Optional[str] = None,
+    user_id: Optional[str] = None
+):
+    """
+    提交（或接入）V2 研究任务，返回 SSE 订阅生成器
+
+    会话仍在运行、或客户端携带 Last-Event-ID 重连已有事件流时，只订阅事件流回放，不重新提交任务；
+    接入前校验会话属于当前用户。新任务的会话 ID 由服务端生成（research_start / job_queued 事件中返回），
+    只有从检查点恢复时沿用已有的会话 ID。
+    新任务需通过准入检查，未通过时返回 429（用户并发超限）或 503（服务繁忙）。
+
+    Args:
+        query: 研究问题
+        user_key: 并发限制和会话归属校验使用的用户标识
+        session_id: 会话ID（断线重连或恢复时传入）
+        kb_name: 本地知识库名称
+        resume: 是否从检查点恢复
+        last_event_id: 客户端最后收到的事件 ID
+        user_id: 用户ID（用于检查点）
+    """
+    store = get_event_stream_store()
+
+    if session_id and await store.is_running(session_id):
+        await ensure_session_owner(session_id, user_key)
+        logger.info(f"Reattaching to running research {session_id} from event {last_event_id or 'start'}")
+        return store.subscribe(session_id, last_event_id)
+
+    if session_id and last_event_id and not resume and await store.exists(session_id):
+        await ensure_session_owner(session_id, user_key)
+        logger.info(f"Replaying research {session_id} from event {last_event_id}")
+        return store.subscribe(session_id, last_event_id)
+
+    if resume and session_id:
+        # 从检查点恢复：清除上一次运行留下的取消标志
+        await asyncio.to_thread(clear_cancel_flag, session_id)
+    else:
+        session_id = str(uuid.uuid4())
+    try:
+        await get_job_manager().submit(
+            session_id=session_id,
+            query=query,
+            user_key=user_key,
+            kb_name=kb_name,
+            resume=resume,
+            user_id=user_id
+        )
+    except JobRejected as e:
+        logger.warning(f"Research job rejected ({e.reason}) for {user_key}")
+        status_code = HTTP_429_TOO_MANY_REQUESTS if e.reason == "user_limit" else HTTP_503_SERVICE_UNAVAILABLE
+        raise HTTPException(status_code=status_code, detail=str(e), headers={"Retry-After": "30"})
+
+    return store.subscribe(session_id, last_event_id)
+
+
 @router.post("/stream", status_code=HTTP_200_OK)
 async def stream_research(
     request: ResearchRequest,
-    services: Dict[str, Any] = Depends(get_research_service)
+    http_request: Request,
+    services: Dict[str, Any] = Depends(get_research_service),
+    current_user: Optional[User] = Depends(get_current_user)
 ):
     """
     深度研究接口 - 流式输出
@@ -75,6 +204,8 @@ async def stream_research(
     - v1: 传统 ReAct 架构
     - v2: 多智能体协作网络（推荐）
 
+    V2 研究在后台运行，每个事件带有 SSE id；断线后携带 session_id 和 Last-Event-ID 重新请求即可续传。
+
     Args:
         request: 包含研究问题和配置的请求体
 
@@ -84,14 +215,18 @@ async def stream_research(
     # 根据版本选择服务
     if request.version == "v2":
         logger.info(f"Using DeepResearch V2 for query: {request.query[:50]}...")
-        service_v2 = get_research_service_v2()
+        events = await open_research_stream_v2(
+            query=request.query,
+            user_key=get_user_key(http_request, current_user),
+            session_id=request.session_id,
+            kb_name=request.kb_name,
+            last_event_id=http_request.headers.get("last-event-id"),
+            user_id=str(current_user.id) if current_user else None
+        )
 
         async def generate_sse_v2():
             try:
-                async for event in service_v2.research(
-                    query=request.query,
-                    kb_name=request.kb_name
-                ):
+                async for event in events:
                     yield event
             except Exception as e:
                 logger.error(f"V2 Research error: {e}")
@@ -129,13 +264,16 @@ async def stream_research(
 
 @router.get("/stream", status_code=HTTP_200_OK)
 async def stream_research_get(
+    http_request: Request,
     query: str = Query(..., description="研究问题", example="中国安责险的市场现状和未来发展趋势是什么？"),
     max_iterations: int = Query(3, description="最大迭代次数", ge=1, le=5),
     kb_name: Optional[str] = Query(None, description="本地知识库名称"),
     search_web: bool = Query(True, description="是否搜索网络"),
     search_local: bool = Query(True, description="是否搜索本地知识库"),
     version: str = Query("v1", description="版本: v1 或 v2"),
-    services: Dict[str, Any] = Depends(get_research_service)
+    session_id: Optional[str] = Query(None, description="会话ID（V2 断线重连时传入）"),
+    services: Dict[str, Any] = Depends(get_research_service),
+    current_user: Optional[User] = Depends(get_current_user)
 ):
     """
     深度研究接口 - GET方式流式输出
@@ -158,14 +296,18 @@ async def stream_research_get(
     # 根据版本选择服务
     if version == "v2":
         logger.info(f"Using DeepResearch V2 (GET) for query: {query[:50]}...")
-        service_v2 = get_research_service_v2()
+        events = await open_research_stream_v2(
+            query=query,
+            user_key=get_user_key(http_request, current_user),
+            session_id=session_id,
+            kb_name=kb_name,
+            last_event_id=http_request.headers.get("last-event-id"),
+            user_id=str(current_user.id) if current_user else None
+        )
 
         async def generate_sse_v2():
             try:
-                async for event in service_v2.research(
-                    query=query,
-                    kb_name=kb_name
-                ):
+                async for event in events:
                     yield event
             except Exception as e:
                 logger.error(f"V2 Research error: {e}")
@@ -271,8 +413,8 @@ async def test_wizard_endpoint():
                 {
                     "title": c.get("title", ""),
                     "type": c.get("type", ""),
-                    "has_image": bool(c.get("image_base64")),
-                    "image_length": len(c.get("image_base64", "")) if c.get("image_base64") else 0
+                    "has_image": bool(c.get("image_url")),
+                    "image_url": c.get("image_url")
                 }
                 for c in charts
             ],
@@ -288,10 +430,105 @@ async def test_wizard_endpoint():
         }
 
 
+@router.get("/cache/stats", status_code=HTTP_200_OK)
+async def get_cache_stats():
+    """
+    获取搜索结果缓存的命中、未命中、淘汰统计
+
+    统计按进程计数，只包含本 API 进程（内联模式下的研究）；队列模式下各研究 worker 在每个任务结束时记录日志。
+
+    Returns:
+        每个 namespace 的统计（local_hits / redis_hits / misses / evictions / hit_rate 等）
+    """
+    return {"success": True, "caches": get_search_cache_stats()}
+
+
+@router.get("/blobs/{key}")
+async def get_blob(key: str, request: Request):
+    """
+    获取研究过程中生成的二进制内容（如图表图片）
+
+    内容按哈希寻址、永不变化，返回长期缓存头；带 If-None-Match 的请求直接返回 304。
+
+    Args:
+        key: 内容 key（<sha256>.<扩展名>）
+    """
+    if not is_valid_key(key):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Blob not found")
+
+    etag = f'"{key}"'
+    headers = {"Cache-Control": BLOB_CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+
+    data = await asyncio.to_thread(get_blob_store().get, key)
+    if data is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Blob not found")
+
+    return Response(content=data, media_type=content_type_for(key), headers=headers)
+
+
+@router.get("/events/{session_id}", status_code=HTTP_200_OK)
+async def subscribe_research_events(
+    session_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Query(None, description="从该事件 ID 之后开始回放（也可用 Last-Event-ID 请求头）"),
+    current_user: Optional[User] = Depends(get_current_user)
+):
+    """
+    订阅 V2 研究的事件流（断线重连、多端查看同一研究）
+
+    研究在后台运行，不随连接断开而中止；本接口只回放和推送事件，不会启动研究。
+    只有研究的提交者可以订阅（见 ensure_session_owner）。
+
+    Args:
+        session_id: 会话ID
+        last_event_id: 客户端最后收到的事件 ID
+
+    Returns:
+        流式响应，SSE 格式的研究事件
+    """
+    store = get_event_stream_store()
+    if not await store.exists(session_id) and not await store.is_running(session_id):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="No event stream for this session")
+    await ensure_session_owner(session_id, get_user_key(request, current_user))
+
+    return StreamingResponse(
+        store.subscribe(session_id, request.headers.get("last-event-id") or last_event_id),
+        media_type="text/event-stream"
+    )
+
+
+@router.get("/jobs/{session_id}", status_code=HTTP_200_OK)
+async def get_research_job(
+    session_id: str,
+    request: Request,
+    current_user: Optional[User] = Depends(get_current_user)
+):
+    """
+    获取研究任务状态（只有研究的提交者可以查看）
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        任务状态（queued / running / completed / failed / cancelled / expired / interrupted）、排队位置、执行 worker 等
+    """
+    job = await get_job_manager().get_job(session_id)
+    if not job:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Research job not found")
+    await ensure_session_owner(session_id, get_user_key(request, current_user))
+    return {"success": True, "job": job}
+
+
 @router.post("/cancel/{session_id}", status_code=HTTP_200_OK)
-async def cancel_research(session_id: str):
+async def cancel_research(
+    session_id: str,
+    request: Request,
+    current_user: Optional[User] = Depends(get_current_user)
+):
     """
-    取消正在进行的研究任务
+    取消正在进行的研究任务（只有研究的提交者可以取消）
 
     Args:
         session_id: 会话ID
@@ -299,10 +536,17 @@ async def cancel_research(session_id: str):
     Returns:
         取消确认信息
     """
+    await ensure_session_owner(session_id, get_user_key(request, current_user))
     try:
         # 设置取消标志到 Redis，有效期 5 分钟
         cancel_key = f"{CANCEL_KEY_PREFIX}{session_id}"
         cache.set(cancel_key, {"cancelled": True}, expire=300)
+        # 尚未开始执行的任务直接移出队列；运行中的会话推送取消信号：
+        # 本进程内的会话直接通知，其他进程（worker）通过 Redis pub/sub 通知
+        if await get_job_manager().cancel_queued(session_id):
+            logger.info(f"Queued research job removed: {session_id}")
+        elif not cancel_local_session(session_id):
+            await asyncio.to_thread(publish_cancel, session_id)
         logger.info(f"Research cancelled for session: {session_id}")
         return {"success": True, "message": "Research cancellation requested"}
     except Exception as e:
@@ -327,7 +571,7 @@ def is_research_cancelled(session_id: str) -> bool:
 
 def clear_cancel_flag(session_id: str):
     """
-    清除取消标志（研究开始时调用）
+    清除取消标志（从检查点恢复研究前调用）
 
     Args:
         session_id: 会话ID
@@ -410,10 +654,16 @@ async def delete_checkpoint(session_id: str):
 
 
 @router.post("/resume/{session_id}", status_code=HTTP_200_OK)
-async def resume_research(session_id: str):
+async def resume_research(
+    session_id: str,
+    request: Request,
+    current_user: Optional[User] = Depends(get_current_user)
+):
     """
     恢复研究任务（从检查点）
 
+    研究仍在后台运行时直接接入事件流（携带 Last-Event-ID 时从该事件之后回放），不会重新执行。
+
     Args:
         session_id: 会话ID
 
@@ -421,6 +671,15 @@ async def resume_research(session_id: str):
         流式响应，从检查点继续研究
     """
     try:
+        last_event_id = request.headers.get("last-event-id")
+        await ensure_session_owner(session_id, get_user_key(request, current_user))
+        store = get_event_stream_store()
+        if await store.is_running(session_id):
+            return StreamingResponse(
+                store.subscribe(session_id, last_event_id),
+                media_type="text/event-stream"
+            )
+
         from service.checkpoint_service import get_checkpoint_service
         checkpoint_service = get_checkpoint_service()
         info = checkpoint_service.get_checkpoint_info(session_id)
@@ -432,21 +691,30 @@ async def resume_research(session_id: str):
             )
 
         if info.get("status") == "completed":
+            # 已完成的研究只能回放事件流
+            if last_event_id and await store.exists(session_id):
+                return StreamingResponse(
+                    store.subscribe(session_id, last_event_id),
+                    media_type="text/event-stream"
+                )
             raise HTTPException(
                 status_code=HTTP_400_BAD_REQUEST,
                 detail="Research already completed"
             )
 
-        # 使用 V2 服务恢复
-        service_v2 = get_research_service_v2()
+        # 使用 V2 服务恢复（后台运行，事件追加到同一会话事件流）
+        events = await open_research_stream_v2(
+            query=info.get("query", ""),
+            user_key=get_user_key(request, current_user),
+            session_id=session_id,
+            resume=True,
+            last_event_id=last_event_id,
+            user_id=info.get("user_id")
+        )
 
         async def generate_sse():
             try:
-                async for event in service_v2.research(
-                    query=info.get("query", ""),
-                    session_id=session_id,
-                    resume=True
-                ):
+                async for event in events:
                     yield event
             except Exception as e:
                 logger.error(f"Resume research error: {e}")
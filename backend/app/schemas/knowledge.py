@@ -57,6 +57,25 @@ class DocumentUploadResponse(BaseModel):
     filename: str = Field(..., description="文件名")
     process_status: str = Field(..., description="处理状态")
     message: str = Field(..., description="消息")
+    job_id: Optional[str] = Field(None, description="入库任务ID")
+
+
+class IngestionJobResponse(BaseModel):
+    """文档入库任务响应"""
+    id: str = Field(..., description="任务ID")
+    document_id: Optional[str] = Field(None, description="文档ID")
+    knowledge_base_id: Optional[str] = Field(None, description="知识库ID")
+    status: str = Field(..., description="任务状态: queued, running, completed, failed")
+    stage: Optional[str] = Field(None, description="当前阶段: parsing, chunking, embedding, inserting")
+    progress: int = Field(0, description="进度(0-100)")
+    attempts: int = Field(0, description="已执行次数")
+    max_attempts: int = Field(..., description="最大执行次数")
+    error_message: Optional[str] = Field(None, description="最近一次错误信息")
+    next_run_at: Optional[datetime] = Field(None, description="下次执行时间（重试时）")
+    started_at: Optional[datetime] = Field(None, description="开始时间")
+    finished_at: Optional[datetime] = Field(None, description="结束时间")
+    created_at: datetime = Field(..., description="创建时间")
+    updated_at: datetime = Field(..., description="更新时间")
 
 
 class KnowledgeBaseWithDocuments(KnowledgeBaseResponse):
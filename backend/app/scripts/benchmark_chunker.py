@@ -0,0 +1,160 @@
+"""
+文本切分基准测试
+
+在数 MB 的输入上对比原按字符切分的实现（每个窗口最多 rfind 七种分隔符）与 TextChunker 的吞吐量。
+输入包括：中英文混合正文、缺少标点的长文本、含标题和表格的 Markdown，
+以及 data/ 目录下示例 PDF 的解析文本（需要 pypdf）。
+
+使用方法（在 backend/app 目录下）：
+    python -m scripts.benchmark_chunker
+    python -m scripts.benchmark_chunker --size-mb 8 --max-tokens 500 --overlap 50
+"""
+
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    "data"
+)
+
+SENTENCES = [
+    "公司2024年实现营业收入1,234.5亿元，同比增长12.3%。",
+    "新能源业务占比持续提升，毛利率改善明显！",
+    "Revenue grew 3.5% year over year, driven by overseas orders.",
+    "我们维持“买入”评级；目标价上调至8.50元。",
+    "风险提示：原材料价格波动、海外需求不及预期？",
+    "The board approved a dividend of RMB 0.25 per share.",
+]
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 500, overlap: int = 50):
+    """原 docmind_service.chunk_text 的实现（按字符切分），作为对比基线"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        if end < len(text):
+            for sep in ['。', '！', '？', '.', '!', '?', '\n']:
+                last_sep = chunk.rfind(sep)
+                if last_sep > chunk_size // 2:
+                    chunk = chunk[:last_sep + 1]
+                    end = start + last_sep + 1
+                    break
+        if chunk.strip():
+            chunks.append(chunk.strip())
+        start = end - overlap
+    return chunks
+
+
+def make_prose(size: int, rng: random.Random) -> str:
+    parts, length = [], 0
+    while length < size:
+        paragraph = "".join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 12))) + "\n\n"
+        parts.append(paragraph)
+        length += len(paragraph)
+    return "".join(parts)
+
+
+def make_unpunctuated(size: int, rng: random.Random) -> str:
+    words = ["营业收入", "同比增长", "毛利率", "新能源", "订单", "海外", "产能", "利润"]
+    parts, length = [], 0
+    while length < size:
+        word = rng.choice(words)
+        parts.append(word)
+        length += len(word)
+    return "".join(parts)
+
+
+def make_markdown(size: int, rng: random.Random) -> str:
+    parts, length, section = [], 0, 0
+    while length < size:
+        section += 1
+        block = [f"## {section}. 经营分析\n"]
+        block.append("".join(rng.choice(SENTENCES) for _ in range(rng.randint(4, 10))) + "\n")
+        block.append("| 指标 | 2023 | 2024 |\n| --- | --- | --- |\n")
+        block.extend(f"| 指标{row} | {rng.random() * 100:.1f} | {rng.random() * 100:.1f} |\n" for row in range(rng.randint(3, 30)))
+        text = "".join(block)
+        parts.append(text)
+        length += len(text)
+    return "".join(parts)
+
+
+def load_pdf_text(size: int) -> str:
+    try:
+        from service.local_extraction_service import PDF_AVAILABLE, _extract_pdf_pages, _pdf_page_count
+    except ImportError:
+        return ""
+    files = sorted(glob.glob(os.path.join(DATA_DIR, "*.pdf")))
+    if not PDF_AVAILABLE or not files:
+        return ""
+    text = "".join(
+        "".join(page + "\n" for page in _extract_pdf_pages(path, 0, _pdf_page_count(path)))
+        for path in files
+    )
+    if not text:
+        return ""
+    return (text * (size // len(text) + 1))[:size]
+
+
+def measure(func, rounds: int):
+    best, result = None, None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本切分基准测试")
+    parser.add_argument("--size-mb", type=float, default=4, help="每种输入的大小（MB，按字符计）")
+    parser.add_argument("--max-tokens", type=int, default=500, help="TextChunker 每个切片的 token 上限")
+    parser.add_argument("--chunk-size", type=int, default=500, help="原实现每个切片的字符数")
+    parser.add_argument("--overlap", type=int, default=50, help="重叠大小")
+    parser.add_argument("--rounds", type=int, default=3, help="测试轮数（取最快一轮）")
+    args = parser.parse_args()
+
+    from service.text_chunker import TextChunker, get_token_counter, estimate_tokens
+
+    size = int(args.size_mb * 1024 * 1024)
+    rng = random.Random(42)
+    inputs = {
+        "中英文正文": make_prose(size, rng),
+        "无标点长文本": make_unpunctuated(size, rng),
+        "Markdown 标题/表格": make_markdown(size, rng),
+    }
+    pdf_text = load_pdf_text(size)
+    if pdf_text:
+        inputs["示例 PDF 文本"] = pdf_text
+
+    counter = get_token_counter()
+    print(f"token 计数: {'估算' if counter is estimate_tokens else 'tiktoken cl100k_base'}")
+    chunker = TextChunker(max_tokens=args.max_tokens, overlap_tokens=args.overlap, count_tokens=counter)
+
+    print("=" * 86)
+    print(f"{'输入':<18} {'字符数':>10} {'原实现(s)':>10} {'MB/s':>8} {'切片':>8} "
+          f"{'TextChunker(s)':>15} {'MB/s':>8} {'切片':>8}")
+    print("-" * 86)
+    for name, text in inputs.items():
+        megabytes = len(text) / 1024 / 1024
+        legacy_time, legacy_chunks = measure(lambda: legacy_chunk_text(text, args.chunk_size, args.overlap), args.rounds)
+        new_time, new_chunks = measure(lambda: chunker.chunk(text), args.rounds)
+        print(
+            f"{name:<18} {len(text):>10} {legacy_time:>10.2f} {megabytes / legacy_time:>8.1f} {len(legacy_chunks):>8} "
+            f"{new_time:>15.2f} {megabytes / new_time:>8.1f} {len(new_chunks):>8}"
+        )
+    print("-" * 86)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+本地文档解析基准测试
+
+对比单进程逐页解析与进程池并行解析的耗时，默认使用仓库 data/ 目录下的示例 PDF。
+
+使用方法（在 backend/app 目录下）：
+    python -m scripts.benchmark_local_extraction
+    python -m scripts.benchmark_local_extraction --workers 8 --page-batch 4 path/to/a.pdf
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    "data"
+)
+
+
+def run(files, workers: int, page_batch: int, rounds: int):
+    # 进程数需要在导入前设置
+    os.environ["LOCAL_EXTRACTION_WORKERS"] = str(workers)
+    from service import local_extraction_service as extraction
+
+    if not extraction.PDF_AVAILABLE:
+        print("未安装 pypdf（或 PyPDF2），无法运行")
+        return
+
+    print(f"进程数: {workers}, 每个任务页数: {page_batch}, 轮数: {rounds}")
+    print("=" * 78)
+    print(f"{'文件':<20} {'页数':>6} {'字符数':>10} {'单进程(s)':>12} {'进程池(s)':>12} {'加速比':>8}")
+    print("-" * 78)
+
+    # 预热进程池（启动进程、导入 pypdf 的时间不计入）
+    list(extraction.iter_blocks(files[0], page_batch=page_batch))
+
+    total_serial = total_parallel = 0.0
+    for path in files:
+        pages = extraction._pdf_page_count(path)
+
+        serial = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            text = "".join(extraction._extract_pdf_pages(path, 0, pages))
+            serial.append(time.perf_counter() - started)
+
+        parallel = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            parallel_text = "".join(extraction.iter_blocks(path, page_batch=page_batch))
+            parallel.append(time.perf_counter() - started)
+
+        if parallel_text != text:
+            print(f"警告: {os.path.basename(path)} 并行解析结果与单进程不一致")
+
+        best_serial, best_parallel = min(serial), min(parallel)
+        total_serial += best_serial
+        total_parallel += best_parallel
+        print(
+            f"{os.path.basename(path):<20} {pages:>6} {len(text):>10} "
+            f"{best_serial:>12.2f} {best_parallel:>12.2f} {best_serial / best_parallel:>7.1f}x"
+        )
+
+    print("-" * 78)
+    print(f"{'合计':<20} {'':>6} {'':>10} {total_serial:>12.2f} {total_parallel:>12.2f} "
+          f"{total_serial / total_parallel:>7.1f}x")
+    extraction.shutdown_extraction_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地文档解析基准测试")
+    parser.add_argument("files", nargs="*", help="PDF 文件（默认 data/*.pdf）")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="解析进程数")
+    parser.add_argument("--page-batch", type=int, default=8, help="每个解析任务的页数")
+    parser.add_argument("--rounds", type=int, default=3, help="每个文件的测试轮数（取最快一轮）")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(DATA_DIR, "*.pdf")))
+    if not files:
+        print(f"未找到 PDF 文件: {DATA_DIR}")
+        return
+    run(files, args.workers, args.page_batch, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
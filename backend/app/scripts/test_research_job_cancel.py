@@ -0,0 +1,132 @@
+"""
+DeepResearch V2.0 研究任务取消测试
+
+覆盖 worker 已取出任务（BRPOPLPUSH）、会话尚未订阅取消通知时的取消：
+1. cancel_queued 在队列中找不到任务，取消接口只能写入取消标志并发布 pub/sub 通知（此时无人订阅）
+2. worker 执行任务时应检查取消标志，不再启动研究，任务状态为 cancelled
+3. 会话事件总线在订阅建立后应补查取消标志，订阅前发出的取消不会丢失
+
+需要可访问的 Redis（REDIS_HOST / REDIS_PORT），不调用 LLM 和搜索服务。
+
+使用方法：
+    python -m scripts.test_research_job_cancel
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+)
+logger = logging.getLogger("JobCancelTest")
+
+WORKER_ID = "test-worker:cancel"
+
+
+async def test_cancel_after_claim():
+    """worker 已取出任务后取消：任务不执行，状态为 cancelled"""
+    from core.redis_client import cache, get_async_redis_client
+    from router.research_router import CANCEL_KEY_PREFIX
+    from service.deep_research_v2.event_bus import publish_cancel
+    from service.deep_research_v2.jobs import ResearchJobManager, PROCESSING_KEY_PREFIX, QUEUE_KEY
+
+    manager = ResearchJobManager()
+    session_id = f"test-{uuid.uuid4()}"
+    spec = {
+        "session_id": session_id,
+        "query": "取消测试",
+        "kb_name": None,
+        "resume": False,
+        "user_id": None,
+        "user_key": f"test:{session_id}",
+        "created_at": time.time(),
+    }
+
+    print("\n[1] worker 取出任务后取消")
+    await manager.store.reserve(session_id, 60)
+    verdict = await manager._admit(spec, True)
+    assert verdict == "ok", f"准入失败: {verdict}"
+
+    # 队列中可能有其他任务，取到本测试的任务为止，其余任务按原顺序放回出队端
+    client = get_async_redis_client()
+    processing = f"{PROCESSING_KEY_PREFIX}{WORKER_ID}"
+    others = []
+    claimed = None
+    while True:
+        claimed = await manager.claim(WORKER_ID, timeout=1)
+        if claimed is None or claimed["session_id"] == session_id:
+            break
+        others.append(claimed["session_id"])
+    for other in reversed(others):
+        await client.lrem(processing, 0, other)
+        await client.rpush(QUEUE_KEY, other)
+    assert claimed and claimed["session_id"] == session_id, "未取到测试任务"
+
+    # 取消接口的执行路径：移出队列失败 → 写入标志 → 发布通知（无人订阅）
+    removed = await manager.cancel_queued(session_id)
+    assert not removed, "任务已被 worker 取出，不应再能移出队列"
+    cache.set(f"{CANCEL_KEY_PREFIX}{session_id}", {"cancelled": True}, expire=300)
+    await asyncio.to_thread(publish_cancel, session_id)
+
+    status = await manager.execute(claimed, WORKER_ID)
+    assert status == "cancelled", f"任务状态应为 cancelled，实际为 {status}"
+
+    job = await manager.get_job(session_id)
+    assert job and job.get("status") == "cancelled", f"任务记录状态错误: {job}"
+    assert not job.get("started_at"), "已取消的任务不应开始执行"
+
+    assert session_id not in await client.lrange(processing, 0, -1), "任务应已移出处理列表"
+
+    cache.delete(f"{CANCEL_KEY_PREFIX}{session_id}")
+    print("✅ 取消未丢失，任务未执行")
+
+
+async def test_cancel_before_subscribe():
+    """订阅建立前发出的取消：事件总线启动后补查取消标志"""
+    from core.redis_client import cache
+    from router.research_router import CANCEL_KEY_PREFIX, is_research_cancelled
+    from service.deep_research_v2.event_bus import SessionEventBus, publish_cancel
+
+    session_id = f"test-{uuid.uuid4()}"
+
+    print("\n[2] 事件总线订阅前取消")
+    cache.set(f"{CANCEL_KEY_PREFIX}{session_id}", {"cancelled": True}, expire=300)
+    await asyncio.to_thread(publish_cancel, session_id)
+
+    bus = SessionEventBus(session_id, check_cancel_flag=is_research_cancelled)
+    await bus.start()
+    try:
+        await asyncio.wait_for(bus.cancelled.wait(), timeout=5)
+    except asyncio.TimeoutError:
+        raise AssertionError("订阅前发出的取消被丢弃")
+    finally:
+        await bus.close()
+        cache.delete(f"{CANCEL_KEY_PREFIX}{session_id}")
+    print("✅ 事件总线收到订阅前的取消")
+
+
+async def main():
+    print("\n" + "=" * 60)
+    print("研究任务取消测试")
+    print("=" * 60)
+    try:
+        await test_cancel_after_claim()
+        await test_cancel_before_subscribe()
+    except AssertionError as e:
+        print(f"❌ 测试失败: {e}")
+        return False
+    print("\n✅ 全部通过")
+    return True
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,142 @@
+"""
+内容寻址的二进制对象存储
+
+图表图片等二进制内容按 sha256 写入一次，状态、SSE 事件和检查点中只保存引用（key + URL），
+不再把 base64 图片复制到各处。
+
+key 格式为 "<sha256>.<扩展名>"，相同内容得到相同 key，天然去重且永不变化，可以长期缓存。
+
+后端可插拔，通过 BLOB_STORE_BACKEND 选择（默认 local），新后端用 register_blob_backend 注册。
+
+可通过环境变量配置：
+    BLOB_STORE_BACKEND   存储后端（默认 local）
+    BLOB_STORE_DIR       local 后端的根目录（默认 backend/data/research_blobs；
+                         检查点和报告中的图表只保存引用，目录须持久化，容器部署时应挂载数据卷）
+    BLOB_URL_PREFIX      对外访问路径前缀（默认 /research/blobs）
+"""
+
+import os
+import re
+import hashlib
+import logging
+import mimetypes
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("BlobStore")
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_DIR = os.getenv(
+    "BLOB_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "research_blobs")
+)
+BLOB_URL_PREFIX = os.getenv("BLOB_URL_PREFIX", "/research/blobs")
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,8}$")
+
+
+def is_valid_key(key: str) -> bool:
+    """校验 key 格式（防止路径穿越）"""
+    return bool(key) and bool(_KEY_RE.match(key))
+
+
+def content_type_for(key: str) -> str:
+    """根据 key 的扩展名推断 Content-Type"""
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+class BlobStore(ABC):
+    """二进制对象存储基类"""
+
+    def __init__(self, url_prefix: str = BLOB_URL_PREFIX):
+        self.url_prefix = url_prefix.rstrip("/")
+
+    @staticmethod
+    def make_key(data: bytes, ext: str) -> str:
+        return f"{hashlib.sha256(data).hexdigest()}.{ext.lstrip('.').lower()}"
+
+    @abstractmethod
+    def put(self, data: bytes, ext: str = "png") -> str:
+        """写入内容（已存在则跳过），返回 key"""
+        pass
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """读取内容，不存在返回 None"""
+        pass
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    def url_for(self, key: str) -> str:
+        """对外访问地址"""
+        return f"{self.url_prefix}/{key}"
+
+
+class LocalBlobStore(BlobStore):
+    """本地文件系统存储，按 key 前两级分片"""
+
+    def __init__(self, root: str = BLOB_STORE_DIR, url_prefix: str = BLOB_URL_PREFIX):
+        super().__init__(url_prefix)
+        self.root = root
+
+    def path_for(self, key: str) -> str:
+        if not is_valid_key(key):
+            raise ValueError(f"Invalid blob key: {key}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, data: bytes, ext: str = "png") -> str:
+        key = self.make_key(data, ext)
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return key
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        logger.debug(f"Stored blob {key} ({len(data)} bytes)")
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.path_for(key), "rb") as f:
+                return f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def exists(self, key: str) -> bool:
+        try:
+            return os.path.exists(self.path_for(key))
+        except ValueError:
+            return False
+
+
+# 后端注册表
+_backends: Dict[str, Callable[[], BlobStore]] = {
+    "local": LocalBlobStore,
+}
+
+
+def register_blob_backend(name: str, factory: Callable[[], BlobStore]) -> None:
+    """注册存储后端（如对象存储），通过 BLOB_STORE_BACKEND 选择"""
+    _backends[name] = factory
+
+
+# 单例
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """获取二进制对象存储实例"""
+    global _blob_store
+    if _blob_store is None:
+        factory = _backends.get(BLOB_STORE_BACKEND)
+        if factory is None:
+            logger.warning(f"Unknown blob store backend '{BLOB_STORE_BACKEND}', falling back to local")
+            factory = LocalBlobStore
+        _blob_store = factory()
+    return _blob_store
@@ -1,22 +1,66 @@
-"""检查点服务 - 用于保存和恢复深度研究状态"""
+"""检查点服务 - 用于保存和恢复深度研究状态
+
+检查点由两部分组成：
+1. research_checkpoints.state_json - 基线快照
+2. research_checkpoint_deltas - 基线之后每次保存的增量（新增事实、新章节、变化的大纲条目等）
+
+每次保存只写入与上次保存相比的变化，写入量与变化大小成正比：
+进程内保留每个会话上次保存的状态快照，逐项直接比较（==），只有变化的元素才序列化；
+每个进程内首次保存某会话、或增量数达到 CHECKPOINT_COMPACT_EVERY 时，写入完整快照并清空增量（压缩）。
+加载时以基线快照为起点按 seq 顺序叠加增量。
+
+会话结束（完成、失败、取消或连接断开）时调用 release 释放保留的快照。
+"""
+import os
 import json
 import logging
+import threading
 from typing import Dict, Any, Optional, List
 from uuid import UUID
 from datetime import datetime
 from sqlalchemy.orm import Session
 
-from models.research import ResearchCheckpoint
+from models.research import ResearchCheckpoint, ResearchCheckpointDelta
 from core.database import SessionLocal
 
 logger = logging.getLogger(__name__)
 
+# 每累计多少个增量压缩一次
+CHECKPOINT_COMPACT_EVERY = int(os.getenv("CHECKPOINT_COMPACT_EVERY", "10"))
+
+
+def _encode(value: Any) -> Any:
+    """转为可存储的 JSON 值；不可序列化的对象转为字符串"""
+    return json.loads(json.dumps(value, default=str, ensure_ascii=False))
+
+
+def _apply_delta(state: Dict[str, Any], delta: Dict[str, Any]) -> None:
+    """把一个增量叠加到状态上"""
+    for key, value in delta.get("set", {}).items():
+        state[key] = value
+    for key, patch in delta.get("patch", {}).items():
+        items = state.setdefault(key, [])
+        for index, item in patch.items():
+            items[int(index)] = item
+    for key, items in delta.get("extend", {}).items():
+        state.setdefault(key, []).extend(items)
+    for key, updates in delta.get("update", {}).items():
+        state.setdefault(key, {}).update(updates)
+    for key, sub_keys in delta.get("remove", {}).items():
+        target = state.get(key, {})
+        for sub_key in sub_keys:
+            target.pop(sub_key, None)
+    for key in delta.get("delete", []):
+        state.pop(key, None)
+
 
 class CheckpointService:
     """检查点服务"""
 
     def __init__(self):
-        pass
+        # 每个会话最近一次保存的状态 {session_id: {"seq": int, "state": {...}}}
+        self._trackers: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
 
     def _get_db(self) -> Session:
         """获取数据库会话"""
@@ -31,14 +75,19 @@ class CheckpointService:
         """
         保存检查点
 
+        state 会被保留用于下次保存时比较，调用方之后不能再修改它（CheckpointWriter 传入的是 snapshot_state 的深拷贝）。
+
         Args:
             session_id: 研究会话 ID
-            state: ResearchState 字典
+            state: ResearchState 字典（快照）
             user_id: 用户 ID（可选）
 
         Returns:
             检查点 ID，失败返回 None
         """
+        with self._lock:
+            tracker = self._trackers.pop(session_id, None)
+
         db = self._get_db()
         try:
             # 提取关键信息
@@ -46,39 +95,65 @@ class CheckpointService:
             phase = state.get("phase", "planning")
             iteration = state.get("iteration", 0)
 
-            # 清理 state 中不可序列化的内容
-            clean_state = self._clean_state_for_storage(state)
-
             # 查找现有检查点
             existing = db.query(ResearchCheckpoint).filter(
                 ResearchCheckpoint.session_id == session_id
             ).first()
 
-            if existing:
-                # 更新现有检查点
+            if existing and tracker and tracker["seq"] < CHECKPOINT_COMPACT_EVERY:
+                # 增量保存：只写入变化
+                delta = self._diff_state(state, tracker["state"])
+                seq = tracker["seq"]
+                if delta:
+                    seq += 1
+                    db.add(ResearchCheckpointDelta(
+                        session_id=session_id,
+                        seq=seq,
+                        phase=phase,
+                        delta_json=delta,
+                    ))
                 existing.phase = phase
                 existing.iteration = iteration
-                existing.state_json = clean_state
                 existing.status = "running"
                 existing.updated_at = datetime.utcnow()
                 checkpoint_id = str(existing.id)
+                mode = f"delta #{seq}" if delta else "unchanged"
             else:
-                # 创建新检查点
-                checkpoint = ResearchCheckpoint(
-                    session_id=session_id,
-                    user_id=UUID(user_id) if user_id else None,
-                    query=query,
-                    phase=phase,
-                    iteration=iteration,
-                    state_json=clean_state,
-                    status="running",
-                )
-                db.add(checkpoint)
-                db.flush()
-                checkpoint_id = str(checkpoint.id)
+                # 完整快照（压缩）：写入基线并清空增量
+                clean_state = self._snapshot_state(state)
+                seq = 0
+                db.query(ResearchCheckpointDelta).filter(
+                    ResearchCheckpointDelta.session_id == session_id
+                ).delete(synchronize_session=False)
+
+                if existing:
+                    existing.phase = phase
+                    existing.iteration = iteration
+                    existing.state_json = clean_state
+                    existing.status = "running"
+                    existing.updated_at = datetime.utcnow()
+                    checkpoint_id = str(existing.id)
+                else:
+                    checkpoint = ResearchCheckpoint(
+                        session_id=session_id,
+                        user_id=UUID(user_id) if user_id else None,
+                        query=query,
+                        phase=phase,
+                        iteration=iteration,
+                        state_json=clean_state,
+                        status="running",
+                    )
+                    db.add(checkpoint)
+                    db.flush()
+                    checkpoint_id = str(checkpoint.id)
+                mode = "snapshot"
 
             db.commit()
-            logger.info(f"Checkpoint saved for session {session_id}, phase: {phase}")
+
+            with self._lock:
+                self._trackers[session_id] = {"seq": seq, "state": state}
+
+            logger.info(f"Checkpoint saved for session {session_id}, phase: {phase} ({mode})")
             return checkpoint_id
 
         except Exception as e:
@@ -107,7 +182,15 @@ class CheckpointService:
             if not checkpoint:
                 return None
 
-            return checkpoint.state_json
+            state = dict(checkpoint.state_json)
+            deltas = db.query(ResearchCheckpointDelta).filter(
+                ResearchCheckpointDelta.session_id == session_id
+            ).order_by(ResearchCheckpointDelta.seq.asc()).all()
+
+            for delta in deltas:
+                _apply_delta(state, delta.delta_json)
+
+            return state
 
         except Exception as e:
             logger.error(f"Failed to load checkpoint: {e}")
@@ -212,6 +295,9 @@ class CheckpointService:
             checkpoint.updated_at = datetime.utcnow()
 
             db.commit()
+
+            if status != "running":
+                self.release(session_id)
             return True
 
         except Exception as e:
@@ -233,11 +319,16 @@ class CheckpointService:
         """
         db = self._get_db()
         try:
+            db.query(ResearchCheckpointDelta).filter(
+                ResearchCheckpointDelta.session_id == session_id
+            ).delete(synchronize_session=False)
             deleted = db.query(ResearchCheckpoint).filter(
                 ResearchCheckpoint.session_id == session_id
             ).delete()
 
             db.commit()
+
+            self.release(session_id)
             return deleted > 0
 
         except Exception as e:
@@ -247,27 +338,75 @@ class CheckpointService:
         finally:
             db.close()
 
-    def _clean_state_for_storage(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    def release(self, session_id: str) -> None:
+        """释放会话保留的状态快照（会话结束时调用；之后再保存会写入完整快照）"""
+        with self._lock:
+            self._trackers.pop(session_id, None)
+
+    def _snapshot_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
-        清理状态以便存储
+        生成完整快照
 
-        移除不可序列化的内容，保留可恢复的数据
+        以 "_" 开头的运行时字段（消息队列、user_id 等）不保存。
         """
-        clean = {}
+        return {key: _encode(value) for key, value in state.items() if not key.startswith("_")}
+
+    def _diff_state(self, state: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        计算与上次保存相比的增量（只序列化变化的元素）
+
+        - 列表：变化的元素按下标 patch，新增的元素 extend；变短时整体 set
+        - 字典：变化或新增的键 update，删除的键 remove
+        - 其他值：变化时 set
+
+        Returns:
+            增量，无变化时为空字典
+        """
+        delta: Dict[str, Any] = {}
+
+        def put(op: str, key: str, value: Any):
+            delta.setdefault(op, {})[key] = value
+
         for key, value in state.items():
-            try:
-                # 尝试序列化测试
-                json.dumps(value, default=str)
-                clean[key] = value
-            except (TypeError, ValueError):
-                # 跳过不可序列化的值，或转换为字符串
-                if isinstance(value, (list, tuple)):
-                    clean[key] = [str(v) for v in value]
-                elif isinstance(value, dict):
-                    clean[key] = self._clean_state_for_storage(value)
+            if key.startswith("_"):
+                continue
+            if key not in previous:
+                put("set", key, _encode(value))
+                continue
+            old = previous[key]
+            if old is value:
+                continue
+
+            if isinstance(value, (list, tuple)):
+                if isinstance(old, (list, tuple)) and len(old) <= len(value):
+                    patch = {str(i): _encode(item) for i, item in enumerate(value[:len(old)]) if item != old[i]}
+                    extend = [_encode(item) for item in value[len(old):]]
+                    if patch:
+                        put("patch", key, patch)
+                    if extend:
+                        put("extend", key, extend)
+                elif old != value:
+                    put("set", key, _encode(value))
+
+            elif isinstance(value, dict):
+                if isinstance(old, dict):
+                    updates = {str(k): _encode(v) for k, v in value.items() if k not in old or old[k] != v}
+                    removed = [str(k) for k in old if k not in value]
+                    if updates:
+                        put("update", key, updates)
+                    if removed:
+                        put("remove", key, removed)
                 else:
-                    clean[key] = str(value)
-        return clean
+                    put("set", key, _encode(value))
+
+            elif old != value:
+                put("set", key, _encode(value))
+
+        deleted = [key for key in previous if key not in state and not key.startswith("_")]
+        if deleted:
+            delta["delete"] = deleted
+
+        return delta
 
 
 # 单例
@@ -6,14 +6,15 @@ DeepResearch V2.0 - Agent 基类
 
 import json
 import logging
-import asyncio
+import re
 import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List, Union
-from datetime import datetime
-from openai import OpenAI
+from typing import Dict, Any, Optional, List, Union, Callable
+from openai import AsyncOpenAI
 
 from ..state import ResearchState, AgentLog
+from ..llm_client import get_llm_pool
+from ..event_log import EventRecord, LogRecord
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
 
@@ -36,9 +37,15 @@ class BaseAgent(ABC):
         self.name = name
         self.role = role
         self.model = model
-        self.client = OpenAI(api_key=llm_api_key, base_url=llm_base_url)
+        self.llm_api_key = llm_api_key
+        self.llm_base_url = llm_base_url
         self.logger = logging.getLogger(f"Agent.{name}")
 
+    @property
+    def client(self) -> AsyncOpenAI:
+        """共享的异步 LLM 客户端（进程级连接池，需在事件循环中访问）"""
+        return get_llm_pool().get_client(self.llm_api_key, self.llm_base_url)
+
     @abstractmethod
     async def process(self, state: ResearchState) -> ResearchState:
         """
@@ -89,10 +96,9 @@ class BaseAgent(ABC):
             if json_mode:
                 kwargs["response_format"] = {"type": "json_object"}
 
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                **kwargs
-            )
+            # 按模型限制并发，超出的请求在此排队而不是占用线程
+            async with get_llm_pool().get_semaphore(self.model):
+                response = await self.client.chat.completions.create(**kwargs)
 
             content = response.choices[0].message.content
             duration = int((time.time() - start_time) * 1000)
@@ -105,6 +111,96 @@ class BaseAgent(ABC):
             self.logger.error(f"LLM call failed: {e}")
             raise
 
+    async def call_llm_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        on_delta: Callable[[str], None],
+        json_mode: bool = True,
+        temperature: float = 0.3,
+        max_tokens: int = 16000,
+        on_retry: Optional[Callable[[], None]] = None,
+        stream_retries: int = 1
+    ) -> str:
+        """
+        流式调用 LLM
+
+        每收到一段增量文本就回调 on_delta，最终返回完整响应文本，
+        可直接交给 parse_json_response 解析。
+        流在中途断开时重新请求，重试前回调 on_retry，调用方据此丢弃已推送的部分内容。
+
+        Args:
+            system_prompt: 系统提示
+            user_prompt: 用户提示
+            on_delta: 增量文本回调
+            json_mode: 是否强制JSON输出
+            temperature: 温度参数
+            max_tokens: 最大token数
+            on_retry: 重试前的回调
+            stream_retries: 流中断后的重试次数
+
+        Returns:
+            LLM 完整响应文本
+        """
+        kwargs = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+
+        attempt = 0
+        while True:
+            start_time = time.time()
+            first_token_ms = None
+            parts: List[str] = []
+
+            try:
+                async with get_llm_pool().get_semaphore(self.model):
+                    stream = await self.client.chat.completions.create(**kwargs)
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if not delta:
+                            continue
+                        if first_token_ms is None:
+                            first_token_ms = int((time.time() - start_time) * 1000)
+                        parts.append(delta)
+                        try:
+                            on_delta(delta)
+                        except Exception as e:
+                            self.logger.warning(f"Stream delta callback failed: {e}")
+
+                content = "".join(parts)
+                duration = int((time.time() - start_time) * 1000)
+
+                self.logger.info(
+                    f"LLM stream completed in {duration}ms (first token {first_token_ms}ms), "
+                    f"response length: {len(content)}"
+                )
+
+                return content
+
+            except Exception as e:
+                if attempt >= stream_retries:
+                    self.logger.error(f"LLM stream failed: {e}")
+                    raise
+                attempt += 1
+                self.logger.warning(f"LLM stream failed after {len(parts)} deltas, retrying ({attempt}/{stream_retries}): {e}")
+                if on_retry is not None:
+                    try:
+                        on_retry()
+                    except Exception as callback_error:
+                        self.logger.warning(f"Stream retry callback failed: {callback_error}")
+
     def parse_json_response(self, response: str) -> Dict[str, Any]:
         """安全解析JSON响应，处理markdown代码块和格式问题"""
         import re
@@ -231,7 +327,7 @@ class BaseAgent(ABC):
         else:
             return obj
 
-    def add_message(self, state: ResearchState, event_type: str, content: Any) -> None:
+    def add_message(self, state: ResearchState, event_type: str, content: Any, persist: bool = True) -> None:
         """
         添加消息到状态（用于SSE流式输出）
 
@@ -239,20 +335,19 @@ class BaseAgent(ABC):
             state: 研究状态
             event_type: 事件类型
             content: 消息内容
+            persist: 是否记录到 state["messages"]（增量片段等瞬时事件只推送不记录）
         """
-        message = {
-            "type": event_type,
-            "agent": self.name,
-            "timestamp": datetime.now().isoformat(),
-            "content": content
-        }
-        state["messages"].append(message)
+        record = EventRecord(event_type, self.name, content)
+        message = record.to_dict()
+        if persist:
+            state["messages"].append(record)
 
         # 如果有消息队列，立即推送（支持实时流式输出）
         if "_message_queue" in state and state["_message_queue"] is not None:
             try:
                 state["_message_queue"].put_nowait(message)
-                self.logger.info(f"[SSE] Queued event: {event_type} (queue size: {state['_message_queue'].qsize()})")
+                if persist:
+                    self.logger.info(f"[SSE] Queued event: {event_type} (queue size: {state['_message_queue'].qsize()})")
             except Exception as e:
                 self.logger.warning(f"Failed to push message to queue: {e}")
         else:
@@ -268,16 +363,121 @@ class BaseAgent(ABC):
         tokens_used: int = 0
     ) -> None:
         """添加执行日志"""
-        log = {
-            "timestamp": datetime.now().isoformat(),
-            "agent": self.name,
-            "action": action,
-            "input_summary": input_summary,
-            "output_summary": output_summary,
-            "duration_ms": duration_ms,
-            "tokens_used": tokens_used
-        }
-        state["logs"].append(log)
+        state["logs"].append(LogRecord(
+            agent=self.name,
+            action=action,
+            input_summary=input_summary,
+            output_summary=output_summary,
+            duration_ms=duration_ms,
+            tokens_used=tokens_used
+        ))
+
+
+class JsonFieldStreamExtractor:
+    """
+    增量 JSON 字段提取器
+
+    从流式输出的 JSON 文本中实时解码指定字符串字段的值，
+    例如 {"content": "..."} 中的 content，每次 feed 返回新解码出的字符。
+    """
+
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, field: str = "content"):
+        self._key = '"' + field + '"'
+        self._key_pattern = re.compile(re.escape(self._key) + r'\s*:\s*"')
+        # 键之后可能还没收全的部分（空白、冒号）
+        self._partial_tail = re.compile(r'\s*(?::\s*)?')
+        # 只保留尚未处理的文本：找到字段前是可能构成键的尾部，找到字段后是被切断的转义序列
+        self._buffer = ""
+        self._started = False
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """字段值是否已完整解码"""
+        return self._done
+
+    def _partial_start(self, buf: str) -> int:
+        """buf 中可能是未收全的键的起始位置（之前的文本不可能再匹配）"""
+        last = buf.rfind(self._key)
+        if last >= 0 and self._partial_tail.fullmatch(buf, last + len(self._key)):
+            return last
+        return max(0, len(buf) - len(self._key) + 1)
+
+    def feed(self, text: str) -> str:
+        """输入一段增量文本，返回本次新解码出的字段内容（每段文本只扫描一次）"""
+        if self._done:
+            return ""
+
+        buf = self._buffer + text
+
+        if not self._started:
+            match = self._key_pattern.search(buf)
+            if not match:
+                self._buffer = buf[self._partial_start(buf):]
+                return ""
+            self._started = True
+            buf = buf[match.end():]
+
+        out = []
+        i = 0
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self._done = True
+                i += 1
+                break
+            if ch != '\\':
+                out.append(ch)
+                i += 1
+                continue
+
+            # 转义序列可能被切断在两个分片之间，不完整时等待下一段
+            if i + 1 >= len(buf):
+                break
+            esc = buf[i + 1]
+            if esc == 'u':
+                if i + 6 > len(buf):
+                    break
+                try:
+                    code = int(buf[i + 2:i + 6], 16)
+                except ValueError:
+                    i += 6
+                    continue
+                if 0xD800 <= code <= 0xDBFF:
+                    # 高位代理需要与紧随的低位代理合并（emoji、生僻字），不完整时等待下一段
+                    rest = buf[i + 6:i + 12]
+                    if len(rest) < 6 and '\\u'.startswith(rest[:2]):
+                        break
+                    low = self._low_surrogate(rest)
+                    if low is not None:
+                        out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                        i += 12
+                        continue
+                    out.append('\ufffd')
+                elif 0xDC00 <= code <= 0xDFFF:
+                    out.append('\ufffd')
+                else:
+                    out.append(chr(code))
+                i += 6
+            else:
+                out.append(self._ESCAPES.get(esc, esc))
+                i += 2
+
+        self._buffer = "" if self._done else buf[i:]
+        return "".join(out)
+
+    @staticmethod
+    def _low_surrogate(escape: str) -> Optional[int]:
+        """解析 \\uXXXX 形式的低位代理，不是低位代理时返回 None"""
+        if len(escape) != 6 or not escape.startswith('\\u'):
+            return None
+        try:
+            code = int(escape[2:], 16)
+        except ValueError:
+            return None
+        return code if 0xDC00 <= code <= 0xDFFF else None
 
 
 class AgentRegistry:
@@ -8,8 +8,10 @@ DeepResearch V2.0 - 数据分析师 Agent (DataAnalyst)
 4. 识别数据趋势和洞察
 """
 
+import time
 import uuid
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
 from datetime import datetime
 
 from .base import BaseAgent
@@ -253,11 +255,17 @@ class DataAnalyst(BaseAgent):
     async def process(self, state: ResearchState) -> ResearchState:
         """处理入口"""
         if state["phase"] == ResearchPhase.ANALYZING.value:
-            return await self._analyze_data(state)
+            return await self.analyze_data(state)
         return state
 
-    async def _analyze_data(self, state: ResearchState) -> ResearchState:
-        """执行数据分析"""
+    async def analyze_data(self, state: ResearchState, extracted: Optional[asyncio.Event] = None) -> ResearchState:
+        """
+        执行数据分析
+
+        Args:
+            state: 研究状态
+            extracted: 结构化数据（data_points、insights）写入 state 后置位，供重叠执行模式下的章节撰写等待
+        """
         self.logger.info("Starting data analysis...")
 
         # 发送开始事件
@@ -270,14 +278,21 @@ class DataAnalyst(BaseAgent):
             "stats": {"results_count": 0, "charts_count": 0, "entities_count": 0}
         })
 
-        # 1. 提取结构化数据
-        extracted_data = await self._extract_data(state)
-
-        # 2. 构建知识图谱
-        knowledge_graph = await self._build_knowledge_graph(state)
-
-        # 3. 生成可视化图表
-        charts = await self._generate_charts(state, extracted_data)
+        async def extract_data(results: Dict[str, Any]) -> Dict[str, Any]:
+            data = await self._extract_data(state)
+            if extracted is not None:
+                extracted.set()
+            return data
+
+        # 分析步骤：步骤名 -> (依赖的步骤, 执行函数)
+        # 知识图谱只依赖事实，与结构化提取并行；图表依赖提取结果
+        results = await self._run_steps(state, {
+            "extract_data": ((), extract_data),
+            "knowledge_graph": ((), lambda results: self._build_knowledge_graph(state)),
+            "charts": (("extract_data",), lambda results: self._generate_charts(state, results["extract_data"])),
+        })
+        knowledge_graph = results["knowledge_graph"]
+        charts = results["charts"]
 
         # 更新状态
         if knowledge_graph:
@@ -317,6 +332,82 @@ class DataAnalyst(BaseAgent):
 
         return state
 
+    async def _run_steps(
+        self,
+        state: ResearchState,
+        steps: Dict[str, Tuple[Tuple[str, ...], Callable[[Dict[str, Any]], Awaitable[Any]]]]
+    ) -> Dict[str, Any]:
+        """
+        按依赖关系并发执行分析步骤
+
+        每个步骤在依赖完成后立即开始，执行耗时写入 add_log，
+        全部完成后记录关键路径。依赖失败的步骤不执行，所有步骤结束后抛出第一个异常。
+
+        Args:
+            state: 研究状态
+            steps: 步骤名 -> (依赖的步骤名, 执行函数)，执行函数接收已完成步骤的结果
+
+        Returns:
+            步骤名 -> 结果
+        """
+        results: Dict[str, Any] = {}
+        timings: Dict[str, Tuple[float, float]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        origin = time.monotonic()
+
+        async def run(name: str) -> None:
+            depends, func = steps[name]
+            if depends:
+                await asyncio.gather(*(tasks[dep] for dep in depends))
+            started = time.monotonic()
+            status = "ok"
+            try:
+                results[name] = await func(results)
+            except Exception as e:
+                status = f"failed: {e}"
+                raise
+            finally:
+                finished = time.monotonic()
+                timings[name] = (started, finished)
+                self.add_log(
+                    state,
+                    action=f"analysis:{name}",
+                    input_summary=f"depends_on={list(depends)}, start=+{int((started - origin) * 1000)}ms",
+                    output_summary=status,
+                    duration_ms=int((finished - started) * 1000)
+                )
+
+        for name in steps:
+            tasks[name] = asyncio.create_task(run(name))
+        try:
+            outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+        # 关键路径：从最后完成的步骤沿最晚完成的依赖回溯
+        path = []
+        name = max(timings, key=lambda n: timings[n][1], default=None)
+        while name is not None:
+            path.append(name)
+            name = max(steps[name][0], key=lambda n: timings[n][1], default=None)
+        path.reverse()
+        total_ms = int((time.monotonic() - origin) * 1000)
+        self.add_log(
+            state,
+            action="analysis:critical_path",
+            input_summary=f"steps={list(steps)}",
+            output_summary=" -> ".join(f"{n}({int((timings[n][1] - timings[n][0]) * 1000)}ms)" for n in path),
+            duration_ms=total_ms
+        )
+        self.logger.info(f"[DataAnalyst] Analysis finished in {total_ms}ms, critical path: {' -> '.join(path)}")
+
+        return results
+
     async def _extract_data(self, state: ResearchState) -> Dict[str, Any]:
         """从搜索结果中提取结构化数据"""
         self.logger.info("Extracting structured data...")
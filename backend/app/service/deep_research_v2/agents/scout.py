@@ -8,28 +8,38 @@ DeepResearch V2.0 - 深度侦探 Agent (DeepScout)
 4. 交叉验证 - 多源验证关键信息
 """
 
+import os
 import uuid
 import asyncio
-import hashlib
 import requests
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 from .base import BaseAgent
 from ..state import ResearchState, ResearchPhase
+from ..rate_limiter import get_rate_limiter
+from ..web_fetcher import get_web_fetcher
+from ..html_extract import extract_text_async
+from ..fact_index import FactIndex
 
-# 网页文本提取库（可选依赖）
 try:
-    import trafilatura
-    TRAFILATURA_AVAILABLE = True
+    from service.search_cache import get_search_cache
 except ImportError:
-    TRAFILATURA_AVAILABLE = False
+    from app.service.search_cache import get_search_cache
+
+# 事实去重：是否启用 embedding 精排，以及最多保留的会话索引数
+FACT_DEDUP_EMBEDDINGS = os.getenv("FACT_DEDUP_EMBEDDINGS", "0").lower() in ("1", "true", "yes")
+MAX_FACT_INDEXES = 32
 
-try:
-    from bs4 import BeautifulSoup
-    BS4_AVAILABLE = True
-except ImportError:
-    BS4_AVAILABLE = False
+
+def _embed_facts(texts: List[str]) -> List[Optional[List[float]]]:
+    """事实去重使用的向量化函数"""
+    try:
+        from service.embedding_service import generate_embedding
+    except ImportError:
+        from app.service.embedding_service import generate_embedding
+    return generate_embedding(texts) or [None] * len(texts)
 
 
 class DeepScout(BaseAgent):
@@ -165,8 +175,8 @@ URL: {url}
             model=model
         )
         self.search_api_key = search_api_key
-        self.search_cache: Dict[str, List] = {}
-        self.fact_fingerprints: Dict[str, str] = {}  # 事实指纹用于去重
+        self.search_cache = get_search_cache("deep_scout")
+        self.fact_indexes: "OrderedDict[str, FactIndex]" = OrderedDict()  # 按会话的事实去重索引
 
     async def process(self, state: ResearchState) -> ResearchState:
         """处理入口"""
@@ -178,6 +188,23 @@ URL: {url}
         if state["phase"] not in [ResearchPhase.PLANNING.value, ResearchPhase.RESEARCHING.value]:
             return state
 
+        sections = await self.begin_research(state)
+        if not sections:
+            return state
+
+        # 并行研究多个章节
+        await asyncio.gather(*[self.research_section(state, section) for section in sections])
+
+        self.finish_research(state)
+        return state
+
+    async def begin_research(self, state: ResearchState) -> List[Dict]:
+        """
+        准备研究阶段：获取股票数据、发送开始事件
+
+        Returns:
+            本轮需要研究的章节（没有待研究章节时为空）
+        """
         # 自动识别并获取股票数据
         await self._fetch_stock_data_if_relevant(state)
 
@@ -188,7 +215,7 @@ URL: {url}
 
         if not pending_sections:
             self.logger.info("No pending sections to research")
-            return state
+            return []
 
         # 发送 research_step 开始事件
         self.add_message(state, "research_step", {
@@ -205,13 +232,10 @@ URL: {url}
             "content": f"开始深度搜索，共 {len(pending_sections)} 个章节待研究..."
         })
 
-        # 并行研究多个章节
-        tasks = []
-        for section in pending_sections[:3]:  # 每次最多处理3个章节
-            tasks.append(self._research_section(state, section))
-
-        await asyncio.gather(*tasks)
+        return pending_sections[:3]  # 每次最多处理3个章节
 
+    def finish_research(self, state: ResearchState) -> None:
+        """发送研究完成事件和搜索结果"""
         # 发送 research_step 完成事件
         self.add_message(state, "research_step", {
             "step_type": "searching",
@@ -227,8 +251,6 @@ URL: {url}
         # 发送搜索结果事件供前端详情面板展示
         self._emit_search_results_event(state)
 
-        return state
-
     async def _supplementary_research(self, state: ResearchState) -> ResearchState:
         """
         补充搜索阶段 - 处理审核后发现的信息缺失
@@ -262,42 +284,46 @@ URL: {url}
         # 执行补充搜索
         initial_facts_count = len(state.get("facts", []))
 
-        for query in pending_queries[:5]:  # 最多处理5个补充查询
+        queries = pending_queries[:5]  # 最多处理5个补充查询
+        for query in queries:
             self.add_message(state, "action", {
                 "agent": self.name,
                 "tool": "supplementary_search",
                 "query": query
             })
 
-            # 执行搜索
+        async def search_and_analyze(query: str) -> Optional[Dict]:
             results = await self._execute_search(query, count=8)
+            if not results:
+                return None
+            return await self._analyze_supplementary_results(state["query"], query, results)
 
-            if results:
-                # 分析结果
-                analysis = await self._analyze_supplementary_results(
-                    state["query"],
-                    query,
-                    results
-                )
+        # 并发执行搜索和分析，再按查询顺序合并事实
+        analyses = await asyncio.gather(*[search_and_analyze(q) for q in queries], return_exceptions=True)
+
+        for query, analysis in zip(queries, analyses):
+            if isinstance(analysis, Exception):
+                self.logger.error(f"Supplementary research failed for '{query}': {analysis}")
+                continue
 
-                if analysis:
-                    # 添加新事实
-                    for fact in analysis.get("extracted_facts", []):
-                        content = fact.get("content", "")
-                        source_url = fact.get("source_url", "")
-
-                        if not self._is_duplicate_fact(content, source_url):
-                            fact_entry = {
-                                "id": f"fact_{uuid.uuid4().hex[:8]}",
-                                "content": content,
-                                "source_url": source_url,
-                                "source_name": fact.get("source_name", ""),
-                                "source_type": fact.get("source_type", "news"),
-                                "credibility_score": fact.get("credibility_score", 0.5),
-                                "is_supplementary": True,  # 标记为补充搜索获得
-                                "related_sections": []
-                            }
-                            state["facts"].append(fact_entry)
+            if analysis:
+                # 添加新事实
+                for fact in analysis.get("extracted_facts", []):
+                    content = fact.get("content", "")
+                    source_url = fact.get("source_url", "")
+
+                    if not await self._is_duplicate_fact(state, content, source_url):
+                        fact_entry = {
+                            "id": f"fact_{uuid.uuid4().hex[:8]}",
+                            "content": content,
+                            "source_url": source_url,
+                            "source_name": fact.get("source_name", ""),
+                            "source_type": fact.get("source_type", "news"),
+                            "credibility_score": fact.get("credibility_score", 0.5),
+                            "is_supplementary": True,  # 标记为补充搜索获得
+                            "related_sections": []
+                        }
+                        state["facts"].append(fact_entry)
 
         # 清空待搜索列表
         state["pending_search_queries"] = []
@@ -488,7 +514,7 @@ URL: {url}
                 "results": search_results_for_ui
             })
 
-    async def _research_section(self, state: ResearchState, section: Dict) -> None:
+    async def research_section(self, state: ResearchState, section: Dict) -> None:
         """研究单个章节"""
         section_id = section["id"]
         section_title = section["title"]
@@ -503,11 +529,18 @@ URL: {url}
             "queries": search_queries
         })
 
-        # 逐个执行搜索，每完成一个就发送事件（提升用户体验）
-        all_results = []
-        for i, query in enumerate(search_queries):
-            results = await self._execute_search(query)
-            all_results.extend(results)
+        # 并发执行所有搜索，按完成顺序发送进度事件（提升用户体验）
+        async def search_one(index: int, query: str):
+            return index, query, await self._execute_search(query)
+
+        results_by_query: List[List[Dict]] = [[] for _ in search_queries]
+        completed = 0
+        total_so_far = 0
+        for future in asyncio.as_completed([search_one(i, q) for i, q in enumerate(search_queries)]):
+            index, query, results = await future
+            results_by_query[index] = results
+            completed += 1
+            total_so_far += len(results)
 
             # 搜索完成后立即发送原始结果（让用户看到进度）
             if results:
@@ -515,9 +548,9 @@ URL: {url}
                     "agent": self.name,
                     "query": query,
                     "results_count": len(results),
-                    "total_so_far": len(all_results),
+                    "total_so_far": total_so_far,
                     "section": section_title,
-                    "progress": f"{i + 1}/{len(search_queries)}"
+                    "progress": f"{completed}/{len(search_queries)}"
                 })
 
                 # 立即发送搜索结果供前端展示
@@ -537,6 +570,9 @@ URL: {url}
                     "isIncremental": True
                 })
 
+        # 分析时保持查询原有顺序，结果与完成顺序无关
+        all_results = [r for results in results_by_query for r in results]
+
         if not all_results:
             self.logger.warning(f"No search results for section: {section_title}")
             return
@@ -563,7 +599,7 @@ URL: {url}
                 source_url = fact.get("source_url", "")
 
                 # 去重检查
-                if self._is_duplicate_fact(content, source_url):
+                if await self._is_duplicate_fact(state, content, source_url):
                     duplicate_facts += 1
                     continue
 
@@ -786,7 +822,7 @@ URL: {url}
                 content = fact.get("content", "")
                 source_url = fact.get("source_url", "")
 
-                if not self._is_duplicate_fact(content, source_url):
+                if not await self._is_duplicate_fact(state, content, source_url):
                     fact_entry = {
                         "id": f"fact_{uuid.uuid4().hex[:8]}",
                         "content": content,
@@ -912,11 +948,11 @@ URL: {url}
 
     async def _execute_search(self, query: str, count: int = 10) -> List[Dict]:
         """执行网络搜索 - 使用 Bocha Web Search API"""
-        # 检查缓存
-        cache_key = hashlib.md5(query.encode()).hexdigest()
-        if cache_key in self.search_cache:
+        # 检查缓存（跨会话、跨进程共享）
+        cached = await self.search_cache.aget(query, count=count)
+        if cached is not None:
             self.logger.debug(f"Cache hit for query: {query[:30]}...")
-            return self.search_cache[cache_key]
+            return cached
 
         try:
             url = "https://api.bocha.cn/v1/web-search"
@@ -931,15 +967,17 @@ URL: {url}
                 'Content-Type': 'application/json'
             }
 
-            self.logger.info(f"Executing Bocha search: {query[:50]}...")
+            # 全局限流：所有会话的并发搜索共享同一服务商配额
+            async with get_rate_limiter("bocha"):
+                self.logger.info(f"Executing Bocha search: {query[:50]}...")
 
-            response = await asyncio.to_thread(
-                requests.post,
-                url,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+                response = await asyncio.to_thread(
+                    requests.post,
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
 
             if response.status_code != 200:
                 self.logger.error(f"Bocha API error: {response.status_code} - {response.text[:200]}")
@@ -967,7 +1005,7 @@ URL: {url}
                     })
 
             # 缓存结果
-            self.search_cache[cache_key] = results
+            await self.search_cache.aset(query, results, count=count)
             return results
 
         except requests.exceptions.Timeout:
@@ -1030,22 +1068,19 @@ URL: {r.get('url', '')}
         深度阅读网页内容
 
         TODO: 集成 Headless Browser（如 Playwright）实现真正的网页抓取
-        目前使用简化版本
+        目前通过共享的 WebFetcher 抓取（连接复用 + 磁盘缓存）
         """
         try:
-            # 简化版：直接获取网页内容
-            response = await asyncio.to_thread(
-                requests.get,
-                url,
-                timeout=15,
-                headers={'User-Agent': 'Mozilla/5.0'}
-            )
-
-            if response.status_code != 200:
+            fetcher = get_web_fetcher()
+            page = await fetcher.fetch(url)
+            if not page:
                 return None
 
-            # 提取网页正文（去除 HTML 标签和噪音）
-            content = self._extract_text_from_html(response.text, url)
+            # 提取网页正文（去除 HTML 标签和噪音），已提取过的页面直接复用
+            content = page.get("text")
+            if not content:
+                content = await extract_text_async(page["html"], url)
+                await fetcher.store_text(url, content)
             if not content or len(content) < 100:
                 self.logger.warning(f"Extracted content too short for {url}")
                 return None
@@ -1069,124 +1104,28 @@ URL: {r.get('url', '')}
             self.logger.error(f"Deep read error for {url}: {e}")
             return None
 
-    def _extract_text_from_html(self, html: str, url: str = "", max_length: int = 12000) -> str:
-        """
-        从 HTML 中提取纯文本正文
-
-        使用多种策略提取，优先级：
-        1. trafilatura - 专业的网页正文提取库（效果最好）
-        2. BeautifulSoup - 通用 HTML 解析（备选）
-        3. 简单正则 - 最后的备选方案
-
-        Args:
-            html: 原始 HTML 内容
-            url: 网页 URL（用于 trafilatura 优化）
-            max_length: 最大返回长度
-
-        Returns:
-            提取的纯文本
-        """
-        text = ""
-
-        # 方法 1: 使用 trafilatura（效果最好）
-        if TRAFILATURA_AVAILABLE:
-            try:
-                text = trafilatura.extract(
-                    html,
-                    url=url,
-                    include_comments=False,
-                    include_tables=True,
-                    no_fallback=False,
-                    favor_precision=True
-                )
-                if text and len(text) > 200:
-                    self.logger.debug(f"Trafilatura extracted {len(text)} chars from {url}")
-                    return text[:max_length]
-            except Exception as e:
-                self.logger.warning(f"Trafilatura extraction failed: {e}")
-
-        # 方法 2: 使用 BeautifulSoup
-        if BS4_AVAILABLE:
-            try:
-                soup = BeautifulSoup(html, 'lxml')
-
-                # 移除无用标签
-                for tag in soup(['script', 'style', 'nav', 'header', 'footer',
-                                'aside', 'iframe', 'noscript', 'meta', 'link']):
-                    tag.decompose()
-
-                # 尝试找正文区域
-                main_content = None
-                for selector in ['article', 'main', '.content', '.article',
-                                '#content', '#article', '.post', '.entry']:
-                    main_content = soup.select_one(selector)
-                    if main_content:
-                        break
-
-                if main_content:
-                    text = main_content.get_text(separator='\n', strip=True)
-                else:
-                    # 找不到正文区域，提取 body
-                    body = soup.find('body')
-                    if body:
-                        text = body.get_text(separator='\n', strip=True)
-                    else:
-                        text = soup.get_text(separator='\n', strip=True)
-
-                if text and len(text) > 200:
-                    # 清理多余空白
-                    import re
-                    text = re.sub(r'\n{3,}', '\n\n', text)
-                    text = re.sub(r' {2,}', ' ', text)
-                    self.logger.debug(f"BeautifulSoup extracted {len(text)} chars from {url}")
-                    return text[:max_length]
-
-            except Exception as e:
-                self.logger.warning(f"BeautifulSoup extraction failed: {e}")
-
-        # 方法 3: 简单正则（最后的备选）
-        import re
-        # 移除 script 和 style
-        text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        # 移除所有 HTML 标签
-        text = re.sub(r'<[^>]+>', ' ', text)
-        # 解码 HTML 实体
-        text = text.replace('&nbsp;', ' ').replace('&lt;', '<').replace('&gt;', '>')
-        text = text.replace('&amp;', '&').replace('&quot;', '"')
-        # 清理空白
-        text = re.sub(r'\s+', ' ', text).strip()
-
-        self.logger.debug(f"Regex extracted {len(text)} chars from {url}")
-        return text[:max_length]
-
-    def _compute_fact_fingerprint(self, content: str) -> str:
-        """计算事实的语义指纹用于去重"""
-        # 简化版：使用内容hash
-        # TODO: 集成向量嵌入进行语义相似度比较
-        import re
-        # 提取数字和关键词作为指纹
-        numbers = re.findall(r'\d+\.?\d*', content)
-        keywords = re.findall(r'[\u4e00-\u9fa5]{2,4}', content)[:5]
-        fingerprint = f"{','.join(numbers[:3])}|{','.join(keywords)}"
-        return hashlib.md5(fingerprint.encode()).hexdigest()[:16]
-
-    def _is_duplicate_fact(self, content: str, source_url: str) -> bool:
-        """检查事实是否重复"""
-        fingerprint = self._compute_fact_fingerprint(content)
-
-        # 检查指纹是否已存在
-        if fingerprint in self.fact_fingerprints:
-            existing_url = self.fact_fingerprints[fingerprint]
-            # 如果是同一个来源，不算重复（可能是更详细的版本）
-            if existing_url == source_url:
-                return False
-            self.logger.debug(f"Duplicate fact detected: {content[:50]}...")
-            return True
-
-        # 保存指纹
-        self.fact_fingerprints[fingerprint] = source_url
-        return False
+    def _get_fact_index(self, state: ResearchState) -> FactIndex:
+        """获取会话的事实去重索引（不存在时根据已有事实重建，例如从检查点恢复后）"""
+        session_id = state.get("session_id", "")
+        index = self.fact_indexes.get(session_id)
+        if index is None:
+            index = FactIndex(embedder=_embed_facts if FACT_DEDUP_EMBEDDINGS else None)
+            for fact in state.get("facts", []):
+                index.add(fact.get("content", ""), fact.get("source_url", ""))
+            self.fact_indexes[session_id] = index
+            while len(self.fact_indexes) > MAX_FACT_INDEXES:
+                self.fact_indexes.popitem(last=False)
+        else:
+            self.fact_indexes.move_to_end(session_id)
+        return index
+
+    async def _is_duplicate_fact(self, state: ResearchState, content: str, source_url: str) -> bool:
+        """检查事实是否重复（不重复时加入索引）"""
+        index = self._get_fact_index(state)
+        if index.embedder:
+            # 向量精排会请求 embedding 接口，放到线程中执行
+            return await asyncio.to_thread(index.is_duplicate, content, source_url)
+        return index.is_duplicate(content, source_url)
 
     def _update_knowledge_graph(self, state: ResearchState, entities: List[Dict]) -> None:
         """更新知识图谱"""
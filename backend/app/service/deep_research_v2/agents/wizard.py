@@ -11,15 +11,18 @@ DeepResearch V2.0 - 数据极客 Agent (CodeWizard)
 import uuid
 import asyncio
 import json
-import base64
-import io
 import sys
 from typing import Dict, Any, List, Optional
 from datetime import datetime
-from contextlib import redirect_stdout, redirect_stderr
 
 from .base import BaseAgent
 from ..state import ResearchState, ResearchPhase
+from ..sandbox_pool import get_sandbox_pool
+
+try:
+    from service.blob_store import get_blob_store
+except ImportError:
+    from app.service.blob_store import get_blob_store
 
 
 class CodeWizard(BaseAgent):
@@ -32,6 +35,9 @@ class CodeWizard(BaseAgent):
     - 专业的数据分析和可视化
     """
 
+    # 数据点少于该数量时跳过数据分析和图表
+    MIN_DATA_POINTS = 3
+
     ANALYSIS_PROMPT = """你是一位资深的数据分析师，擅长用Python进行数据处理和可视化。
 
 ## 研究问题
@@ -354,11 +360,11 @@ df = df.dropna()
 
         if state["phase"] != ResearchPhase.ANALYZING.value:
             # 检查是否有需要分析的数据
-            if len(state["data_points"]) >= 3:
+            if len(state["data_points"]) >= self.MIN_DATA_POINTS:
                 state["phase"] = ResearchPhase.ANALYZING.value
                 self.logger.info(f"[CodeWizard] 数据点足够，设置 phase 为 ANALYZING")
             else:
-                self.logger.warning(f"[CodeWizard] ⚠️ 数据点不足 ({len(state['data_points'])} < 3)，跳过分析")
+                self.logger.warning(f"[CodeWizard] ⚠️ 数据点不足 ({len(state['data_points'])} < {self.MIN_DATA_POINTS})，跳过分析")
                 return state
 
         self.add_message(state, "thought", {
@@ -367,9 +373,9 @@ df = df.dropna()
         })
 
         # 执行数据分析
-        self.logger.info(f"[CodeWizard] 开始执行 _analyze_data...")
-        await self._analyze_data(state)
-        self.logger.info(f"[CodeWizard] _analyze_data 完成，当前 charts 数量: {len(state['charts'])}")
+        self.logger.info(f"[CodeWizard] 开始执行 analyze_data...")
+        await self.analyze_data(state)
+        self.logger.info(f"[CodeWizard] analyze_data 完成，当前 charts 数量: {len(state['charts'])}")
 
         # 生成图表
         self.logger.info(f"[CodeWizard] 开始执行 _generate_charts...")
@@ -379,7 +385,7 @@ df = df.dropna()
         self.logger.info(f"[CodeWizard] ========== process 结束 ==========")
         return state
 
-    async def _analyze_data(self, state: ResearchState) -> None:
+    async def analyze_data(self, state: ResearchState) -> None:
         """分析数据"""
         if not state["data_points"]:
             self.logger.info("[CodeWizard] 没有数据点，跳过分析")
@@ -499,22 +505,22 @@ df = df.dropna()
             # 如果生成了图表，发送 chart SSE 事件
             charts_generated = execution_result.get("charts", [])
             if charts_generated:
-                for i, chart_b64 in enumerate(charts_generated):
+                for i, image_ref in enumerate(charts_generated):
                     chart_entry = {
                         "id": f"chart_analysis_{uuid.uuid4().hex[:8]}",
                         "title": f"数据分析图表 {i+1}",
                         "chart_type": "generated",
-                        "image_base64": chart_b64,
+                        **image_ref,
                         "section_id": "analysis"
                     }
                     state["charts"].append(chart_entry)
 
-                    # 发送单个图表事件到前端
+                    # 发送单个图表事件到前端（只携带图片引用）
                     self.add_message(state, "chart", {
                         "agent": self.name,
                         "title": chart_entry["title"],
                         "chart_type": "generated",
-                        "image_base64": chart_b64
+                        **image_ref
                     })
                     self.logger.info(f"[CodeWizard] Sent chart event: {chart_entry['title']}")
 
@@ -627,8 +633,8 @@ df = df.dropna()
             self.logger.error(f"Code fix LLM call failed: {e}")
             return None
 
-    async def _generate_charts(self, state: ResearchState) -> None:
-        """为需要图表的章节生成可视化"""
+    def chart_sections(self, state: ResearchState) -> List[Dict]:
+        """需要生成图表的章节（最多2个）"""
         # 找出需要图表的章节
         chart_sections = [s for s in state["outline"] if s.get("requires_chart")]
 
@@ -637,70 +643,78 @@ df = df.dropna()
             chart_sections = state["outline"][:2]
             self.logger.info(f"[CodeWizard] 没有 requires_chart 章节，使用前2个章节生成图表")
 
+        return chart_sections[:2]  # 最多生成2个图表
+
+    async def _generate_charts(self, state: ResearchState) -> None:
+        """为需要图表的章节生成可视化"""
+        chart_sections = self.chart_sections(state)
         self.logger.info(f"[CodeWizard] 开始生成图表，需要图表的章节数: {len(chart_sections)}")
 
-        for i, section in enumerate(chart_sections[:2]):  # 最多生成2个图表
-            self.logger.info(f"[CodeWizard] 处理章节 {i+1}/{min(len(chart_sections), 2)}: '{section['title']}'")
+        for i, section in enumerate(chart_sections):
+            self.logger.info(f"[CodeWizard] 处理章节 {i+1}/{len(chart_sections)}: '{section['title']}'")
+            await self.generate_section_chart(state, section)
 
-            # 收集相关数据
-            section_data = self._get_section_data(state, section["id"])
-            self.logger.info(f"[CodeWizard] 章节 '{section['title']}' 数据量: {len(section_data)}")
+    async def generate_section_chart(self, state: ResearchState, section: Dict) -> None:
+        """为单个章节生成图表"""
+        # 收集相关数据
+        section_data = self._get_section_data(state, section["id"])
+        self.logger.info(f"[CodeWizard] 章节 '{section['title']}' 数据量: {len(section_data)}")
 
-            if not section_data:
-                self.logger.warning(f"[CodeWizard] ⚠️ 章节 '{section['title']}' 没有数据，跳过")
-                continue
+        if not section_data:
+            self.logger.warning(f"[CodeWizard] ⚠️ 章节 '{section['title']}' 没有数据，跳过")
+            return
 
-            # 生成图表代码
-            self.logger.info(f"[CodeWizard] 调用 LLM 生成图表代码...")
-            chart_config = await self._generate_chart_code(
-                topic=section["title"],
-                data=section_data,
-                chart_type="bar" if section.get("section_type") == "quantitative" else "line",
-                title=f"{section['title']}分析"
-            )
+        # 生成图表代码
+        self.logger.info(f"[CodeWizard] 调用 LLM 生成图表代码...")
+        chart_config = await self._generate_chart_code(
+            topic=section["title"],
+            data=section_data,
+            chart_type="bar" if section.get("section_type") == "quantitative" else "line",
+            title=f"{section['title']}分析"
+        )
 
-            if chart_config and chart_config.get("code"):
-                chart_code = chart_config["code"]
-                self._save_debug_log(f"chart_{section['id']}_raw", repr(chart_code))
-                self.logger.info(f"[CodeWizard] ✅ 生成图表代码成功，长度: {len(chart_code)}")
+        if chart_config and chart_config.get("code"):
+            chart_code = chart_config["code"]
+            self._save_debug_log(f"chart_{section['id']}_raw", repr(chart_code))
+            self.logger.info(f"[CodeWizard] ✅ 生成图表代码成功，长度: {len(chart_code)}")
 
-                self.add_message(state, "code", {
-                    "agent": self.name,
-                    "language": "python",
-                    "code": chart_code,
-                    "purpose": f"生成图表: {section['title']}"
-                })
-
-                # 执行并获取图表
-                self.logger.info(f"[CodeWizard] 执行图表代码...")
-                result = await self._execute_code(chart_code)
-                self._save_debug_log(f"chart_{section['id']}_result", str(result))
+            self.add_message(state, "code", {
+                "agent": self.name,
+                "language": "python",
+                "code": chart_code,
+                "purpose": f"生成图表: {section['title']}"
+            })
 
-                if result.get("charts"):
-                    self.logger.info(f"[CodeWizard] ✅ 图表执行成功，生成了 {len(result['charts'])} 个图表")
-                    chart_entry = {
-                        "id": f"chart_{uuid.uuid4().hex[:8]}",
-                        "title": section["title"],
-                        "chart_type": "generated",
-                        "data": section_data,
-                        "code": chart_config["code"],
-                        "image_base64": result["charts"][0] if result["charts"] else None,
-                        "section_id": section["id"]
-                    }
-                    state["charts"].append(chart_entry)
-                    self.logger.info(f"[CodeWizard] 图表已添加到 state['charts']，当前总数: {len(state['charts'])}")
+            # 执行并获取图表
+            self.logger.info(f"[CodeWizard] 执行图表代码...")
+            result = await self._execute_code(chart_code)
+            self._save_debug_log(f"chart_{section['id']}_result", str(result))
+
+            if result.get("charts"):
+                self.logger.info(f"[CodeWizard] ✅ 图表执行成功，生成了 {len(result['charts'])} 个图表")
+                chart_entry = {
+                    "id": f"chart_{uuid.uuid4().hex[:8]}",
+                    "title": section["title"],
+                    "chart_type": "generated",
+                    "data": section_data,
+                    "code": chart_config["code"],
+                    **result["charts"][0],
+                    "section_id": section["id"]
+                }
+                state["charts"].append(chart_entry)
+                self.logger.info(f"[CodeWizard] 图表已添加到 state['charts']，当前总数: {len(state['charts'])}")
 
-                    self.add_message(state, "chart", {
-                        "agent": self.name,
-                        "title": section["title"],
-                        "chart_type": "generated",
-                        "image_base64": result["charts"][0] if result["charts"] else None
-                    })
-                    self.logger.info(f"[CodeWizard] ✅ 已发送 chart SSE 事件: {section['title']}")
-                else:
-                    self.logger.warning(f"[CodeWizard] ⚠️ 图表执行失败或没有生成图表: success={result.get('success')}, error={result.get('error', 'N/A')[:100]}")
+                self.add_message(state, "chart", {
+                    "agent": self.name,
+                    "title": section["title"],
+                    "chart_type": "generated",
+                    **result["charts"][0]
+                })
+                self.logger.info(f"[CodeWizard] ✅ 已发送 chart SSE 事件: {section['title']}")
             else:
-                self.logger.warning(f"[CodeWizard] ⚠️ LLM 没有返回有效的图表代码")
+                self.logger.warning(f"[CodeWizard] ⚠️ 图表执行失败或没有生成图表: success={result.get('success')}, error={result.get('error', 'N/A')[:100]}")
+        else:
+            self.logger.warning(f"[CodeWizard] ⚠️ LLM 没有返回有效的图表代码")
 
     def _get_section_data(self, state: ResearchState, section_id: str) -> List[Dict]:
         """获取章节相关数据"""
@@ -1059,8 +1073,8 @@ df = df.dropna()
             }
 
         try:
-            # 在线程池中执行代码
-            result = await asyncio.to_thread(self._execute_in_sandbox, code)
+            # 在沙箱进程池中执行代码
+            result = await self._execute_in_sandbox(code)
             return result
         except Exception as e:
             self.logger.error(f"Code execution error: {e}")
@@ -1082,220 +1096,47 @@ df = df.dropna()
 
         return True
 
-    def _execute_in_sandbox(self, code: str) -> Dict[str, Any]:
+    def _store_chart_image(self, png_bytes: bytes) -> Dict[str, str]:
+        """把图表 PNG 写入内容寻址存储，返回图片引用 {image_hash, image_url}"""
+        blob_store = get_blob_store()
+        key = blob_store.put(png_bytes, "png")
+        return {"image_hash": key, "image_url": blob_store.url_for(key)}
+
+    async def _execute_in_sandbox(self, code: str) -> Dict[str, Any]:
         """
         沙箱执行代码
 
-        注意：这是一个简化的沙箱，生产环境应使用更安全的方案
-        如 Docker 容器或专门的代码执行服务
+        代码在预热的沙箱进程中运行（受 CPU / 内存 / 超时限制，见 sandbox_pool），
+        返回的图表 PNG 写入内容寻址存储
         """
         self.logger.info(f"[CodeWizard] _execute_in_sandbox 开始执行")
         self._save_debug_log("sandbox_1_code_input", code)
 
-        import matplotlib
-        matplotlib.use('Agg')  # 非交互式后端
-        import matplotlib.pyplot as plt
-
-        # 预导入所有允许的模块
-        import pandas as pd
-        import numpy as np
-        import seaborn as sns
-        import datetime
-        import math
-        import statistics
-        import json as json_module
-        import collections
-        import re as re_module
-
-        self.logger.info(f"[CodeWizard] 沙箱环境准备完成，matplotlib backend: {matplotlib.get_backend()}")
-
-        # 白名单基础模块
-        allowed_base_modules = [
-            'pandas', 'numpy', 'matplotlib', 'seaborn',
-            'datetime', 'math', 'statistics', 'json', 'collections', 're'
-        ]
-
-        # 保存原始的 __import__ 函数
-        import builtins
-        original_import = builtins.__import__
-
-        def safe_import(name, globals=None, locals=None, fromlist=(), level=0):
-            """安全的 import 函数，只允许白名单模块"""
-            # 检查模块是否在白名单中
-            base_module = name.split('.')[0]
-            if base_module in allowed_base_modules:
-                # 使用真实的 import 来处理（这样可以正确处理 fromlist）
-                return original_import(name, globals, locals, fromlist, level)
-            raise ImportError(f"Import of '{name}' is not allowed in sandbox")
-
-        # 准备执行环境
-        exec_globals = {
-            '__builtins__': {
-                '__import__': safe_import,
-                'print': print,
-                'len': len,
-                'range': range,
-                'enumerate': enumerate,
-                'zip': zip,
-                'map': map,
-                'filter': filter,
-                'sorted': sorted,
-                'sum': sum,
-                'min': min,
-                'max': max,
-                'abs': abs,
-                'round': round,
-                'int': int,
-                'float': float,
-                'str': str,
-                'list': list,
-                'dict': dict,
-                'tuple': tuple,
-                'set': set,
-                'bool': bool,
-                'True': True,
-                'False': False,
-                'None': None,
-                'isinstance': isinstance,
-                'type': type,
-                'getattr': getattr,
-                'setattr': setattr,
-                'hasattr': hasattr,
-                'callable': callable,
-                'iter': iter,
-                'next': next,
-                'reversed': reversed,
-                'slice': slice,
-                'all': all,
-                'any': any,
-                'chr': chr,
-                'ord': ord,
-                'hex': hex,
-                'bin': bin,
-                'oct': oct,
-                'pow': pow,
-                'divmod': divmod,
-                'format': format,
-                'repr': repr,
-                'hash': hash,
-                'id': id,
-                'input': lambda *args: '',  # 禁用 input
-                'open': None,  # 禁用 open
-            },
-            # 直接提供模块引用（无需import即可使用）
-            'pd': pd,
-            'np': np,
-            'plt': plt,
-            'sns': sns,
-            'pandas': pd,
-            'numpy': np,
-            'matplotlib': matplotlib,
-            # 额外的常用模块
-            'datetime': datetime,
-            'math': math,
-            'statistics': statistics,
-            'json': json_module,
-            'collections': collections,
-            're': re_module,
-        }
-
-        # 捕获输出
-        stdout_capture = io.StringIO()
-        stderr_capture = io.StringIO()
-        charts = []
-
-        try:
-            # ========== 预设高级图表样式 ==========
-            # 中文字体
-            chinese_fonts = [
-                'Heiti TC', 'STHeiti', 'PingFang HK', 'Hiragino Sans GB',
-                'SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans'
-            ]
-            plt.rcParams['font.sans-serif'] = chinese_fonts
-            plt.rcParams['axes.unicode_minus'] = False
-
-            # 高级默认样式
-            plt.rcParams['figure.figsize'] = [12, 7]
-            plt.rcParams['figure.dpi'] = 200
-            plt.rcParams['font.size'] = 12
-            plt.rcParams['axes.titlesize'] = 18
-            plt.rcParams['axes.titleweight'] = 'bold'
-            plt.rcParams['axes.labelsize'] = 14
-            plt.rcParams['xtick.labelsize'] = 12
-            plt.rcParams['ytick.labelsize'] = 12
-            plt.rcParams['legend.fontsize'] = 12
-            plt.rcParams['axes.spines.top'] = False
-            plt.rcParams['axes.spines.right'] = False
-            plt.rcParams['axes.grid'] = True
-            plt.rcParams['grid.alpha'] = 0.3
-            plt.rcParams['grid.linestyle'] = '--'
-
-            self.logger.info(f"[CodeWizard] 开始 exec()...")
-            self._save_debug_log("sandbox_2_before_exec", f"即将执行代码，长度: {len(code)} 字符")
-
-            with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture):
-                exec(code, exec_globals)
-
-            self.logger.info(f"[CodeWizard] exec() 完成")
-
-            # exec 之后再次强制设置字体（防止 LLM 代码里的 sns.set() 等覆盖）
-            plt.rcParams['font.sans-serif'] = [
-                'Heiti TC', 'STHeiti', 'PingFang HK', 'Hiragino Sans GB',
-                'SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans'
-            ]
-            plt.rcParams['axes.unicode_minus'] = False
-
-            # 检查是否生成了图表
-            fig = plt.gcf()
-            stdout_value = stdout_capture.getvalue()
-            stderr_value = stderr_capture.getvalue()
-
-            self.logger.info(f"[CodeWizard] exec() 输出: stdout={len(stdout_value)}字符, stderr={len(stderr_value)}字符")
-            self._save_debug_log("sandbox_3_exec_output", f"stdout:\n{stdout_value}\n\nstderr:\n{stderr_value}")
-
-            if fig.get_axes():
-                self.logger.info(f"[CodeWizard] 检测到图表，开始捕获...")
-                # 重新应用字体到当前图表的所有文本元素
-                chinese_fonts = ['Heiti TC', 'STHeiti', 'PingFang HK', 'Hiragino Sans GB', 'Arial Unicode MS']
-                for ax in fig.get_axes():
-                    for text in ax.get_xticklabels() + ax.get_yticklabels():
-                        text.set_fontfamily(chinese_fonts)
-                    if ax.get_title():
-                        ax.title.set_fontfamily(chinese_fonts)
-                    if ax.get_xlabel():
-                        ax.xaxis.label.set_fontfamily(chinese_fonts)
-                    if ax.get_ylabel():
-                        ax.yaxis.label.set_fontfamily(chinese_fonts)
-
-                buf = io.BytesIO()
-                fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor='white')
-                buf.seek(0)
-                chart_b64 = base64.b64encode(buf.read()).decode('utf-8')
-                charts.append(chart_b64)
-                plt.close(fig)
-                self.logger.info(f"[CodeWizard] 图表捕获成功，base64长度: {len(chart_b64)}")
-            else:
-                self.logger.info(f"[CodeWizard] 未检测到图表")
-
-            result = {
-                "success": True,
-                "output": stdout_value,
-                "error": stderr_value if stderr_value else None,
-                "charts": charts
-            }
-            self._save_debug_log("sandbox_4_result", f"success=True, charts={len(charts)}, output_len={len(stdout_value)}")
-            self.logger.info(f"[CodeWizard] ✅ 沙箱执行成功，图表数: {len(charts)}")
-            return result
+        result = await get_sandbox_pool().execute(code)
+        stdout_value = result.get("output", "")
+        self._save_debug_log("sandbox_3_exec_output", f"stdout:\n{stdout_value}\n\nerror:\n{result.get('error')}")
 
-        except Exception as e:
-            plt.close('all')
-            stdout_value = stdout_capture.getvalue()
-            error_msg = str(e)
+        if not result.get("success"):
+            error_msg = result.get("error") or "Unknown error"
             self.logger.error(f"[CodeWizard] ❌ 沙箱执行失败: {error_msg}")
-            self._save_debug_log("sandbox_4_error", f"error: {error_msg}\n\nstdout:\n{stdout_value}\n\ntraceback:\n{repr(e)}")
+            self._save_debug_log("sandbox_4_error", f"error: {error_msg}\n\nstdout:\n{stdout_value}")
             return {
                 "success": False,
                 "output": stdout_value,
                 "error": error_msg,
                 "charts": []
             }
+
+        charts = []
+        for png_bytes in result.get("images", []):
+            charts.append(await asyncio.to_thread(self._store_chart_image, png_bytes))
+            self.logger.info(f"[CodeWizard] 图表捕获成功，PNG 大小: {len(png_bytes)} 字节")
+
+        self._save_debug_log("sandbox_4_result", f"success=True, charts={len(charts)}, output_len={len(stdout_value)}")
+        self.logger.info(f"[CodeWizard] ✅ 沙箱执行成功，图表数: {len(charts)}")
+        return {
+            "success": True,
+            "output": stdout_value,
+            "error": result.get("error"),
+            "charts": charts
+        }
@@ -9,10 +9,11 @@ DeepResearch V2.0 - 首席笔杆 Agent (LeadWriter)
 """
 
 import uuid
+import asyncio
 from typing import Dict, Any, List
 from datetime import datetime
 
-from .base import BaseAgent
+from .base import BaseAgent, JsonFieldStreamExtractor
 from ..state import ResearchState, ResearchPhase
 
 
@@ -208,7 +209,19 @@ class LeadWriter(BaseAgent):
 }}
 ```"""
 
-    def __init__(self, llm_api_key: str, llm_base_url: str, model: str = "qwen-max"):
+    # 流式输出时累计多少字符推送一次 section_delta
+    STREAM_FLUSH_CHARS = 40
+
+    # 撰写失败的章节在草稿中的占位内容
+    FAILED_SECTION_PLACEHOLDER = "> ⚠️ 本章节撰写失败，内容缺失。"
+
+    def __init__(
+        self,
+        llm_api_key: str,
+        llm_base_url: str,
+        model: str = "qwen-max",
+        max_concurrent_sections: int = 4
+    ):
         super().__init__(
             name="LeadWriter",
             role="首席笔杆",
@@ -216,6 +229,8 @@ class LeadWriter(BaseAgent):
             llm_base_url=llm_base_url,
             model=model
         )
+        # 同时撰写的章节数上限，1 表示逐章节串行撰写
+        self.max_concurrent_sections = max(1, max_concurrent_sections)
 
     async def process(self, state: ResearchState) -> ResearchState:
         """处理入口"""
@@ -228,6 +243,20 @@ class LeadWriter(BaseAgent):
 
     async def _write_report(self, state: ResearchState) -> ResearchState:
         """撰写报告"""
+        self.begin_writing(state)
+
+        # 并发撰写各章节（章节之间只读共享事实，互不依赖）
+        await self._write_sections(state, self.pending_sections(state))
+
+        await self.finish_writing(state)
+        return state
+
+    def pending_sections(self, state: ResearchState) -> List[Dict]:
+        """尚未撰写的章节"""
+        return [s for s in state["outline"] if s.get("status") not in ["final", "drafted"]]
+
+    def begin_writing(self, state: ResearchState) -> None:
+        """发送写作开始事件"""
         # 发送 research_step 开始事件
         # 注意: step_type 必须是 "writing" 以匹配 graph.py 发送的 phase 事件
         self.add_message(state, "research_step", {
@@ -244,14 +273,18 @@ class LeadWriter(BaseAgent):
             "content": "开始撰写深度研究报告..."
         })
 
-        # 逐章节撰写
-        for section in state["outline"]:
-            if section.get("status") not in ["final", "drafted"]:
-                await self._write_section(state, section)
-
+    async def finish_writing(self, state: ResearchState) -> None:
+        """整合报告并进入审核阶段"""
         # 整合报告
         await self._synthesize_report(state)
 
+        # 撰写失败的章节在报告末尾列出，避免报告缺少章节却没有任何提示
+        failed = [s.get("title") for s in state["outline"] if s.get("write_error")]
+        if failed:
+            state["final_report"] = (
+                f"{state.get('final_report', '')}\n\n> ⚠️ 以下章节撰写失败，内容未包含在本报告中：{'、'.join(failed)}"
+            )
+
         # 发送 research_step 完成事件
         word_count = len(state.get("final_report", ""))
         self.add_message(state, "research_step", {
@@ -269,10 +302,85 @@ class LeadWriter(BaseAgent):
         # 更新阶段
         state["phase"] = ResearchPhase.REVIEWING.value
 
-        return state
+    async def _write_sections(self, state: ResearchState, sections: List[Dict]) -> None:
+        """
+        有界并发地撰写多个章节
+
+        章节完成顺序不确定，因此 draft_sections 和参考文献编号
+        在全部完成后按大纲顺序统一整理，保证结果与串行撰写一致。
+        """
+        if not sections:
+            return
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_sections)
+
+        async def write_bounded(section: Dict) -> List[Dict]:
+            async with semaphore:
+                return await self.write_section(state, section)
+
+        self.logger.info(f"Writing {len(sections)} sections (concurrency={self.max_concurrent_sections})")
+        results = await asyncio.gather(*[write_bounded(s) for s in sections], return_exceptions=True)
+        self.collect_section_results(state, sections, results)
+
+    def collect_section_results(self, state: ResearchState, sections: List[Dict], results: List[Any]) -> None:
+        """按大纲顺序整理章节撰写结果（参考文献编号、章节草稿顺序）"""
+        for section, result in zip(sections, results):
+            if isinstance(result, Exception):
+                self._mark_section_failed(state, section, str(result) or type(result).__name__)
+                continue
+            if section.get("status") != "drafted":
+                self._mark_section_failed(state, section, "未生成章节内容")
+                continue
+
+            # 按大纲顺序编号参考文献
+            for citation in result:
+                state["references"].append({
+                    "id": len(state["references"]) + 1,
+                    "marker": citation.get("marker"),
+                    "source": citation.get("source"),
+                    "url": citation.get("url", "")
+                })
+
+        # 按大纲顺序重排章节草稿
+        drafts = state["draft_sections"]
+        ordered = {s["id"]: drafts[s["id"]] for s in state["outline"] if s["id"] in drafts}
+        ordered.update({k: v for k, v in drafts.items() if k not in ordered})
+        state["draft_sections"] = ordered
+
+    def _mark_section_failed(self, state: ResearchState, section: Dict, reason: str) -> None:
+        """
+        记录撰写失败的章节：报告中保留该章节的占位说明，并推送可见的提示
+
+        章节状态不变，从检查点恢复或修订时会重新撰写。
+        """
+        section_id = section["id"]
+        title = section.get("title")
+        self.logger.error(f"Failed to write section {title}: {reason}")
+        state["errors"].append(f"章节「{title}」撰写失败: {reason}")
+        section["write_error"] = reason
+
+        placeholder = self.FAILED_SECTION_PLACEHOLDER
+        state["draft_sections"][section_id] = placeholder
+        self.add_message(state, "section_content", {
+            "agent": self.name,
+            "section_id": section_id,
+            "section_title": title,
+            "content": placeholder,
+            "word_count": 0,
+            "key_points": []
+        })
+        self.add_message(state, "observation", {
+            "agent": self.name,
+            "content": f"⚠️ 章节「{title}」撰写失败，报告中该章节内容缺失\n原因: {reason}"
+        })
+
+    async def write_section(self, state: ResearchState, section: Dict) -> List[Dict]:
+        """
+        撰写单个章节
 
-    async def _write_section(self, state: ResearchState, section: Dict) -> None:
-        """撰写单个章节"""
+        Returns:
+            本章节的引用列表（由调用方按大纲顺序编号）
+        """
         section_id = section["id"]
         self.logger.info(f"Writing section: {section.get('title')}")
 
@@ -315,13 +423,56 @@ class LeadWriter(BaseAgent):
             charts_info="\n".join(charts_info) if charts_info else "（暂无图表）"
         )
 
-        response = await self.call_llm(
+        # 流式生成：边生成边把 content 字段的增量推送给前端
+        extractor = JsonFieldStreamExtractor("content")
+        pending: List[str] = []
+        pending_len = 0
+
+        def flush_delta() -> None:
+            nonlocal pending_len
+            if not pending:
+                return
+            self.add_message(state, "section_delta", {
+                "agent": self.name,
+                "section_id": section_id,
+                "section_title": section.get("title"),
+                "delta": "".join(pending)
+            }, persist=False)
+            pending.clear()
+            pending_len = 0
+
+        def on_retry() -> None:
+            # 重新生成前通知前端清空本章节已推送的内容
+            nonlocal extractor, pending_len
+            extractor = JsonFieldStreamExtractor("content")
+            pending.clear()
+            pending_len = 0
+            self.add_message(state, "section_reset", {
+                "agent": self.name,
+                "section_id": section_id,
+                "section_title": section.get("title")
+            }, persist=False)
+
+        def on_delta(text: str) -> None:
+            nonlocal pending_len
+            piece = extractor.feed(text)
+            if not piece:
+                return
+            pending.append(piece)
+            pending_len += len(piece)
+            if pending_len >= self.STREAM_FLUSH_CHARS or "\n" in piece or extractor.done:
+                flush_delta()
+
+        response = await self.call_llm_stream(
             system_prompt="你是顶级的行业研究分析师，擅长撰写专业的研究报告。",
             user_prompt=prompt,
+            on_delta=on_delta,
+            on_retry=on_retry,
             json_mode=True,
             temperature=0.4,
             max_tokens=16000  # 拉满到最大值
         )
+        flush_delta()
 
         result = self.parse_json_response(response)
 
@@ -329,15 +480,7 @@ class LeadWriter(BaseAgent):
             section_content = result["content"]
             state["draft_sections"][section_id] = section_content
             section["status"] = "drafted"
-
-            # 收集引用
-            for citation in result.get("citations", []):
-                state["references"].append({
-                    "id": len(state["references"]) + 1,
-                    "marker": citation.get("marker"),
-                    "source": citation.get("source"),
-                    "url": citation.get("url", "")
-                })
+            section.pop("write_error", None)
 
             # 发送章节内容到"过程报告" - 包含完整内容用于流式显示
             self.add_message(state, "section_content", {
@@ -355,6 +498,10 @@ class LeadWriter(BaseAgent):
                 "content": f"章节「{section.get('title')}」撰写完成\n字数: {len(section_content)}\n要点: {', '.join(result.get('key_points', [])[:2]) if result.get('key_points') else '无'}"
             })
 
+            return result.get("citations", [])
+
+        return []
+
     async def _synthesize_report(self, state: ResearchState) -> None:
         """整合完整报告"""
         self.add_message(state, "thought", {
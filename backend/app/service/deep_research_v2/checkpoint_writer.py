@@ -0,0 +1,173 @@
+"""
+DeepResearch V2.0 - 后台检查点写入器
+
+检查点保存是同步的数据库 I/O，直接在事件循环中执行会阻塞所有会话的 SSE 推送。
+写入器使用专用的工作线程：
+1. submit 在事件循环中对状态做深拷贝后立即返回
+2. 同一会话尚未开始写入的检查点会被新的检查点合并（只写最新的一份）
+3. 写入完成后通过 call_soon_threadsafe 在事件循环中回调（用于推送 checkpoint_saved）
+4. flush 等待某会话所有已提交的检查点写完（完成、取消、失败时调用）
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .event_log import EventLog
+
+logger = logging.getLogger("CheckpointWriter")
+
+
+def _deep_copy(value: Any) -> Any:
+    """递归拷贝字典和列表（其余值视为不可变，直接共享）"""
+    if isinstance(value, dict):
+        return {k: _deep_copy(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_deep_copy(item) for item in value]
+    return value
+
+
+def snapshot_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    在事件循环中对状态做深拷贝
+
+    Agent 会继续修改状态中任意层级的列表和字典，拷贝后写入线程序列化时不会遇到并发修改。
+    以 "_" 开头的运行时字段不拷贝；事件日志转为字典列表（不需要持久化的 SSE 消息保存为空列表）。
+    """
+    snapshot: Dict[str, Any] = {}
+    for key, value in state.items():
+        if key.startswith("_"):
+            continue
+        if isinstance(value, EventLog):
+            snapshot[key] = _deep_copy(value.to_list()) if value.persist else []
+        else:
+            snapshot[key] = _deep_copy(value)
+    return snapshot
+
+
+class CheckpointWriter:
+    """后台检查点写入器"""
+
+    def __init__(self, checkpoint_service):
+        self.checkpoint_service = checkpoint_service
+
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending: Dict[str, Dict[str, Any]] = {}   # 等待写入的最新检查点
+        self._submitted: Dict[str, int] = {}            # 每个会话已提交的版本号
+        self._written: Dict[str, int] = {}              # 每个会话已写完的版本号
+        self._cond = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        session_id: str,
+        state: Dict[str, Any],
+        user_id: Optional[str] = None,
+        on_saved: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> None:
+        """
+        提交检查点（必须在事件循环中调用）
+
+        Args:
+            session_id: 研究会话 ID
+            state: ResearchState
+            user_id: 用户 ID
+            on_saved: 写入成功后在事件循环中调用，参数为 checkpoint_saved 事件
+        """
+        job = {
+            "state": snapshot_state(state),
+            "user_id": user_id,
+            "on_saved": on_saved,
+            "loop": asyncio.get_running_loop(),
+        }
+
+        with self._cond:
+            version = self._submitted.get(session_id, 0) + 1
+            self._submitted[session_id] = version
+            job["version"] = version
+            coalesced = session_id in self._pending
+            self._pending[session_id] = job
+
+        if coalesced:
+            logger.debug(f"Checkpoint for {session_id} coalesced (version {version})")
+        else:
+            self._queue.put(session_id)
+
+    def _run(self):
+        while True:
+            session_id = self._queue.get()
+            with self._cond:
+                job = self._pending.pop(session_id, None)
+            if job is None:
+                continue
+
+            state = job["state"]
+            checkpoint_id = None
+            try:
+                checkpoint_id = self.checkpoint_service.save_checkpoint(
+                    session_id=session_id,
+                    state=state,
+                    user_id=job["user_id"]
+                )
+            except Exception as e:
+                logger.warning(f"Failed to save checkpoint for {session_id}: {e}")
+
+            with self._cond:
+                self._written[session_id] = max(self._written.get(session_id, 0), job["version"])
+                self._cond.notify_all()
+
+            if checkpoint_id and job["on_saved"]:
+                event = {"type": "checkpoint_saved", "phase": state.get("phase", ""), "session_id": session_id}
+                try:
+                    job["loop"].call_soon_threadsafe(job["on_saved"], event)
+                except RuntimeError:
+                    # 事件循环已关闭
+                    pass
+
+    def _wait_written(self, session_id: str, version: int, timeout: Optional[float]) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._written.get(session_id, 0) >= version, timeout=timeout)
+
+    async def flush(self, session_id: str, timeout: Optional[float] = 60.0) -> bool:
+        """
+        等待该会话已提交的检查点全部写完
+
+        Returns:
+            是否在超时前写完
+        """
+        with self._cond:
+            version = self._submitted.get(session_id, 0)
+        if version == 0:
+            return True
+
+        done = await asyncio.to_thread(self._wait_written, session_id, version, timeout)
+        if not done:
+            logger.warning(f"Checkpoint flush timed out for {session_id}")
+            return False
+
+        with self._cond:
+            # 已全部写完，清理计数
+            if self._submitted.get(session_id) == version:
+                self._submitted.pop(session_id, None)
+                self._written.pop(session_id, None)
+        return True
+
+
+# 单例
+_checkpoint_writer: Optional[CheckpointWriter] = None
+_checkpoint_writer_lock = threading.Lock()
+
+
+def get_checkpoint_writer(checkpoint_service) -> Optional[CheckpointWriter]:
+    """获取检查点写入器实例（检查点服务不可用时返回 None）"""
+    global _checkpoint_writer
+    if checkpoint_service is None:
+        return None
+    with _checkpoint_writer_lock:
+        if _checkpoint_writer is None:
+            _checkpoint_writer = CheckpointWriter(checkpoint_service)
+        return _checkpoint_writer
@@ -0,0 +1,230 @@
+"""
+DeepResearch V2.0 - 会话事件总线
+
+替代原来 0.5 秒超时轮询消息队列、每次循环同步查询 Redis 取消标志的方式：
+1. Agent 通过 state["_message_queue"].put_nowait 发布事件（接口不变）
+2. 每个会话一个消费者，同时等待「新事件 / Agent 结束 / 取消信号」，没有超时轮询
+3. 取消通过推送到达：同进程内直接置位 asyncio.Event，跨进程通过 Redis pub/sub 通知
+4. 长时间没有事件时按定时器产出心跳，保持 SSE 连接
+
+Redis pub/sub 不可用时，降级为低频检查取消标志（CANCEL_POLL_INTERVAL）。
+
+可通过环境变量配置：
+    RESEARCH_HEARTBEAT_INTERVAL   心跳间隔，秒（默认 15）
+    RESEARCH_CANCEL_POLL_INTERVAL pub/sub 不可用时检查取消标志的间隔，秒（默认 5）
+"""
+
+import os
+import asyncio
+import logging
+import weakref
+from datetime import datetime
+from typing import Any, AsyncGenerator, Callable, Dict, Optional
+
+logger = logging.getLogger("EventBus")
+
+HEARTBEAT_INTERVAL = float(os.getenv("RESEARCH_HEARTBEAT_INTERVAL", "15"))
+CANCEL_POLL_INTERVAL = float(os.getenv("RESEARCH_CANCEL_POLL_INTERVAL", "5"))
+
+# 取消通知频道前缀
+CANCEL_CHANNEL_PREFIX = "research:cancel_channel:"
+# 取消标志 key 前缀（取消接口写入，订阅建立前发出的取消由它补上）
+CANCEL_KEY_PREFIX = "research:cancel:"
+
+# 当前进程中正在运行的会话
+_active_buses: "weakref.WeakValueDictionary[str, SessionEventBus]" = weakref.WeakValueDictionary()
+
+
+def _get_async_redis():
+    try:
+        from core.redis_client import get_async_redis_client
+    except ImportError:
+        from app.core.redis_client import get_async_redis_client
+    return get_async_redis_client()
+
+
+def _get_redis():
+    try:
+        from core.redis_client import get_redis_client
+    except ImportError:
+        from app.core.redis_client import get_redis_client
+    return get_redis_client()
+
+
+class SessionEventBus:
+    """单个研究会话的事件总线（必须在事件循环中创建）"""
+
+    def __init__(
+        self,
+        session_id: str,
+        check_cancel_flag: Optional[Callable[[str], bool]] = None,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL
+    ):
+        """
+        Args:
+            session_id: 研究会话 ID
+            check_cancel_flag: 同步检查取消标志的函数（pub/sub 不可用时降级使用）
+            heartbeat_interval: 心跳间隔，秒
+        """
+        self.session_id = session_id
+        self.check_cancel_flag = check_cancel_flag
+        self.heartbeat_interval = heartbeat_interval
+
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.cancelled = asyncio.Event()
+
+        self._get_task: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.cancelled.is_set()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """发布事件（事件循环线程中调用）"""
+        self.queue.put_nowait(event)
+
+    def cancel(self) -> None:
+        """发出取消信号"""
+        if not self.cancelled.is_set():
+            logger.info(f"Cancel signal received for session {self.session_id}")
+            self.cancelled.set()
+
+    async def start(self) -> None:
+        """注册到当前进程并开始监听跨进程取消通知"""
+        if self.session_id:
+            _active_buses[self.session_id] = self
+            self._listener = asyncio.create_task(self._listen_cancel())
+
+    async def close(self) -> None:
+        """停止监听并释放资源"""
+        if self.session_id and _active_buses.get(self.session_id) is self:
+            _active_buses.pop(self.session_id, None)
+        for task in (self._listener, self._get_task):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._listener is not None:
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._listener = None
+        self._get_task = None
+
+    async def _listen_cancel(self):
+        """订阅取消频道；订阅失败时降级为低频检查取消标志"""
+        channel = f"{CANCEL_CHANNEL_PREFIX}{self.session_id}"
+        try:
+            pubsub = _get_async_redis().pubsub()
+            await pubsub.subscribe(channel)
+        except Exception as e:
+            logger.warning(f"Redis pub/sub unavailable, polling cancel flag every {CANCEL_POLL_INTERVAL}s: {e}")
+            await self._poll_cancel_flag()
+            return
+
+        try:
+            # 订阅建立前发出的取消通知收不到，订阅后补查一次取消标志
+            if await self._cancel_flag_set():
+                self.cancel()
+                return
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    self.cancel()
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cancel listener for {self.session_id} failed: {e}")
+            await self._poll_cancel_flag()
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+    async def _cancel_flag_set(self) -> bool:
+        if self.check_cancel_flag is None:
+            return False
+        try:
+            return bool(await asyncio.to_thread(self.check_cancel_flag, self.session_id))
+        except Exception as e:
+            logger.warning(f"Failed to check cancel flag: {e}")
+            return False
+
+    async def _poll_cancel_flag(self):
+        if self.check_cancel_flag is None:
+            return
+        while not self.cancelled.is_set():
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+            if await self._cancel_flag_set():
+                self.cancel()
+
+    def _heartbeat(self) -> Dict[str, Any]:
+        return {"type": "heartbeat", "timestamp": datetime.now().isoformat()}
+
+    async def consume(self, task: asyncio.Future) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        在任务执行期间产出事件
+
+        同时等待新事件、任务结束和取消信号，空闲超过心跳间隔时产出心跳。
+        任务结束或收到取消信号时返回（返回前不会丢失已取出的事件），
+        任务结束后队列中剩余的事件通过 drain 取出。
+        """
+        cancel_wait = asyncio.ensure_future(self.cancelled.wait())
+        try:
+            while True:
+                if self._get_task is None:
+                    self._get_task = asyncio.ensure_future(self.queue.get())
+
+                done, _ = await asyncio.wait(
+                    {self._get_task, task, cancel_wait},
+                    timeout=self.heartbeat_interval,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if self._get_task in done:
+                    event = self._get_task.result()
+                    self._get_task = None
+                    yield event
+                    continue
+                if cancel_wait in done or task in done:
+                    return
+                if not done:
+                    yield self._heartbeat()
+        finally:
+            if not cancel_wait.done():
+                cancel_wait.cancel()
+
+    def drain(self):
+        """取出已到达但尚未产出的事件"""
+        drained = []
+        if self._get_task is not None and self._get_task.done() and not self._get_task.cancelled():
+            drained.append(self._get_task.result())
+            self._get_task = None
+        while not self.queue.empty():
+            drained.append(self.queue.get_nowait())
+        return drained
+
+
+def cancel_local_session(session_id: str) -> bool:
+    """向当前进程中运行的会话发送取消信号，返回该会话是否在本进程中"""
+    bus = _active_buses.get(session_id)
+    if bus is None:
+        return False
+    bus.cancel()
+    return True
+
+
+def publish_cancel(session_id: str) -> int:
+    """
+    通过 Redis pub/sub 通知所有进程取消会话
+
+    Returns:
+        收到通知的订阅者数量（Redis 不可用时为 0）
+    """
+    try:
+        return _get_redis().publish(f"{CANCEL_CHANNEL_PREFIX}{session_id}", "cancel")
+    except Exception as e:
+        logger.warning(f"Failed to publish cancel for {session_id}: {e}")
+        return 0
@@ -0,0 +1,258 @@
+"""
+DeepResearch V2.0 - 有界事件日志
+
+state["messages"] 和 state["logs"] 原本是无限增长的字典列表，长会话会在每个 Agent 和每次检查点中
+携带成千上万条带完整章节内容和 ISO 时间字符串的记录。这里改为环形缓冲：
+1. 记录使用 __slots__ 对象，时间戳存单调时钟浮点数，只在输出时格式化
+2. 内存中只保留最近 maxlen 条（用于回放），超出的记录被挤出
+3. 可选落盘：被挤出的记录追加写入会话目录下的 JSONL 文件，可通过 iter_all 完整读回
+
+可通过环境变量配置：
+    RESEARCH_EVENT_BUFFER      state["messages"] 内存保留条数（默认 256）
+    RESEARCH_LOG_BUFFER        state["logs"] 内存保留条数（默认 500）
+    RESEARCH_EVENT_SPILL_DIR   落盘目录（默认不落盘，挤出的记录直接丢弃）
+"""
+
+import os
+import json
+import time
+import logging
+import itertools
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger("EventLog")
+
+RESEARCH_EVENT_BUFFER = int(os.getenv("RESEARCH_EVENT_BUFFER", "256"))
+RESEARCH_LOG_BUFFER = int(os.getenv("RESEARCH_LOG_BUFFER", "500"))
+RESEARCH_EVENT_SPILL_DIR = os.getenv("RESEARCH_EVENT_SPILL_DIR", "")
+
+# 单调时钟与墙上时间的换算基准
+_WALL_ANCHOR = time.time() - time.monotonic()
+
+
+def _format_timestamp(monotonic: float) -> str:
+    return datetime.fromtimestamp(_WALL_ANCHOR + monotonic).isoformat()
+
+
+def _parse_timestamp(value: Any) -> float:
+    """ISO 时间字符串转为单调时钟值（用于从检查点恢复）"""
+    try:
+        return datetime.fromisoformat(value).timestamp() - _WALL_ANCHOR
+    except (TypeError, ValueError):
+        return time.monotonic()
+
+
+class EventRecord:
+    """SSE 事件记录"""
+
+    __slots__ = ("seq", "type", "agent", "monotonic", "content")
+
+    def __init__(self, type: str, agent: str, content: Any, monotonic: Optional[float] = None):
+        self.seq = 0
+        self.type = type
+        self.agent = agent
+        self.monotonic = time.monotonic() if monotonic is None else monotonic
+        self.content = content
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "agent": self.agent,
+            "timestamp": _format_timestamp(self.monotonic),
+            "content": self.content
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EventRecord":
+        return cls(
+            type=data.get("type", ""),
+            agent=data.get("agent", ""),
+            content=data.get("content"),
+            monotonic=_parse_timestamp(data.get("timestamp"))
+        )
+
+
+class LogRecord(EventRecord):
+    """Agent 执行日志记录"""
+
+    __slots__ = ("input_summary", "output_summary", "duration_ms", "tokens_used")
+
+    def __init__(
+        self,
+        agent: str,
+        action: str,
+        input_summary: str,
+        output_summary: str,
+        duration_ms: int,
+        tokens_used: int = 0,
+        monotonic: Optional[float] = None
+    ):
+        super().__init__(type=action, agent=agent, content=None, monotonic=monotonic)
+        self.input_summary = input_summary
+        self.output_summary = output_summary
+        self.duration_ms = duration_ms
+        self.tokens_used = tokens_used
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": _format_timestamp(self.monotonic),
+            "agent": self.agent,
+            "action": self.type,
+            "input_summary": self.input_summary,
+            "output_summary": self.output_summary,
+            "duration_ms": self.duration_ms,
+            "tokens_used": self.tokens_used
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LogRecord":
+        return cls(
+            agent=data.get("agent", ""),
+            action=data.get("action", ""),
+            input_summary=data.get("input_summary", ""),
+            output_summary=data.get("output_summary", ""),
+            duration_ms=data.get("duration_ms", 0),
+            tokens_used=data.get("tokens_used", 0),
+            monotonic=_parse_timestamp(data.get("timestamp"))
+        )
+
+
+class EventLog:
+    """
+    环形事件日志
+
+    迭代时按时间顺序产出字典（与原来的列表元素格式一致）。
+    """
+
+    def __init__(
+        self,
+        maxlen: int = RESEARCH_EVENT_BUFFER,
+        spill_path: Optional[str] = None,
+        persist: bool = True
+    ):
+        """
+        Args:
+            maxlen: 内存中保留的最大条数
+            spill_path: 被挤出记录的 JSONL 落盘路径（None 表示不落盘）
+            persist: 是否写入检查点（SSE 消息只用于回放，不需要随检查点保存）
+        """
+        self.maxlen = maxlen
+        self.spill_path = spill_path
+        self.persist = persist
+
+        self._records: deque = deque()
+        self._seq = itertools.count(1)
+        self._spill_file = None
+        self._spilled = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for record in list(self._records):
+            yield record.to_dict()
+
+    @property
+    def total(self) -> int:
+        """累计写入条数（含已挤出的）"""
+        return len(self._records) + self._spilled
+
+    @property
+    def last_seq(self) -> int:
+        return self._records[-1].seq if self._records else 0
+
+    def append(self, record: EventRecord) -> None:
+        """追加记录，超出容量时挤出最旧的一条"""
+        record.seq = next(self._seq)
+        self._records.append(record)
+        if len(self._records) > self.maxlen:
+            self._evict(self._records.popleft())
+
+    def _evict(self, record: EventRecord):
+        self._spilled += 1
+        if not self.spill_path:
+            return
+        try:
+            if self._spill_file is None:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+            data = record.to_dict()
+            data["seq"] = record.seq
+            self._spill_file.write(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+        except Exception as e:
+            logger.warning(f"Failed to spill event to {self.spill_path}: {e}")
+            self.spill_path = None
+
+    def since(self, seq: int) -> List[Dict[str, Any]]:
+        """返回内存中序号大于 seq 的记录（用于断线回放）"""
+        return [record.to_dict() for record in list(self._records) if record.seq > seq]
+
+    def recent(self, n: int) -> List[Dict[str, Any]]:
+        """最近 n 条记录"""
+        records = list(self._records)
+        return [record.to_dict() for record in records[-n:]] if n > 0 else []
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """先读回落盘的记录，再产出内存中的记录"""
+        if self._spill_file is not None:
+            self._spill_file.flush()
+        if self.spill_path and os.path.exists(self.spill_path):
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        yield from self
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """序列化内存中的记录（用于检查点）"""
+        return list(self)
+
+    def close(self):
+        """关闭落盘文件"""
+        if self._spill_file is not None:
+            try:
+                self._spill_file.close()
+            except Exception:
+                pass
+            self._spill_file = None
+
+
+def _spill_path(session_id: str, name: str) -> Optional[str]:
+    if not RESEARCH_EVENT_SPILL_DIR or not session_id:
+        return None
+    return os.path.join(RESEARCH_EVENT_SPILL_DIR, session_id, f"{name}.jsonl")
+
+
+def create_message_log(session_id: str, records: Iterable[Dict[str, Any]] = ()) -> EventLog:
+    """创建 state["messages"] 事件日志"""
+    log = EventLog(RESEARCH_EVENT_BUFFER, _spill_path(session_id, "messages"), persist=False)
+    for data in records:
+        log.append(EventRecord.from_dict(data))
+    return log
+
+
+def create_execution_log(session_id: str, records: Iterable[Dict[str, Any]] = ()) -> EventLog:
+    """创建 state["logs"] 执行日志"""
+    log = EventLog(RESEARCH_LOG_BUFFER, _spill_path(session_id, "logs"))
+    for data in records:
+        log.append(LogRecord.from_dict(data))
+    return log
+
+
+def attach_event_logs(state: Dict[str, Any]) -> None:
+    """把从检查点恢复的列表重新包装为事件日志"""
+    session_id = state.get("session_id", "")
+    if not isinstance(state.get("messages"), EventLog):
+        state["messages"] = create_message_log(session_id, state.get("messages") or [])
+    if not isinstance(state.get("logs"), EventLog):
+        state["logs"] = create_execution_log(session_id, state.get("logs") or [])
+
+
+def close_event_logs(state: Dict[str, Any]) -> None:
+    """会话结束时关闭落盘文件"""
+    for key in ("messages", "logs"):
+        value = state.get(key)
+        if isinstance(value, EventLog):
+            value.close()
@@ -0,0 +1,366 @@
+"""
+DeepResearch V2.0 - 可续传的研究事件流
+
+研究在后台任务中运行，与 HTTP 连接解耦：
+1. 研究产生的每个事件写入会话事件流（Redis Streams，流 ID 单调递增，作为 SSE 的 id）
+2. HTTP 连接只是事件流的订阅者，断开不会中止研究
+3. 重连时携带 Last-Event-ID，从该 ID 之后回放，不再从检查点重跑、重复消耗 LLM
+4. 运行中的会话在 Redis 中持有租约（定期续期），其他 worker 进程据此判断研究是否仍在运行
+
+Redis 不可用时，事件流退化为进程内内存实现（只能在同一进程内续传）。
+
+可通过环境变量配置：
+    RESEARCH_STREAM_MAXLEN   每个会话事件流保留的最大事件数（默认 5000）
+    RESEARCH_STREAM_TTL      事件流在最后一次写入后的保留时间，秒（默认 86400）
+    RESEARCH_STREAM_LEASE    运行租约有效期，秒（默认 60）
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
+
+from .event_bus import HEARTBEAT_INTERVAL
+
+logger = logging.getLogger("EventStream")
+
+RESEARCH_STREAM_MAXLEN = int(os.getenv("RESEARCH_STREAM_MAXLEN", "5000"))
+RESEARCH_STREAM_TTL = int(os.getenv("RESEARCH_STREAM_TTL", "86400"))
+RESEARCH_STREAM_LEASE = int(os.getenv("RESEARCH_STREAM_LEASE", "60"))
+
+STREAM_KEY_PREFIX = "research:events:"
+LEASE_KEY_PREFIX = "research:running:"
+
+# 事件流结束标记（不推送给客户端）
+STREAM_END = "stream_end"
+
+# Redis 出错后暂停使用的时间（秒）
+REDIS_RETRY_AFTER = 30.0
+
+
+def format_sse(event: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """格式化为 SSE 事件（带 id 时客户端可用 Last-Event-ID 续传）"""
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    if event_id:
+        return f"id: {event_id}\ndata: {data}\n\n"
+    return f"data: {data}\n\n"
+
+
+def _parse_id(event_id: str) -> Tuple[int, int]:
+    try:
+        ms, _, seq = event_id.partition("-")
+        return int(ms), int(seq or 0)
+    except (AttributeError, ValueError):
+        return 0, 0
+
+
+def _get_async_redis():
+    try:
+        from core.redis_client import get_async_redis_client
+    except ImportError:
+        from app.core.redis_client import get_async_redis_client
+    return get_async_redis_client()
+
+
+class LocalEventStream:
+    """进程内事件流（Redis 不可用时使用），ID 格式与 Redis Streams 一致"""
+
+    def __init__(self, maxlen: int = RESEARCH_STREAM_MAXLEN):
+        self._entries: deque = deque(maxlen=maxlen)
+        self._last_ms = 0
+        self._seq = 0
+        self._changed = asyncio.Event()
+
+    def append(self, event: Dict[str, Any]) -> str:
+        now_ms = int(time.time() * 1000)
+        if now_ms > self._last_ms:
+            self._last_ms, self._seq = now_ms, 0
+        else:
+            self._seq += 1
+        event_id = f"{self._last_ms}-{self._seq}"
+        self._entries.append((event_id, event))
+
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        return event_id
+
+    async def read(self, last_id: str, block: float) -> List[Tuple[str, Dict[str, Any]]]:
+        after = _parse_id(last_id)
+        entries = [entry for entry in list(self._entries) if _parse_id(entry[0]) > after]
+        if entries:
+            return entries
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=block)
+        except asyncio.TimeoutError:
+            return []
+        return [entry for entry in list(self._entries) if _parse_id(entry[0]) > after]
+
+
+class EventStreamStore:
+    """会话事件流存储"""
+
+    def __init__(self):
+        self._local: Dict[str, LocalEventStream] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._redis_retry_at = 0.0
+
+    # ==================== Redis ====================
+
+    def _redis(self):
+        if time.monotonic() < self._redis_retry_at:
+            return None
+        try:
+            return _get_async_redis()
+        except Exception as e:
+            self._mark_redis_error(e)
+            return None
+
+    def _mark_redis_error(self, error: Exception):
+        logger.warning(f"Redis unavailable for research event stream: {error}")
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_AFTER
+
+    async def _use_redis(self) -> bool:
+        client = self._redis()
+        if client is None:
+            return False
+        try:
+            await client.ping()
+            return True
+        except Exception as e:
+            self._mark_redis_error(e)
+            return False
+
+    # ==================== 写入 ====================
+
+    async def open(self, session_id: str) -> None:
+        """为新的运行选择存储（Redis 不可用时使用进程内事件流）"""
+        if session_id in self._local or not await self._use_redis():
+            self._local.setdefault(session_id, LocalEventStream())
+
+    async def append(self, session_id: str, event: Dict[str, Any]) -> Optional[str]:
+        """写入事件，返回事件 ID"""
+        local = self._local.get(session_id)
+        if local is not None:
+            return local.append(event)
+
+        client = self._redis()
+        if client is None:
+            return self._local.setdefault(session_id, LocalEventStream()).append(event)
+
+        key = f"{STREAM_KEY_PREFIX}{session_id}"
+        data = json.dumps(event, ensure_ascii=False, default=str)
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.xadd(key, {"data": data}, maxlen=RESEARCH_STREAM_MAXLEN, approximate=True)
+                pipe.expire(key, RESEARCH_STREAM_TTL)
+                event_id, _ = await pipe.execute()
+            return event_id
+        except Exception as e:
+            # 写入失败后改用进程内事件流，保证当前连接仍能收到后续事件
+            self._mark_redis_error(e)
+            return self._local.setdefault(session_id, LocalEventStream()).append(event)
+
+    # ==================== 读取 ====================
+
+    async def exists(self, session_id: str) -> bool:
+        """会话事件流是否存在"""
+        if session_id in self._local:
+            return True
+        client = self._redis()
+        if client is None:
+            return False
+        try:
+            return bool(await client.exists(f"{STREAM_KEY_PREFIX}{session_id}"))
+        except Exception as e:
+            self._mark_redis_error(e)
+            return False
+
+    async def read(
+        self,
+        session_id: str,
+        last_id: str,
+        block: float = HEARTBEAT_INTERVAL
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """读取 last_id 之后的事件，没有新事件时最多阻塞 block 秒"""
+        local = self._local.get(session_id)
+        if local is not None:
+            return await local.read(last_id, block)
+
+        client = self._redis()
+        if client is None:
+            await asyncio.sleep(block)
+            return []
+        try:
+            response = await client.xread(
+                {f"{STREAM_KEY_PREFIX}{session_id}": last_id},
+                block=int(block * 1000),
+                count=200
+            )
+        except Exception as e:
+            self._mark_redis_error(e)
+            return []
+
+        entries = []
+        for _, items in response or []:
+            for event_id, fields in items:
+                try:
+                    entries.append((event_id, json.loads(fields.get("data", "{}"))))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    # ==================== 运行租约 ====================
+
+    async def is_running(self, session_id: str) -> bool:
+        """研究是否仍在运行（本进程或其他 worker 进程）"""
+        task = self._tasks.get(session_id)
+        if task is not None and not task.done():
+            return True
+        if session_id in self._local:
+            return False
+        client = self._redis()
+        if client is None:
+            return False
+        try:
+            return bool(await client.exists(f"{LEASE_KEY_PREFIX}{session_id}"))
+        except Exception as e:
+            self._mark_redis_error(e)
+            return False
+
+    async def _set_lease(self, session_id: str, held: bool, ttl: int = RESEARCH_STREAM_LEASE):
+        if session_id in self._local:
+            return
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            key = f"{LEASE_KEY_PREFIX}{session_id}"
+            if held:
+                await client.set(key, "1", ex=ttl)
+            else:
+                await client.delete(key)
+        except Exception as e:
+            self._mark_redis_error(e)
+
+    async def _keep_lease(self, session_id: str):
+        while True:
+            await asyncio.sleep(RESEARCH_STREAM_LEASE / 3)
+            await self._set_lease(session_id, True)
+
+    async def reserve(self, session_id: str, ttl: int) -> bool:
+        """
+        为排队中的研究持有租约（由其他 worker 进程执行，要求 Redis 可用）
+
+        Returns:
+            是否成功（Redis 不可用时返回 False）
+        """
+        if session_id in self._local or not await self._use_redis():
+            return False
+        await self._set_lease(session_id, True, ttl)
+        return True
+
+    async def release(self, session_id: str) -> None:
+        """释放租约（排队的研究被取消或过期时调用）"""
+        await self._set_lease(session_id, False)
+
+    @property
+    def running_count(self) -> int:
+        """本进程中正在运行的研究数量"""
+        return sum(1 for task in self._tasks.values() if not task.done())
+
+    # ==================== 后台运行 ====================
+
+    async def start(self, session_id: str, events: AsyncIterator[Dict[str, Any]]) -> asyncio.Task:
+        """
+        在后台任务中运行研究，事件写入会话事件流
+
+        Args:
+            session_id: 研究会话 ID
+            events: 研究事件异步迭代器（如 DeepResearchV2Service.research_events）
+
+        Returns:
+            后台任务
+        """
+        await self.open(session_id)
+        await self._set_lease(session_id, True)
+        task = asyncio.create_task(self._run(session_id, events))
+        self._tasks[session_id] = task
+
+        def _forget(finished: asyncio.Task):
+            if self._tasks.get(session_id) is finished:
+                self._tasks.pop(session_id, None)
+
+        task.add_done_callback(_forget)
+        return task
+
+    async def _run(self, session_id: str, events: AsyncIterator[Dict[str, Any]]):
+        lease = asyncio.create_task(self._keep_lease(session_id))
+        try:
+            async for event in events:
+                if event.get("type") == "heartbeat":
+                    continue
+                await self.append(session_id, event)
+        except Exception as e:
+            logger.error(f"Detached research {session_id} failed: {e}")
+            await self.append(session_id, {"type": "error", "content": str(e)})
+        finally:
+            lease.cancel()
+            # 先释放租约再写结束标记，订阅者读到结束标记时会话已不在运行
+            await self._set_lease(session_id, False)
+            await self.append(session_id, {"type": STREAM_END})
+            if session_id in self._local:
+                asyncio.get_running_loop().call_later(RESEARCH_STREAM_TTL, self._local.pop, session_id, None)
+
+    async def subscribe(
+        self,
+        session_id: str,
+        last_event_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        订阅会话事件流，产出 SSE 文本
+
+        从 last_event_id 之后开始回放（None 表示从头），空闲时输出心跳注释，
+        读到结束标记且研究不再运行时输出 [DONE]。
+        """
+        last_id = last_event_id or "0"
+        ended = False
+
+        while True:
+            entries = await self.read(session_id, last_id)
+
+            if not entries:
+                if not await self.is_running(session_id):
+                    if not ended:
+                        yield format_sse({"type": "error", "content": "研究任务已中断，可通过恢复接口从检查点继续"})
+                    break
+                yield ": heartbeat\n\n"
+                continue
+
+            for event_id, event in entries:
+                last_id = event_id
+                if event.get("type") == STREAM_END:
+                    # 可能是之前某次运行留下的结束标记
+                    ended = True
+                    continue
+                ended = False
+                yield format_sse(event, event_id)
+
+            if ended and not await self.is_running(session_id):
+                break
+
+        yield "data: [DONE]\n\n"
+
+
+# 单例
+_event_stream_store: Optional[EventStreamStore] = None
+
+
+def get_event_stream_store() -> EventStreamStore:
+    """获取研究事件流存储实例"""
+    global _event_stream_store
+    if _event_stream_store is None:
+        _event_stream_store = EventStreamStore()
+    return _event_stream_store
@@ -0,0 +1,170 @@
+"""
+DeepResearch V2.0 - 事实去重索引
+
+每个研究会话一个索引：
+1. 字符 bigram 的 MinHash 签名 + LSH 分桶，近似常数时间找出相似事实
+2. 数值校验：两条事实都含数字但数字不同（如不同年份、不同金额），不视为重复
+3. 可选的向量精排：相似度处于临界区间的候选，再用（缓存的）embedding 余弦相似度确认
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from service.minhash import MinHasher, LSHIndex, extract_numbers
+except ImportError:
+    from app.service.minhash import MinHasher, LSHIndex, extract_numbers
+
+logger = logging.getLogger("FactIndex")
+
+# 批量文本 -> 向量列表（失败的位置为 None）
+Embedder = Callable[[List[str]], List[Optional[List[float]]]]
+
+
+class FactIndex:
+    """会话级事实去重索引"""
+
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        candidate_threshold: float = 0.3,
+        embedder: Optional[Embedder] = None,
+        embedding_threshold: float = 0.9,
+        num_perm: int = 120,
+        bands: int = 40
+    ):
+        """
+        Args:
+            threshold: Jaccard 相似度达到该值直接判为重复
+            candidate_threshold: 启用向量精排时，相似度在 [candidate_threshold, threshold) 的候选交给 embedding 判断
+            embedder: 可选的批量向量化函数
+            embedding_threshold: 余弦相似度达到该值判为重复
+        """
+        self.threshold = threshold
+        self.candidate_threshold = candidate_threshold
+        self.embedder = embedder
+        self.embedding_threshold = embedding_threshold
+
+        self._hasher = MinHasher(num_perm=num_perm, ngram=2)
+        self._lsh = LSHIndex(num_perm=num_perm, bands=bands)
+        self._facts: List[Dict] = []
+        self._embeddings: Dict[str, Optional[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def add(self, content: str, source_url: str = "") -> None:
+        """直接加入索引（不做重复检查）"""
+        with self._lock:
+            self._insert(content, source_url, self._hasher.signature(content))
+
+    def is_duplicate(self, content: str, source_url: str = "") -> bool:
+        """
+        检查事实是否与已有事实重复，不重复则加入索引
+
+        同一来源的相似事实不算重复（可能是更详细的版本）。
+        向量精排需要网络请求，在锁外进行：锁内只收集候选，精排完成后重新加锁，
+        只检查期间新加入的事实后插入。
+        """
+        if not content:
+            return False
+
+        signature = self._hasher.signature(content)
+        numbers = extract_numbers(content)
+
+        with self._lock:
+            borderline = self._match(content, source_url, signature, numbers, 0)
+            if borderline is None:
+                return True
+            if not borderline:
+                self._insert(content, source_url, signature, numbers)
+                return False
+            checked = len(self._facts)
+
+        if self._embedding_match(content, borderline):
+            logger.debug(f"Duplicate fact (embedding): {content[:50]}...")
+            return True
+
+        with self._lock:
+            # 精排期间其他线程加入的事实只做 Jaccard 判断
+            if self._match(content, source_url, signature, numbers, checked, self.threshold) is None:
+                return True
+            self._insert(content, source_url, signature, numbers)
+            return False
+
+    def _match(
+        self,
+        content: str,
+        source_url: str,
+        signature: np.ndarray,
+        numbers,
+        start: int,
+        min_score: Optional[float] = None
+    ) -> Optional[List[str]]:
+        """
+        在编号不小于 start 的事实中查找重复（调用方持有锁）
+
+        Returns:
+            None 表示 Jaccard 判为重复；否则为需要向量精排的候选事实内容（未启用精排时为空）
+        """
+        if min_score is None:
+            min_score = self.candidate_threshold if self.embedder else self.threshold
+        borderline = []
+        for key, score in self._lsh.query(signature, min_score):
+            if key < start:
+                continue
+            existing = self._facts[key]
+            if existing["source_url"] == source_url:
+                continue
+            if numbers and existing["numbers"] and numbers != existing["numbers"]:
+                continue
+            if score >= self.threshold:
+                logger.debug(f"Duplicate fact (jaccard={score:.2f}): {content[:50]}...")
+                return None
+            borderline.append(existing["content"])
+        return borderline
+
+    def _insert(self, content: str, source_url: str, signature: np.ndarray, numbers=None):
+        key = len(self._facts)
+        self._facts.append({
+            "content": content,
+            "source_url": source_url,
+            "numbers": numbers if numbers is not None else extract_numbers(content),
+        })
+        self._lsh.insert(key, signature)
+
+    # ==================== 向量精排 ====================
+
+    def _embeddings_for(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """批量获取归一化向量（未缓存的文本一次请求，失败的位置为 None）"""
+        digests = [hashlib.md5(text.encode("utf-8")).hexdigest() for text in texts]
+        missing = {digest: text for digest, text in zip(digests, texts) if digest not in self._embeddings}
+        if missing:
+            try:
+                vectors = self.embedder(list(missing.values()))
+            except Exception as e:
+                logger.warning(f"Fact embedding failed: {e}")
+                vectors = []
+            for index, digest in enumerate(missing):
+                vector = vectors[index] if index < len(vectors) else None
+                if vector is not None:
+                    vector = np.asarray(vector, dtype=np.float32)
+                    norm = np.linalg.norm(vector)
+                    vector = vector / norm if norm else None
+                self._embeddings[digest] = vector
+        return [self._embeddings.get(digest) for digest in digests]
+
+    def _embedding_match(self, content: str, candidates: List[str]) -> bool:
+        """content 与任一候选的余弦相似度达到阈值（在锁外调用）"""
+        if not self.embedder or not candidates:
+            return False
+        vectors = self._embeddings_for([content] + candidates)
+        v1 = vectors[0]
+        if v1 is None:
+            return False
+        return any(v2 is not None and float(np.dot(v1, v2)) >= self.embedding_threshold for v2 in vectors[1:])
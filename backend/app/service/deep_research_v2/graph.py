@@ -7,6 +7,7 @@ Plan -> Research -> Analyze -> Write -> Review -> (Revise) -> Complete
 使用 LangGraph 实现循环和条件分支。
 """
 
+import os
 import logging
 import asyncio
 from typing import Dict, Any, List, Literal, AsyncGenerator
@@ -14,16 +15,14 @@ from datetime import datetime
 
 # 导入取消检查函数
 try:
-    from router.research_router import is_research_cancelled, clear_cancel_flag
+    from router.research_router import is_research_cancelled
 except ImportError:
     try:
-        from app.router.research_router import is_research_cancelled, clear_cancel_flag
+        from app.router.research_router import is_research_cancelled
     except ImportError:
         # 兼容直接运行脚本的情况
         def is_research_cancelled(session_id: str) -> bool:
             return False
-        def clear_cancel_flag(session_id: str):
-            pass
 
 # LangGraph 导入 - 如果没有安装则使用简化版本
 try:
@@ -34,7 +33,11 @@ except ImportError:
     logging.warning("LangGraph not installed. Using simplified workflow.")
 
 from .state import ResearchState, ResearchPhase, create_initial_state
+from .event_log import attach_event_logs, close_event_logs
 from .agents import ChiefArchitect, DeepScout, CodeWizard, CriticMaster, LeadWriter, DataAnalyst
+from .checkpoint_writer import get_checkpoint_writer
+from .event_bus import SessionEventBus
+from .pipeline import SectionPipeline
 
 # 导入检查点服务
 try:
@@ -123,9 +126,15 @@ class DeepResearchGraph:
         )
         self.writer = LeadWriter(
             self.llm_api_key, self.llm_base_url,
-            config.agents.writer.model
+            config.agents.writer.model,
+            max_concurrent_sections=getattr(config.research, "max_concurrent_sections", 4)
         )
 
+        # 重叠执行模式（实验性）：章节图表与研究重叠、撰写与其余全局分析重叠（见 pipeline）
+        self.pipeline = None
+        if os.getenv("RESEARCH_PIPELINE", "0") == "1" or getattr(config.research, "pipeline_sections", False):
+            self.pipeline = SectionPipeline(self.scout, self.data_analyst, self.wizard, self.writer)
+
         logger.info(f"DeepResearchGraph initialized with models:")
         logger.info(f"  - Architect: {config.agents.architect.model}")
         logger.info(f"  - Scout: {config.agents.scout.model}")
@@ -134,8 +143,9 @@ class DeepResearchGraph:
         logger.info(f"  - Critic: {config.agents.critic.model}")
         logger.info(f"  - Writer: {config.agents.writer.model}")
 
-        # 检查点服务
+        # 检查点服务（写入在后台线程中进行）
         self.checkpoint_service = get_checkpoint_service()
+        self.checkpoint_writer = get_checkpoint_writer(self.checkpoint_service)
 
         # 构建图
         if LANGGRAPH_AVAILABLE:
@@ -143,29 +153,6 @@ class DeepResearchGraph:
         else:
             self.graph = None
 
-    def _save_checkpoint(self, state: Dict[str, Any], user_id: str = None) -> bool:
-        """保存检查点"""
-        if not self.checkpoint_service:
-            return False
-
-        session_id = state.get("session_id", "")
-        if not session_id:
-            return False
-
-        try:
-            checkpoint_id = self.checkpoint_service.save_checkpoint(
-                session_id=session_id,
-                state=state,
-                user_id=user_id
-            )
-            if checkpoint_id:
-                logger.info(f"Checkpoint saved: {checkpoint_id}")
-                return True
-        except Exception as e:
-            logger.warning(f"Failed to save checkpoint: {e}")
-
-        return False
-
     def _load_checkpoint(self, session_id: str) -> Dict[str, Any]:
         """加载检查点"""
         if not self.checkpoint_service:
@@ -304,6 +291,7 @@ class DeepResearchGraph:
         if resume and session_id:
             state = self._load_checkpoint(session_id)
             if state:
+                attach_event_logs(state)
                 yield {
                     "type": "research_resumed",
                     "phase": state.get("phase", ""),
@@ -337,8 +325,8 @@ class DeepResearchGraph:
 
     async def _run_with_langgraph(self, state: ResearchState) -> AsyncGenerator[Dict[str, Any], None]:
         """使用 LangGraph 执行"""
-        # 追踪已输出的消息数量，避免重复
-        yielded_count = 0
+        # 追踪已输出的消息序号，避免重复
+        yielded_seq = 0
 
         try:
             # LangGraph 的流式执行
@@ -348,10 +336,9 @@ class DeepResearchGraph:
                     if isinstance(node_state, dict) and "messages" in node_state:
                         messages = node_state["messages"]
                         # 只输出新消息（跳过已输出的）
-                        new_messages = messages[yielded_count:]
-                        for message in new_messages:
+                        for message in messages.since(yielded_seq):
                             yield message
-                        yielded_count = len(messages)
+                        yielded_seq = messages.last_seq
 
         except Exception as e:
             logger.error(f"LangGraph execution error: {e}")
@@ -361,29 +348,25 @@ class DeepResearchGraph:
         """
         简化版执行流程（不依赖 LangGraph）
 
-        使用 asyncio.Queue 实现实时流式输出
+        使用会话事件总线实现实时流式输出
         """
-        # 创建消息队列用于实时输出
-        message_queue = asyncio.Queue()
-        state["_message_queue"] = message_queue
-
         # 获取 session_id 用于取消检查
+        # 取消标志只在从检查点恢复时由提交方清除（见 research_router.open_research_stream_v2），
+        # 排队期间或启动过程中收到的取消不会在这里被抹掉
         session_id = state.get("session_id", "")
 
-        # 清除之前的取消标志
-        if session_id:
-            clear_cancel_flag(session_id)
+        # 会话事件总线：Agent 发布事件，取消信号推送到达
+        bus = SessionEventBus(session_id, check_cancel_flag=is_research_cancelled)
+        state["_message_queue"] = bus.queue
 
         async def check_cancelled():
             """检查是否已取消"""
-            if session_id and is_research_cancelled(session_id):
-                return True
-            return False
+            return bus.is_cancelled
 
         async def run_agent_with_streaming(agent):
             """执行 agent 并实时 yield 消息"""
             # 检查是否已取消
-            if await check_cancelled():
+            if bus.is_cancelled:
                 logger.info(f"Research cancelled before starting agent: {agent.name}")
                 return
 
@@ -393,30 +376,22 @@ class DeepResearchGraph:
             task = asyncio.create_task(agent.process(state))
 
             msg_count = 0
-            # 在任务执行期间持续从队列获取消息
-            while not task.done():
-                # 定期检查是否已取消
-                if await check_cancelled():
-                    logger.info(f"Research cancelled during agent: {agent.name}")
-                    task.cancel()
-                    try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
-                    return
-
-                try:
-                    msg = await asyncio.wait_for(message_queue.get(), timeout=0.5)
+            # 在任务执行期间等待事件推送（无轮询超时）
+            async for msg in bus.consume(task):
+                msg_type = msg.get('type', 'unknown')
+                if msg_type != "heartbeat":
                     msg_count += 1
-                    msg_type = msg.get('type', 'unknown')
                     logger.info(f"[SSE YIELD] [{agent.name}] #{msg_count}: {msg_type}")
-                    yield msg
-                except asyncio.TimeoutError:
-                    # 继续等待，不发送心跳（SSE连接由前端保持）
-                    continue
-                except Exception as e:
-                    logger.warning(f"[{agent.name}] Queue error: {e}")
-                    continue
+                yield msg
+
+            if bus.is_cancelled and not task.done():
+                logger.info(f"Research cancelled during agent: {agent.name}")
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                return
 
             # 等待任务完成（获取可能的异常）
             try:
@@ -425,27 +400,32 @@ class DeepResearchGraph:
                 logger.error(f"Agent {agent.name} error: {e}")
 
             # 清空剩余的消息
-            remaining = 0
-            while not message_queue.empty():
-                try:
-                    msg = message_queue.get_nowait()
-                    remaining += 1
-                    yield msg
-                except:
-                    break
+            remaining = bus.drain()
+            for msg in remaining:
+                yield msg
 
-            logger.info(f"Agent {agent.name} completed. Messages: {msg_count} during, {remaining} remaining")
+            logger.info(f"Agent {agent.name} completed. Messages: {msg_count} during, {len(remaining)} remaining")
 
         # 获取 user_id 用于检查点
         user_id = state.get("_user_id")
 
-        async def save_checkpoint_async():
-            """异步保存检查点"""
-            if self._save_checkpoint(state, user_id):
-                return {"type": "checkpoint_saved", "phase": state.get("phase", ""), "session_id": session_id}
-            return None
+        def submit_checkpoint():
+            """提交检查点到后台写入器，写入完成后 checkpoint_saved 事件进入消息队列"""
+            if self.checkpoint_writer and session_id:
+                self.checkpoint_writer.submit(session_id, state, user_id, on_saved=bus.publish)
+
+        async def flush_checkpoints():
+            """等待已提交的检查点写完"""
+            if self.checkpoint_writer and session_id:
+                await self.checkpoint_writer.flush(session_id)
+
+        # 重叠执行模式在内部阶段之间提交检查点、检查取消信号
+        state["_checkpoint"] = submit_checkpoint
+        state["_cancelled"] = bus.cancelled
 
         try:
+            await bus.start()
+
             # Phase 1: Plan
             if await check_cancelled():
                 yield {"type": "research_cancelled", "message": "研究已取消"}
@@ -454,56 +434,54 @@ class DeepResearchGraph:
             state["phase"] = ResearchPhase.INIT.value
             async for msg in run_agent_with_streaming(self.architect):
                 yield msg
-            state["messages"] = []
             # 保存检查点
-            cp_event = await save_checkpoint_async()
-            if cp_event:
-                yield cp_event
+            submit_checkpoint()
 
-            # Phase 2: Research (这是最需要实时输出的阶段)
-            if await check_cancelled():
-                yield {"type": "research_cancelled", "message": "研究已取消"}
-                return
-            yield {"type": "phase", "phase": "researching", "content": "开始深度搜索..."}
-            state["phase"] = ResearchPhase.RESEARCHING.value
-            async for msg in run_agent_with_streaming(self.scout):
-                yield msg
-            state["messages"] = []
-            # 保存检查点
-            cp_event = await save_checkpoint_async()
-            if cp_event:
-                yield cp_event
+            # Phase 2-4: 重叠执行模式下章节图表与研究重叠、撰写与其余分析重叠
+            if self.pipeline is not None:
+                if await check_cancelled():
+                    yield {"type": "research_cancelled", "message": "研究已取消"}
+                    return
+                state["phase"] = ResearchPhase.RESEARCHING.value
+                async for msg in run_agent_with_streaming(self.pipeline):
+                    yield msg
+                # 保存检查点
+                submit_checkpoint()
+            else:
+                # Phase 2: Research (这是最需要实时输出的阶段)
+                if await check_cancelled():
+                    yield {"type": "research_cancelled", "message": "研究已取消"}
+                    return
+                yield {"type": "phase", "phase": "researching", "content": "开始深度搜索..."}
+                state["phase"] = ResearchPhase.RESEARCHING.value
+                async for msg in run_agent_with_streaming(self.scout):
+                    yield msg
+                # 保存检查点
+                submit_checkpoint()
 
-            # Phase 3: Analyze
-            if await check_cancelled():
-                yield {"type": "research_cancelled", "message": "研究已取消"}
-                return
-            yield {"type": "phase", "phase": "analyzing", "content": "开始数据分析..."}
-            state["phase"] = ResearchPhase.ANALYZING.value
-            async for msg in run_agent_with_streaming(self.data_analyst):
-                yield msg
-            state["messages"] = []
-            async for msg in run_agent_with_streaming(self.wizard):
-                yield msg
-            state["messages"] = []
-            # 保存检查点
-            cp_event = await save_checkpoint_async()
-            if cp_event:
-                yield cp_event
+                # Phase 3: Analyze
+                if await check_cancelled():
+                    yield {"type": "research_cancelled", "message": "研究已取消"}
+                    return
+                yield {"type": "phase", "phase": "analyzing", "content": "开始数据分析..."}
+                state["phase"] = ResearchPhase.ANALYZING.value
+                async for msg in run_agent_with_streaming(self.data_analyst):
+                    yield msg
+                async for msg in run_agent_with_streaming(self.wizard):
+                    yield msg
+                # 保存检查点
+                submit_checkpoint()
 
-            # Phase 4: Write
-            if await check_cancelled():
-                yield {"type": "research_cancelled", "message": "研究已取消"}
-                return
-            yield {"type": "phase", "phase": "writing", "content": "开始撰写报告..."}
-            state["phase"] = ResearchPhase.WRITING.value
-            async for msg in run_agent_with_streaming(self.writer):
-                yield msg
-            state["messages"] = []
-            # 保存检查点
-            cp_event = await save_checkpoint_async()
-            if cp_event:
-                yield cp_event
+                # Phase 4: Write
+                if await check_cancelled():
+                    yield {"type": "research_cancelled", "message": "研究已取消"}
+                    return
+                yield {"type": "phase", "phase": "writing", "content": "开始撰写报告..."}
+                state["phase"] = ResearchPhase.WRITING.value
+                async for msg in run_agent_with_streaming(self.writer):
+                    yield msg
+                # 保存检查点
+                submit_checkpoint()
 
             # Phase 5 & 6: Review & Revise/Re-Research Loop
             while state["iteration"] < state["max_iterations"]:
@@ -514,7 +492,6 @@ class DeepResearchGraph:
                 state["phase"] = ResearchPhase.REVIEWING.value
                 async for msg in run_agent_with_streaming(self.critic):
                     yield msg
-                state["messages"] = []
 
                 if state["phase"] == ResearchPhase.COMPLETED.value:
                     break
@@ -526,13 +503,11 @@ class DeepResearchGraph:
                     yield {"type": "phase", "phase": "re_researching", "content": "根据审核反馈补充搜索..."}
                     async for msg in run_agent_with_streaming(self.scout):
                         yield msg
-                    state["messages"] = []
 
                     yield {"type": "phase", "phase": "rewriting", "content": "基于新信息重新撰写..."}
                     state["phase"] = ResearchPhase.WRITING.value
                     async for msg in run_agent_with_streaming(self.writer):
                         yield msg
-                    state["messages"] = []
 
                 elif state["phase"] == ResearchPhase.REVISING.value:
                     if await check_cancelled():
@@ -541,7 +516,6 @@ class DeepResearchGraph:
                     yield {"type": "phase", "phase": "revising", "content": "根据反馈修订报告..."}
                     async for msg in run_agent_with_streaming(self.writer):
                         yield msg
-                    state["messages"] = []
                 else:
                     break
 
@@ -552,12 +526,16 @@ class DeepResearchGraph:
 
             # 打印每个图表的详情
             for i, chart in enumerate(state.get('charts', [])):
-                logger.info(f"[Graph] 图表 {i+1}: id={chart.get('id')}, title={chart.get('title')}, has_echarts={bool(chart.get('echarts_option'))}, has_image={bool(chart.get('image_base64'))}")
+                logger.info(f"[Graph] 图表 {i+1}: id={chart.get('id')}, title={chart.get('title')}, has_echarts={bool(chart.get('echarts_option'))}, has_image={bool(chart.get('image_url'))}")
 
-            # 更新检查点状态为已完成
+            # 保存最终检查点，写完后再更新状态为已完成
             state["phase"] = ResearchPhase.COMPLETED.value
+            submit_checkpoint()
+            await flush_checkpoints()
+            for msg in bus.drain():
+                yield msg
             if self.checkpoint_service and session_id:
-                self.checkpoint_service.update_status(session_id, "completed")
+                await asyncio.to_thread(self.checkpoint_service.update_status, session_id, "completed")
 
             yield {
                 "type": "research_complete",
@@ -571,13 +549,22 @@ class DeepResearchGraph:
 
         except Exception as e:
             logger.error(f"Simplified execution error: {e}")
-            # 更新检查点状态为失败
+            # 更新检查点状态为失败（等待已提交的检查点写完，避免状态被覆盖为 running）
+            await flush_checkpoints()
             if self.checkpoint_service and session_id:
-                self.checkpoint_service.update_status(session_id, "failed", str(e))
+                await asyncio.to_thread(self.checkpoint_service.update_status, session_id, "failed", str(e))
             yield {"type": "error", "content": str(e)}
         finally:
+            # 取消或连接断开时也保证最后的检查点落盘
+            await flush_checkpoints()
+            if self.checkpoint_service and session_id:
+                self.checkpoint_service.release(session_id)
             # 清理队列
+            await bus.close()
             state["_message_queue"] = None
+            state["_checkpoint"] = None
+            state["_cancelled"] = None
+            close_event_logs(state)
 
     async def run_sync(self, query: str, session_id: str) -> ResearchState:
         """
@@ -0,0 +1,320 @@
+"""
+DeepResearch V2.0 - 网页正文提取
+
+trafilatura / BeautifulSoup 解析大页面是 CPU 密集操作，放在事件循环线程里执行会阻塞所有会话的 SSE 推送。
+这里把提取放到独立的进程池中执行：
+1. 预过滤：线性扫描去掉 script / style / noscript / svg / 注释，缩小交给解析器的数据量（在提取进程中执行）
+2. 进程池提取：trafilatura → BeautifulSoup → 正则，逐级降级
+3. 单文档超时：杀掉卡住的提取进程（名额立即释放，按需重新启动），改用正则快速提取
+4. 等待空闲进程在事件循环上进行（见 process_pool.ProcessPool.slot），不占用默认线程池
+
+可通过环境变量配置：
+    HTML_EXTRACT_WORKERS   进程数（默认 min(4, CPU 数)，0 表示改用线程执行）
+    HTML_EXTRACT_TIMEOUT   单个文档的提取超时，秒（默认 10）
+"""
+
+import os
+import re
+import signal
+import asyncio
+import logging
+import threading
+import multiprocessing
+from typing import Optional
+
+from .process_pool import PipeProcess, ProcessPool
+
+logger = logging.getLogger("HtmlExtract")
+
+HTML_EXTRACT_WORKERS = int(os.getenv("HTML_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+HTML_EXTRACT_TIMEOUT = float(os.getenv("HTML_EXTRACT_TIMEOUT", "10"))
+
+# 网页文本提取库（可选依赖）
+try:
+    import trafilatura
+    TRAFILATURA_AVAILABLE = True
+except ImportError:
+    TRAFILATURA_AVAILABLE = False
+
+try:
+    from bs4 import BeautifulSoup
+    BS4_AVAILABLE = True
+except ImportError:
+    BS4_AVAILABLE = False
+
+# 预过滤时整块删除的标签（连同内容）：开始标记 → 结束标记
+_BLOCK_START_RE = re.compile(r'<(script|style|noscript|svg)|<!--', re.IGNORECASE)
+_BLOCK_END_RES = {
+    tag: re.compile(re.escape(end), re.IGNORECASE)
+    for tag, end in (
+        ("script", "</script>"),
+        ("style", "</style>"),
+        ("noscript", "</noscript>"),
+        ("svg", "</svg>"),
+        (None, "-->"),
+    )
+}
+
+
+def prefilter_html(html: str) -> str:
+    """
+    去掉 script / style / noscript / svg / 注释块
+
+    在原字符串上用不区分大小写的正则查找开始和结束标记，每个字符只扫描一次，
+    耗时与页面长度成正比，与块的数量无关。
+    """
+    if not html:
+        return ""
+
+    pieces = []
+    pos = 0
+
+    while True:
+        start = _BLOCK_START_RE.search(html, pos)
+        if start is None:
+            pieces.append(html[pos:])
+            break
+
+        pieces.append(html[pos:start.start()])
+        tag = start.group(1)
+        end = _BLOCK_END_RES[tag.lower() if tag else None].search(html, start.end())
+        if end is None:
+            # 未闭合的块，丢弃剩余部分
+            break
+        pos = end.end()
+
+    return "".join(pieces)
+
+
+def _regex_extract(html: str, max_length: int) -> str:
+    """简单正则提取（最后的备选）"""
+    text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
+    text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
+    # 移除所有 HTML 标签
+    text = re.sub(r'<[^>]+>', ' ', text)
+    # 解码 HTML 实体
+    text = text.replace('&nbsp;', ' ').replace('&lt;', '<').replace('&gt;', '>')
+    text = text.replace('&amp;', '&').replace('&quot;', '"')
+    # 清理空白
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text[:max_length]
+
+
+def extract_text(html: str, url: str = "", max_length: int = 12000) -> str:
+    """
+    从 HTML 中提取纯文本正文（在工作进程中执行）
+
+    使用多种策略提取，优先级：
+    1. trafilatura - 专业的网页正文提取库（效果最好）
+    2. BeautifulSoup - 通用 HTML 解析（备选）
+    3. 简单正则 - 最后的备选方案
+
+    Args:
+        html: 原始 HTML 内容（可以是预过滤后的）
+        url: 网页 URL（用于 trafilatura 优化）
+        max_length: 最大返回长度
+
+    Returns:
+        提取的纯文本
+    """
+    text = ""
+
+    # 方法 1: 使用 trafilatura（效果最好）
+    if TRAFILATURA_AVAILABLE:
+        try:
+            text = trafilatura.extract(
+                html,
+                url=url,
+                include_comments=False,
+                include_tables=True,
+                no_fallback=False,
+                favor_precision=True
+            )
+            if text and len(text) > 200:
+                logger.debug(f"Trafilatura extracted {len(text)} chars from {url}")
+                return text[:max_length]
+        except Exception as e:
+            logger.warning(f"Trafilatura extraction failed: {e}")
+
+    # 方法 2: 使用 BeautifulSoup
+    if BS4_AVAILABLE:
+        try:
+            soup = BeautifulSoup(html, 'lxml')
+
+            # 移除无用标签
+            for tag in soup(['script', 'style', 'nav', 'header', 'footer',
+                            'aside', 'iframe', 'noscript', 'meta', 'link']):
+                tag.decompose()
+
+            # 尝试找正文区域
+            main_content = None
+            for selector in ['article', 'main', '.content', '.article',
+                            '#content', '#article', '.post', '.entry']:
+                main_content = soup.select_one(selector)
+                if main_content:
+                    break
+
+            if main_content:
+                text = main_content.get_text(separator='\n', strip=True)
+            else:
+                # 找不到正文区域，提取 body
+                body = soup.find('body')
+                if body:
+                    text = body.get_text(separator='\n', strip=True)
+                else:
+                    text = soup.get_text(separator='\n', strip=True)
+
+            if text and len(text) > 200:
+                # 清理多余空白
+                text = re.sub(r'\n{3,}', '\n\n', text)
+                text = re.sub(r' {2,}', ' ', text)
+                logger.debug(f"BeautifulSoup extracted {len(text)} chars from {url}")
+                return text[:max_length]
+
+        except Exception as e:
+            logger.warning(f"BeautifulSoup extraction failed: {e}")
+
+    # 方法 3: 简单正则（最后的备选）
+    text = _regex_extract(html, max_length)
+    logger.debug(f"Regex extracted {len(text)} chars from {url}")
+    return text
+
+
+def _prefilter_and_extract(html: str, url: str, max_length: int) -> str:
+    """预过滤并提取正文（在工作进程中执行）"""
+    filtered = prefilter_html(html)
+    if not filtered:
+        return ""
+    return extract_text(filtered, url, max_length)
+
+
+def _regex_fallback(html: str, max_length: int) -> str:
+    return _regex_extract(prefilter_html(html), max_length)
+
+
+# ==================== 进程池 ====================
+
+def _worker_main(conn) -> None:
+    """提取进程入口：循环接收 (html, url, max_length) 并返回正文"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        try:
+            conn.send(_prefilter_and_extract(*request))
+        except Exception as e:
+            conn.send(e)
+
+
+class _ExtractProcess(PipeProcess):
+    """单个提取进程"""
+
+    def __init__(self, context):
+        super().__init__(context, _worker_main, (), "html-extract")
+
+    def run(self, request: tuple, timeout: float):
+        """执行提取，超时返回 None；进程退出时抛出 EOFError / OSError"""
+        self.conn.send(request)
+        if not self.conn.poll(timeout):
+            return None
+        result = self.conn.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class ExtractTimeout(Exception):
+    """提取超时（执行提取的进程已被杀掉）"""
+
+
+class ExtractPool(ProcessPool[_ExtractProcess]):
+    """提取进程池（线程安全，进程按需启动，超时的提取直接杀掉进程）"""
+
+    def __init__(self, size: int = HTML_EXTRACT_WORKERS):
+        super().__init__(size)
+        self._context = multiprocessing.get_context("spawn")
+
+    def _spawn(self) -> _ExtractProcess:
+        return _ExtractProcess(self._context)
+
+    def extract_blocking(self, html: str, url: str, max_length: int, timeout: float) -> str:
+        """在提取进程中预过滤并提取正文（阻塞调用），超时抛出 ExtractTimeout"""
+        worker = self.acquire()
+        try:
+            result = worker.run((html, url, max_length), timeout)
+            if result is None:
+                logger.warning(f"HTML extraction timed out after {timeout}s for {url}, killing process {worker.process.pid}")
+                worker.kill()
+                worker = None
+                raise ExtractTimeout(url)
+            return result
+        except (EOFError, OSError) as e:
+            worker.kill()
+            worker = None
+            raise RuntimeError(f"extract process exited: {e}")
+        finally:
+            self.release(worker)
+
+    async def extract(self, html: str, url: str, max_length: int, timeout: float) -> str:
+        """在事件循环上等到名额后，在线程中调用 extract_blocking"""
+        async with self.slot():
+            return await asyncio.to_thread(self.extract_blocking, html, url, max_length, timeout)
+
+
+_pool: Optional[ExtractPool] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ExtractPool]:
+    """获取提取进程池（spawn 方式启动，避免 fork 多线程服务进程）"""
+    global _pool
+    if HTML_EXTRACT_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractPool()
+            logger.info(f"HTML extract pool started with {HTML_EXTRACT_WORKERS} workers")
+        return _pool
+
+
+def shutdown_extract_pool():
+    """关闭提取进程池"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+async def extract_text_async(
+    html: str,
+    url: str = "",
+    max_length: int = 12000,
+    timeout: float = HTML_EXTRACT_TIMEOUT
+) -> str:
+    """
+    异步提取网页正文，不阻塞事件循环
+
+    预过滤和提取都在提取进程中执行；超时（进程被杀掉）或进程异常时，
+    降级为在线程中对预过滤内容做正则提取。
+    """
+    if not html:
+        return ""
+
+    pool = _get_pool()
+    try:
+        if pool is None:
+            return await asyncio.wait_for(
+                asyncio.to_thread(_prefilter_and_extract, html, url, max_length), timeout=timeout
+            )
+        return await pool.extract(html, url, max_length, timeout)
+    except (asyncio.TimeoutError, ExtractTimeout):
+        logger.warning(f"HTML extraction timed out after {timeout}s for {url}, using regex fallback")
+    except Exception as e:
+        logger.warning(f"HTML extraction failed for {url}: {e}")
+
+    return await asyncio.to_thread(_regex_fallback, html, max_length)
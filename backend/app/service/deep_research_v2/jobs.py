@@ -0,0 +1,469 @@
+"""
+DeepResearch V2.0 - 研究任务管理
+
+研究会话作为任务提交，SSE 接口只订阅任务的事件流（见 event_stream）：
+1. 准入控制：本进程并发上限、排队长度上限、每个用户同时进行的研究数上限
+2. 队列模式（RESEARCH_JOB_QUEUE=1）：任务写入 Redis 队列，由独立的 worker 进程执行（见 worker），
+   可按 CPU 核数和节点数水平扩展；排队期间 API 进程为会话持有租约，订阅者不会误判为已中断。
+   worker 取任务时把任务原子地移入自己的处理列表（BRPOPLPUSH），执行结束后移除；
+   worker 定期写心跳，心跳过期的 worker 处理列表中的任务由其他 worker 回收：未开始的重新入队，
+   执行中的标记为中断（interrupted，不计为失败，可从检查点恢复）
+3. 内联模式（默认）：在当前进程的后台任务中执行
+
+Redis 不可用时队列模式自动退化为内联模式，用户并发限制改为进程内计数。
+
+可通过环境变量配置：
+    RESEARCH_JOB_QUEUE        是否使用任务队列（默认 0，需要单独启动 worker 进程；设置 RESEARCH_WORKERS 时自动启用）
+    RESEARCH_MAX_CONCURRENT   内联模式下本进程同时运行的研究数上限（默认 16）
+    RESEARCH_MAX_QUEUED       队列中等待的任务数上限（默认 100）
+    RESEARCH_MAX_PER_USER     每个用户同时进行（排队 + 运行）的研究数上限（默认 2，0 表示不限制）
+    RESEARCH_QUEUE_TIMEOUT    任务最长排队时间，秒（默认 1800，超时后不再执行）
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from .event_stream import get_event_stream_store, STREAM_END
+from .event_bus import CANCEL_KEY_PREFIX
+
+logger = logging.getLogger("ResearchJobs")
+
+# 由 API 进程派生本地 worker（RESEARCH_WORKERS > 0）时自动启用队列模式
+RESEARCH_JOB_QUEUE = os.getenv("RESEARCH_JOB_QUEUE", "0") == "1" or int(os.getenv("RESEARCH_WORKERS", "0")) > 0
+RESEARCH_MAX_CONCURRENT = int(os.getenv("RESEARCH_MAX_CONCURRENT", "16"))
+RESEARCH_MAX_QUEUED = int(os.getenv("RESEARCH_MAX_QUEUED", "100"))
+RESEARCH_MAX_PER_USER = int(os.getenv("RESEARCH_MAX_PER_USER", "2"))
+RESEARCH_QUEUE_TIMEOUT = int(os.getenv("RESEARCH_QUEUE_TIMEOUT", "1800"))
+
+QUEUE_KEY = "research:jobs:queue"
+JOB_KEY_PREFIX = "research:job:"
+USER_KEY_PREFIX = "research:jobs:user:"
+PROCESSING_KEY_PREFIX = "research:jobs:processing:"
+WORKER_KEY_PREFIX = "research:worker:"
+JOB_TTL = 86400
+WORKER_HEARTBEAT_TTL = 30
+
+# 准入检查与入队在 Redis 中原子执行
+_ADMIT_SCRIPT = """
+if ARGV[6] == '1' and tonumber(ARGV[3]) > 0 and redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 'queue_full'
+end
+if tonumber(ARGV[4]) > 0 and redis.call('SCARD', KEYS[2]) >= tonumber(ARGV[4]) then
+    return 'user_limit'
+end
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('HSET', KEYS[3], 'spec', ARGV[2], 'status', ARGV[6] == '1' and 'queued' or 'running', 'created_at', ARGV[7])
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+if ARGV[6] == '1' then
+    redis.call('LPUSH', KEYS[1], ARGV[1])
+end
+return 'ok'
+"""
+
+# 事件类型 -> 任务最终状态
+_OUTCOME_EVENTS = {
+    "research_complete": "completed",
+    "research_cancelled": "cancelled",
+    "error": "failed",
+}
+
+
+class JobRejected(Exception):
+    """任务未通过准入检查"""
+
+    MESSAGES = {
+        "capacity": "研究服务繁忙，请稍后重试",
+        "queue_full": "研究任务排队已满，请稍后重试",
+        "user_limit": "您同时进行的研究任务过多，请等待已有任务完成",
+        "unavailable": "研究任务队列暂不可用，请稍后重试",
+    }
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(self.MESSAGES.get(reason, reason))
+
+
+def _get_async_redis():
+    try:
+        from core.redis_client import get_async_redis_client
+    except ImportError:
+        from app.core.redis_client import get_async_redis_client
+    return get_async_redis_client()
+
+
+async def _track_outcome(events: AsyncIterator[Dict[str, Any]], outcome: Dict[str, str]):
+    """透传事件，同时记录任务最终状态"""
+    async for event in events:
+        status = _OUTCOME_EVENTS.get(event.get("type"))
+        if status:
+            outcome["status"] = status
+        yield event
+
+
+class ResearchJobManager:
+    """研究任务管理器"""
+
+    def __init__(self):
+        self.store = get_event_stream_store()
+        # Redis 不可用时的用户并发计数 {user_key: {session_id}}
+        self._local_active: Dict[str, Set[str]] = {}
+
+    def _redis(self):
+        try:
+            return _get_async_redis()
+        except Exception as e:
+            logger.warning(f"Redis unavailable for research jobs: {e}")
+            return None
+
+    # ==================== 提交 ====================
+
+    async def submit(
+        self,
+        session_id: str,
+        query: str,
+        user_key: str,
+        kb_name: Optional[str] = None,
+        resume: bool = False,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        提交研究任务
+
+        Args:
+            session_id: 会话ID
+            query: 研究问题
+            user_key: 用于并发限制的用户标识（登录用户 ID 或客户端地址）
+            kb_name: 本地知识库名称
+            resume: 是否从检查点恢复
+            user_id: 用户ID（用于检查点）
+
+        Returns:
+            {"session_id", "mode": "queued" | "inline", "position"}
+
+        Raises:
+            JobRejected: 未通过准入检查
+        """
+        spec = {
+            "session_id": session_id,
+            "query": query,
+            "kb_name": kb_name,
+            "resume": resume,
+            "user_id": user_id,
+            "user_key": user_key,
+            "created_at": time.time(),
+        }
+
+        queued = RESEARCH_JOB_QUEUE and await self.store.reserve(session_id, RESEARCH_QUEUE_TIMEOUT)
+        if not queued and self.store.running_count >= RESEARCH_MAX_CONCURRENT:
+            raise JobRejected("capacity")
+
+        verdict = await self._admit(spec, queued)
+        if verdict != "ok":
+            if queued:
+                await self.store.release(session_id)
+            raise JobRejected(verdict)
+
+        if queued:
+            position = await self._queue_length()
+            await self.store.append(session_id, {
+                "type": "job_queued",
+                "session_id": session_id,
+                "position": position,
+            })
+            logger.info(f"Research job {session_id} queued (position {position})")
+            return {"session_id": session_id, "mode": "queued", "position": position}
+
+        task, outcome = await self._start(spec)
+        asyncio.create_task(self._finish_when_done(spec, task, outcome))
+        logger.info(f"Research job {session_id} started inline")
+        return {"session_id": session_id, "mode": "inline", "position": 0}
+
+    async def _admit(self, spec: Dict[str, Any], enqueue: bool) -> str:
+        """准入检查；通过时登记任务（并入队）"""
+        session_id = spec["session_id"]
+        user_key = spec["user_key"]
+
+        client = self._redis()
+        if client is not None:
+            try:
+                await self._prune_user(client, user_key)
+                return await client.eval(
+                    _ADMIT_SCRIPT, 3,
+                    QUEUE_KEY, f"{USER_KEY_PREFIX}{user_key}", f"{JOB_KEY_PREFIX}{session_id}",
+                    session_id, json.dumps(spec, ensure_ascii=False), RESEARCH_MAX_QUEUED,
+                    RESEARCH_MAX_PER_USER, JOB_TTL, "1" if enqueue else "0", int(spec["created_at"])
+                )
+            except Exception as e:
+                if enqueue:
+                    logger.error(f"Failed to enqueue research job {session_id}: {e}")
+                    return "unavailable"
+                logger.warning(f"Redis admission check failed, using local limits: {e}")
+
+        active = self._local_active.setdefault(user_key, set())
+        if RESEARCH_MAX_PER_USER > 0 and len(active) >= RESEARCH_MAX_PER_USER:
+            return "user_limit"
+        active.add(session_id)
+        return "ok"
+
+    async def _prune_user(self, client, user_key: str):
+        """清理用户集合中已结束、已过期、排队超时（或排队租约已失效）或执行进程已退出的任务"""
+        user_set = f"{USER_KEY_PREFIX}{user_key}"
+        for session_id in await client.smembers(user_set):
+            job = await client.hmget(f"{JOB_KEY_PREFIX}{session_id}", "status", "created_at")
+            status, created_at = job[0], float(job[1] or 0)
+            if status == "queued":
+                if time.time() - created_at <= RESEARCH_QUEUE_TIMEOUT and await self.store.is_running(session_id):
+                    continue
+            elif status == "running" and await self.store.is_running(session_id):
+                continue
+            await client.srem(user_set, session_id)
+
+    async def _queue_length(self) -> int:
+        client = self._redis()
+        if client is None:
+            return 0
+        try:
+            return int(await client.llen(QUEUE_KEY))
+        except Exception:
+            return 0
+
+    # ==================== 执行 ====================
+
+    async def _start(self, spec: Dict[str, Any]):
+        """在当前进程的后台任务中开始执行"""
+        try:
+            from .service import DeepResearchV2Service
+        except ImportError:
+            from service.deep_research_v2.service import DeepResearchV2Service
+
+        service = DeepResearchV2Service()
+        outcome = {"status": "failed"}
+        events = service.research_events(
+            query=spec["query"],
+            session_id=spec["session_id"],
+            kb_name=spec.get("kb_name"),
+            resume=bool(spec.get("resume")),
+            user_id=spec.get("user_id")
+        )
+        task = await self.store.start(spec["session_id"], _track_outcome(events, outcome))
+        return task, outcome
+
+    async def _finish_when_done(self, spec: Dict[str, Any], task: asyncio.Task, outcome: Dict[str, str]):
+        try:
+            await task
+        except BaseException:
+            pass
+        finally:
+            await self._finish(spec, outcome["status"])
+
+    async def _finish(self, spec: Dict[str, Any], status: str):
+        """记录任务最终状态并释放用户并发名额"""
+        session_id = spec["session_id"]
+        user_key = spec["user_key"]
+        self._local_active.get(user_key, set()).discard(session_id)
+
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            await client.hset(f"{JOB_KEY_PREFIX}{session_id}", mapping={
+                "status": status,
+                "finished_at": int(time.time()),
+            })
+            await client.srem(f"{USER_KEY_PREFIX}{user_key}", session_id)
+        except Exception as e:
+            logger.warning(f"Failed to record job result for {session_id}: {e}")
+        logger.info(f"Research job {session_id} finished: {status}")
+
+    async def claim(self, worker_id: str, timeout: int = 5) -> Optional[Dict[str, Any]]:
+        """
+        从队列中取出一个待执行的任务（worker 进程调用）
+
+        任务原子地移入该 worker 的处理列表，执行结束（或跳过）后才移除，worker 中途退出时不会丢失。
+        已取消或排队超时的任务会被跳过。
+        """
+        client = _get_async_redis()
+        processing = f"{PROCESSING_KEY_PREFIX}{worker_id}"
+        session_id = await client.brpoplpush(QUEUE_KEY, processing, timeout=timeout)
+        if not session_id:
+            return None
+
+        job = await client.hgetall(f"{JOB_KEY_PREFIX}{session_id}")
+        if not job or job.get("status") != "queued":
+            await client.lrem(processing, 0, session_id)
+            return None
+
+        spec = json.loads(job["spec"])
+        if time.time() - spec.get("created_at", 0) > RESEARCH_QUEUE_TIMEOUT:
+            logger.warning(f"Research job {session_id} expired in queue")
+            await self._abandon(spec, "expired", "研究任务排队超时，请重新提交")
+            await client.lrem(processing, 0, session_id)
+            return None
+        return spec
+
+    async def execute(self, spec: Dict[str, Any], worker_id: str) -> str:
+        """
+        执行已取出的任务直到结束（worker 进程调用），返回最终状态
+
+        任务取出后、开始执行前收到的取消（cancel_queued 已移不出队列、会话也尚未订阅取消通知）
+        只留下取消标志，这里先检查标志，已取消的任务不再执行。
+        """
+        session_id = spec["session_id"]
+        client = _get_async_redis()
+        try:
+            if await client.exists(f"{CANCEL_KEY_PREFIX}{session_id}"):
+                logger.info(f"Research job {session_id} cancelled before start")
+                await self._abandon(spec, "cancelled", "研究已取消")
+                return "cancelled"
+
+            await client.hset(f"{JOB_KEY_PREFIX}{session_id}", mapping={
+                "status": "running",
+                "worker": worker_id,
+                "started_at": int(time.time()),
+            })
+
+            task, outcome = await self._start(spec)
+            await self._finish_when_done(spec, task, outcome)
+            return outcome["status"]
+        finally:
+            try:
+                await client.lrem(f"{PROCESSING_KEY_PREFIX}{worker_id}", 0, session_id)
+            except Exception as e:
+                logger.warning(f"Failed to remove {session_id} from processing list: {e}")
+
+    # ==================== worker 心跳与回收 ====================
+
+    async def heartbeat(self, worker_id: str):
+        """写入 worker 心跳（worker 进程定期调用）"""
+        client = _get_async_redis()
+        await client.set(f"{WORKER_KEY_PREFIX}{worker_id}", int(time.time()), ex=WORKER_HEARTBEAT_TTL)
+
+    async def retire(self, worker_id: str):
+        """worker 正常退出时删除心跳"""
+        client = _get_async_redis()
+        await client.delete(f"{WORKER_KEY_PREFIX}{worker_id}")
+
+    async def reclaim(self) -> int:
+        """
+        回收心跳已过期的 worker 处理列表中的任务
+
+        未开始执行的任务放回队列出队端；执行中的任务（worker 崩溃或停止时被强制结束）标记为中断并关闭事件流，
+        中断不是研究本身失败，用户可通过 /resume 从检查点继续。
+        任务逐个从处理列表弹出，多个 worker 同时回收时不会重复处理。
+
+        Returns:
+            回收的任务数
+        """
+        client = _get_async_redis()
+        reclaimed = 0
+        async for processing in client.scan_iter(match=f"{PROCESSING_KEY_PREFIX}*"):
+            worker_id = processing[len(PROCESSING_KEY_PREFIX):]
+            if await client.exists(f"{WORKER_KEY_PREFIX}{worker_id}"):
+                continue
+
+            while True:
+                session_id = await client.rpop(processing)
+                if session_id is None:
+                    break
+                reclaimed += 1
+                job = await client.hgetall(f"{JOB_KEY_PREFIX}{session_id}")
+                if not job:
+                    continue
+                spec = json.loads(job.get("spec", "{}"))
+                status = job.get("status")
+                if status == "queued":
+                    logger.warning(f"Requeueing research job {session_id} claimed by dead worker {worker_id}")
+                    await client.rpush(QUEUE_KEY, session_id)
+                elif status == "running":
+                    logger.warning(f"Research job {session_id} interrupted with dead worker {worker_id}")
+                    await self._abandon(spec, "interrupted", "研究执行进程已退出，可从检查点恢复研究")
+        return reclaimed
+
+    async def _abandon(self, spec: Dict[str, Any], status: str, message: str):
+        """结束未执行（或执行被中断）的任务：写入事件并关闭事件流"""
+        session_id = spec["session_id"]
+        event_type = "research_cancelled" if status == "cancelled" else "error"
+        await self.store.release(session_id)
+        await self.store.append(session_id, {"type": event_type, "content": message, "message": message})
+        await self.store.append(session_id, {"type": STREAM_END})
+        await self._finish(spec, status)
+
+    # ==================== 查询与取消 ====================
+
+    async def get_job(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态"""
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            job = await client.hgetall(f"{JOB_KEY_PREFIX}{session_id}")
+        except Exception as e:
+            logger.warning(f"Failed to get job {session_id}: {e}")
+            return None
+        if not job:
+            return None
+
+        spec = json.loads(job.pop("spec", "{}"))
+        job.update({
+            "session_id": session_id,
+            "query": spec.get("query", ""),
+            "resume": spec.get("resume", False),
+        })
+        if job.get("status") == "queued":
+            try:
+                queue = await client.lrange(QUEUE_KEY, 0, -1)
+                # 队列从左侧入队、右侧出队
+                job["position"] = len(queue) - queue.index(session_id) if session_id in queue else 0
+            except Exception:
+                pass
+        return job
+
+    async def get_owner(self, session_id: str) -> Optional[str]:
+        """任务提交者的用户标识（user_key），任务记录不存在或已过期时返回 None"""
+        for user_key, active in self._local_active.items():
+            if session_id in active:
+                return user_key
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            spec = await client.hget(f"{JOB_KEY_PREFIX}{session_id}", "spec")
+        except Exception as e:
+            logger.warning(f"Failed to get owner of job {session_id}: {e}")
+            return None
+        return json.loads(spec).get("user_key") if spec else None
+
+    async def cancel_queued(self, session_id: str) -> bool:
+        """把尚未开始执行的任务移出队列，返回是否移除"""
+        client = self._redis()
+        if client is None:
+            return False
+        try:
+            removed = await client.lrem(QUEUE_KEY, 0, session_id)
+            if not removed:
+                return False
+            job = await client.hgetall(f"{JOB_KEY_PREFIX}{session_id}")
+        except Exception as e:
+            logger.warning(f"Failed to cancel queued job {session_id}: {e}")
+            return False
+
+        spec = json.loads(job.get("spec", "{}")) if job else {"session_id": session_id, "user_key": ""}
+        await self._abandon(spec, "cancelled", "研究已取消")
+        return True
+
+
+# 单例
+_job_manager: Optional[ResearchJobManager] = None
+
+
+def get_job_manager() -> ResearchJobManager:
+    """获取研究任务管理器实例"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = ResearchJobManager()
+    return _job_manager
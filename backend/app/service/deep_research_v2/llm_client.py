@@ -0,0 +1,161 @@
+"""
+DeepResearch V2.0 - 共享异步 LLM 客户端池
+
+所有 Agent 共享进程级的 AsyncOpenAI 客户端（按 api_key + base_url 区分），
+底层使用带 keep-alive 的有界 httpx 连接池，并按模型限制并发请求数，
+避免每个 Agent 各自持有连接池、每次调用占用一个线程。
+
+可在 llm_config 中通过 `llm_pool` 配置（均为可选）：
+    llm_pool.max_connections            连接池最大连接数（默认 100）
+    llm_pool.max_keepalive_connections  保持的空闲连接数（默认 20）
+    llm_pool.keepalive_expiry           空闲连接保持时间，秒（默认 30）
+    llm_pool.timeout                    单次请求超时，秒（默认 300）
+    llm_pool.default_concurrency        每个模型的默认并发上限（默认 8）
+    llm_pool.model_concurrency          {模型名: 并发上限}
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Any, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger("LLMClientPool")
+
+DEFAULT_POOL_SETTINGS: Dict[str, Any] = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "timeout": 300.0,
+    "default_concurrency": 8,
+    "model_concurrency": {},
+}
+
+
+def _load_pool_settings() -> Dict[str, Any]:
+    """从 llm_config 读取连接池配置，缺失的字段使用默认值"""
+    settings = dict(DEFAULT_POOL_SETTINGS)
+    settings["model_concurrency"] = {}
+
+    try:
+        try:
+            from config.llm_config import get_config
+        except ImportError:
+            from app.config.llm_config import get_config
+        pool_config = getattr(get_config(), "llm_pool", None)
+    except Exception as e:
+        logger.debug(f"llm_pool config unavailable, using defaults: {e}")
+        pool_config = None
+
+    if pool_config is None:
+        return settings
+
+    for key in DEFAULT_POOL_SETTINGS:
+        if isinstance(pool_config, dict):
+            value = pool_config.get(key)
+        else:
+            value = getattr(pool_config, key, None)
+        if value is not None:
+            settings[key] = dict(value) if key == "model_concurrency" else value
+
+    return settings
+
+
+class LLMClientPool:
+    """
+    进程级 LLM 客户端池
+
+    httpx 连接和 asyncio 信号量都绑定在事件循环上，
+    因此资源按事件循环分别维护，事件循环被回收时自动释放。
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._per_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Dict]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        if self._settings is None:
+            self._settings = _load_pool_settings()
+            logger.info(
+                f"LLM pool settings: max_connections={self._settings['max_connections']}, "
+                f"keepalive={self._settings['max_keepalive_connections']}, "
+                f"default_concurrency={self._settings['default_concurrency']}"
+            )
+        return self._settings
+
+    def _loop_resources(self) -> Dict[str, Dict]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            resources = self._per_loop.get(loop)
+            if resources is None:
+                resources = {"clients": {}, "semaphores": {}}
+                self._per_loop[loop] = resources
+            return resources
+
+    def get_client(self, api_key: str, base_url: str) -> AsyncOpenAI:
+        """获取（或创建）共享的 AsyncOpenAI 客户端，必须在事件循环中调用"""
+        clients: Dict[Tuple[str, str], AsyncOpenAI] = self._loop_resources()["clients"]
+        key = (api_key or "", base_url or "")
+
+        client = clients.get(key)
+        if client is None:
+            settings = self.settings
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings["max_connections"],
+                    max_keepalive_connections=settings["max_keepalive_connections"],
+                    keepalive_expiry=settings["keepalive_expiry"],
+                ),
+                timeout=httpx.Timeout(settings["timeout"], connect=10.0),
+            )
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            clients[key] = client
+            logger.info(f"Created shared AsyncOpenAI client for {base_url}")
+
+        return client
+
+    def get_semaphore(self, model: str) -> asyncio.Semaphore:
+        """获取模型级并发信号量"""
+        semaphores: Dict[str, asyncio.Semaphore] = self._loop_resources()["semaphores"]
+
+        semaphore = semaphores.get(model)
+        if semaphore is None:
+            settings = self.settings
+            limit = settings["model_concurrency"].get(model, settings["default_concurrency"])
+            semaphore = asyncio.Semaphore(max(1, int(limit)))
+            semaphores[model] = semaphore
+
+        return semaphore
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的所有客户端"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            resources = self._per_loop.pop(loop, None)
+        if not resources:
+            return
+
+        for client in resources["clients"].values():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close LLM client: {e}")
+
+
+# 单例
+_llm_pool: Optional[LLMClientPool] = None
+
+
+def get_llm_pool() -> LLMClientPool:
+    """获取 LLM 客户端池实例"""
+    global _llm_pool
+    if _llm_pool is None:
+        _llm_pool = LLMClientPool()
+    return _llm_pool
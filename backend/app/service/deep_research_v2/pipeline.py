@@ -0,0 +1,281 @@
+"""
+DeepResearch V2.0 - 阶段重叠执行（实验性）
+
+顺序模式下 Scout → DataAnalyst → CodeWizard → LeadWriter 逐阶段执行，
+每个阶段都要等上一阶段的所有章节完成，总耗时是各阶段耗时之和。
+重叠执行模式让每项工作在自身输入就绪后立即开始：
+1. 研究：各章节并行研究（与顺序模式相同，每轮最多 3 个章节）
+2. 章节图表：某章节研究完成后立即为它生成图表（CodeWizard），与其他章节的研究重叠
+3. 全局分析：全部研究完成后启动 DataAnalyst（结构化提取、知识图谱、图表）和 CodeWizard 数据分析
+4. 撰写：章节撰写需要结构化提取结果（数据点、洞察），而提取基于全部事实、在全部研究完成后才开始，
+   因此所有章节都在「全部研究 → 结构化提取」之后才开始撰写（有界并发）；
+   撰写与知识图谱、全局图表、代码分析等其余分析步骤重叠
+5. 所有章节和全局分析完成后整合报告
+
+关键路径：全部研究 → 结构化提取 → 章节撰写 → 整合。相比顺序模式，节省的是章节图表与研究、
+其余分析步骤与撰写的重叠时间；研究、提取和撰写之间没有按章节的重叠。
+结束时日志记录各节点的时间和撰写与其余分析的实际重叠时长。
+
+与顺序模式一致：数据点不足 CodeWizard.MIN_DATA_POINTS 时不生成图表、不做代码分析；
+全部研究完成、全局分析完成后各提交一次检查点；每个阶段开始前检查取消信号，已取消则不再开始新的工作。
+工作流图通过状态中的运行时字段传入 _checkpoint（提交检查点）和 _cancelled（取消事件）。
+
+各阶段通过 Agent 的公开方法执行（DeepScout.begin_research / research_section / finish_research、
+DataAnalyst.analyze_data、CodeWizard.chart_sections / generate_section_chart / analyze_data、
+LeadWriter.pending_sections / begin_writing / write_section / collect_section_results / finish_writing），
+顺序模式下各 Agent 的 process 也由这些方法组成。
+
+实验性功能，默认关闭，由环境变量 RESEARCH_PIPELINE=1 或配置 research.pipeline_sections 开启。
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, List, Optional
+
+from .state import ResearchState, ResearchPhase
+
+logger = logging.getLogger("SectionPipeline")
+
+
+class SectionPipeline:
+    """
+    重叠执行研究、分析和撰写阶段（实验性）
+
+    与 Agent 一样提供 name 和 process(state)，由工作流图作为一个整体执行并转发事件。
+    """
+
+    name = "SectionPipeline"
+
+    def __init__(self, scout, data_analyst, wizard, writer):
+        self.scout = scout
+        self.data_analyst = data_analyst
+        self.wizard = wizard
+        self.writer = writer
+
+    async def process(self, state: ResearchState) -> ResearchState:
+        """处理入口（取消时同时取消所有章节任务）"""
+        tasks: List[asyncio.Task] = []
+        try:
+            await self._run(state, tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        return state
+
+    async def _run(self, state: ResearchState, tasks: List[asyncio.Task]) -> None:
+        started = time.monotonic()
+        timings: Dict[str, float] = {}
+        # 关键节点的时间（相对开始时间，秒）
+        marks: Dict[str, float] = {}
+
+        def mark(name: str) -> None:
+            marks[name] = time.monotonic() - started
+
+        def spawn(coro: Awaitable) -> asyncio.Task:
+            task = asyncio.create_task(coro)
+            tasks.append(task)
+            return task
+
+        # 1. 研究
+        self._publish_phase(state, "researching", "开始深度搜索...")
+        state["phase"] = ResearchPhase.RESEARCHING.value
+        research_sections = await self.scout.begin_research(state)
+        research = {
+            section["id"]: spawn(self.scout.research_section(state, section))
+            for section in research_sections
+        }
+        all_research = spawn(self._timed(
+            self._finish_research(state, research_sections, list(research.values())), "research", timings
+        ))
+        all_research.add_done_callback(lambda _: mark("research_done"))
+
+        # 2. 章节图表（该章节研究完成即开始）
+        extracted = asyncio.Event()
+        charts = {
+            section["id"]: spawn(self._section_chart(
+                state, section, research.get(section["id"], all_research), all_research, extracted
+            ))
+            for section in self.wizard.chart_sections(state)
+        }
+
+        # 3. 全局分析（全部研究完成后开始）
+        analysis = spawn(self._analyze(state, all_research, extracted, timings))
+        analysis.add_done_callback(lambda _: mark("analysis_done"))
+        extraction = spawn(extracted.wait())
+        extraction.add_done_callback(lambda _: mark("extraction_done"))
+
+        # 4. 撰写（章节的研究、图表、结构化提取就绪即开始）
+        sections = self.writer.pending_sections(state)
+        semaphore = asyncio.Semaphore(self.writer.max_concurrent_sections)
+        writing_started = False
+
+        async def write(section: Dict) -> List[Dict]:
+            nonlocal writing_started
+            section_id = section["id"]
+            await self._wait([research.get(section_id, all_research), charts.get(section_id), extraction])
+            async with semaphore:
+                if self._cancelled(state):
+                    return []
+                if not writing_started:
+                    writing_started = True
+                    mark("writing_started")
+                    self._publish_phase(state, "writing", "开始撰写报告...")
+                    self.writer.begin_writing(state)
+                return await self._timed(self.writer.write_section(state, section), f"write:{section_id}", timings)
+
+        writes = [spawn(write(section)) for section in sections]
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        mark("writing_done")
+        await self._wait([analysis, *charts.values()])
+
+        # 5. 整合报告
+        if self._cancelled(state):
+            logger.info("Pipeline cancelled before synthesis")
+            return
+        if not writing_started:
+            self._publish_phase(state, "writing", "开始撰写报告...")
+            self.writer.begin_writing(state)
+        self.writer.collect_section_results(state, sections, results)
+        state["phase"] = ResearchPhase.WRITING.value
+        await self._timed(self.writer.finish_writing(state), "synthesis", timings)
+
+        self._log_timings(time.monotonic() - started, timings, marks)
+
+    # ==================== 阶段 ====================
+
+    async def _finish_research(
+        self,
+        state: ResearchState,
+        sections: List[Dict],
+        research_tasks: List[asyncio.Task]
+    ) -> None:
+        """等待所有章节研究完成"""
+        results = await asyncio.gather(*research_tasks, return_exceptions=True)
+        for section, result in zip(sections, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to research section {section.get('title')}: {result}")
+                state["errors"].append(f"章节「{section.get('title')}」研究失败: {result}")
+        if sections:
+            self.scout.finish_research(state)
+        self._checkpoint(state)
+
+    async def _section_chart(
+        self,
+        state: ResearchState,
+        section: Dict,
+        ready: asyncio.Task,
+        all_research: asyncio.Task,
+        extracted: asyncio.Event
+    ) -> None:
+        """章节研究完成后生成该章节的图表"""
+        await self._wait([ready])
+        if len(state["data_points"]) < self.wizard.MIN_DATA_POINTS:
+            # 其他章节的研究和结构化提取还会补充数据点，全部完成后再判断（与顺序模式的判断时机一致）
+            await self._wait([all_research])
+            await extracted.wait()
+            if len(state["data_points"]) < self.wizard.MIN_DATA_POINTS:
+                logger.info(f"Not enough data points for chart of section {section.get('title')}, skipped")
+                return
+        if self._cancelled(state):
+            return
+        try:
+            await self.wizard.generate_section_chart(state, section)
+        except Exception as e:
+            logger.error(f"Failed to generate chart for section {section.get('title')}: {e}")
+
+    async def _analyze(
+        self,
+        state: ResearchState,
+        ready: asyncio.Task,
+        extracted: asyncio.Event,
+        timings: Dict[str, float]
+    ) -> None:
+        """全部研究完成后执行全局数据分析"""
+        await self._wait([ready])
+        started = time.monotonic()
+        try:
+            if self._cancelled(state):
+                return
+            self._publish_phase(state, "analyzing", "开始数据分析...")
+            await self.data_analyst.analyze_data(state, extracted=extracted)
+        except Exception as e:
+            logger.error(f"Data analysis failed: {e}")
+        finally:
+            extracted.set()
+
+        if self._cancelled(state):
+            return
+        if len(state["data_points"]) >= self.wizard.MIN_DATA_POINTS:
+            try:
+                await self.wizard.analyze_data(state)
+            except Exception as e:
+                logger.error(f"Code analysis failed: {e}")
+        else:
+            logger.info(f"Not enough data points ({len(state['data_points'])}), code analysis skipped")
+        timings["analysis"] = time.monotonic() - started
+        self._checkpoint(state)
+
+    # ==================== 工具 ====================
+
+    @staticmethod
+    async def _wait(dependencies: List[Optional[asyncio.Future]]) -> None:
+        """等待依赖完成（依赖失败不影响下游，由各阶段自行降级）"""
+        pending = {dep for dep in dependencies if dep is not None}
+        if pending:
+            await asyncio.wait(pending)
+
+    @staticmethod
+    async def _timed(coro: Awaitable, stage: str, timings: Dict[str, float]) -> Any:
+        started = time.monotonic()
+        try:
+            return await coro
+        finally:
+            timings[stage] = time.monotonic() - started
+
+    @staticmethod
+    def _cancelled(state: ResearchState) -> bool:
+        """研究是否已取消"""
+        cancelled = state.get("_cancelled")
+        return cancelled is not None and cancelled.is_set()
+
+    @staticmethod
+    def _checkpoint(state: ResearchState) -> None:
+        """提交检查点（由工作流图在后台写入）"""
+        submit = state.get("_checkpoint")
+        if submit is not None:
+            submit()
+
+    @staticmethod
+    def _publish_phase(state: ResearchState, phase: str, content: str) -> None:
+        """推送阶段事件（与顺序模式下工作流图产出的 phase 事件一致）"""
+        queue = state.get("_message_queue")
+        if queue is not None:
+            queue.put_nowait({"type": "phase", "phase": phase, "content": content})
+
+    @staticmethod
+    def _log_timings(elapsed: float, timings: Dict[str, float], marks: Dict[str, float]) -> None:
+        """记录各阶段耗时（阶段耗时之和即顺序模式下的大致耗时）、关键路径节点和实际重叠时长"""
+        writes = [value for stage, value in timings.items() if stage.startswith("write:")]
+        stages = {
+            "research": timings.get("research", 0.0),
+            "analysis": timings.get("analysis", 0.0),
+            "writing": max(writes, default=0.0),
+            "synthesis": timings.get("synthesis", 0.0),
+        }
+        summary = ", ".join(f"{stage}={value:.1f}s" for stage, value in stages.items())
+        logger.info(
+            f"Pipeline finished in {elapsed:.1f}s, stage sum {sum(stages.values()):.1f}s ({summary})"
+        )
+
+        path = ", ".join(
+            f"{name}=+{marks[name]:.1f}s"
+            for name in ("research_done", "extraction_done", "writing_started", "writing_done", "analysis_done")
+            if name in marks
+        )
+        overlap = 0.0
+        if "writing_started" in marks and "analysis_done" in marks:
+            end = min(marks["analysis_done"], marks.get("writing_done", marks["analysis_done"]))
+            overlap = max(0.0, end - marks["writing_started"])
+        logger.info(f"Pipeline critical path: {path}; writing overlapped remaining analysis by {overlap:.1f}s")
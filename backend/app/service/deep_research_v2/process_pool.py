@@ -0,0 +1,158 @@
+"""
+DeepResearch V2.0 - 常驻子进程池
+
+网页正文提取（html_extract）和图表沙箱（sandbox_pool）共用的进程池：
+1. 进程按需启动（也可预先全部启动），通过管道收发请求，执行完归还复用
+2. 超时或异常的进程由调用方杀掉，只释放名额，下次需要时重新启动
+3. 异步调用方先在事件循环上等待名额（slot），拿到名额后才进入 asyncio.to_thread，
+   等待空闲进程不会占住默认线程池中的线程
+"""
+
+import queue
+import asyncio
+import logging
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Generic, Optional, TypeVar
+
+logger = logging.getLogger("ProcessPool")
+
+
+class PipeProcess:
+    """通过管道通信的单个子进程"""
+
+    def __init__(self, context, target, args: tuple, name: str):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=target, args=(child_conn,) + args, name=name, daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def close(self) -> None:
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=2)
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+W = TypeVar("W", bound=PipeProcess)
+
+
+class ProcessPool(ABC, Generic[W]):
+    """
+    子进程池（线程安全，进程按需启动）
+
+    子类实现 _spawn（启动一个进程），可覆盖 _reusable（归还时是否复用）。
+    与 ProcessPoolExecutor 不同，超时的任务可以直接杀掉执行它的进程并释放名额，卡住的任务不会永久占用进程。
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: "queue.Queue[W]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._count = 0
+        self._closed = False
+        # 每个事件循环一个名额信号量（asyncio.Semaphore 绑定在首次使用它的事件循环上）
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    @abstractmethod
+    def _spawn(self) -> W:
+        """启动一个子进程"""
+        pass
+
+    def _reusable(self, worker: W) -> bool:
+        return True
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """在事件循环上等待名额；持有名额期间调用阻塞方法不会等待空闲进程（size <= 0 时不限制）"""
+        if self.size <= 0:
+            yield
+            return
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(max(1, self.size))
+        async with slots:
+            yield
+
+    def acquire(self) -> W:
+        """取一个空闲进程；没有空闲且未达上限时启动新进程，否则阻塞等待"""
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                spawn = self._count < self.size
+                if spawn:
+                    self._count += 1
+            if spawn:
+                break
+
+            # 定期醒来检查名额（被杀掉的进程只释放名额，不会放回空闲队列）
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+        try:
+            return self._spawn()
+        except Exception:
+            with self._lock:
+                self._count -= 1
+            raise
+
+    def release(self, worker: Optional[W]) -> None:
+        """归还进程；传入 None 表示进程已被杀掉，只释放名额"""
+        if worker is not None and not self._closed and self._reusable(worker):
+            self._idle.put(worker)
+            return
+        if worker is not None:
+            worker.close()
+        with self._lock:
+            self._count -= 1
+
+    def start(self) -> int:
+        """预先启动全部进程，返回启动的进程数"""
+        started = []
+        with self._lock:
+            missing = max(0, self.size - self._count)
+            self._count += missing
+        for _ in range(missing):
+            try:
+                started.append(self._spawn())
+            except Exception as e:
+                logger.warning(f"Failed to start {type(self).__name__} process: {e}")
+                with self._lock:
+                    self._count -= 1
+        for worker in started:
+            self._idle.put(worker)
+        return len(started)
+
+    def shutdown(self) -> None:
+        """关闭所有空闲进程（执行中的进程在归还时关闭）"""
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.close()
+            with self._lock:
+                self._count -= 1
@@ -0,0 +1,156 @@
+"""
+DeepResearch V2.0 - 搜索服务限流器
+
+按搜索服务商（provider）维护令牌桶 + 并发上限，避免触发服务商的 QPS 限制：
+1. 令牌桶保存在 Redis 中（Lua 脚本原子取令牌），所有进程共享，
+   多个研究 worker 进程（RESEARCH_WORKERS）或多个 uvicorn worker 合计不超过服务商的 QPS
+2. Redis 不可用时退回进程内令牌桶，此时实际 QPS 最多为 进程数 × 限额
+3. 并发上限按进程计算，同一进程内所有会话、所有 Agent 的并发搜索共享
+
+限流参数可通过环境变量覆盖（以 bocha 为例）：
+    BOCHA_RATE_LIMIT_QPS     每秒请求数，所有进程合计（默认 5）
+    BOCHA_RATE_LIMIT_BURST   突发请求数（默认等于 QPS）
+    BOCHA_MAX_CONCURRENCY    每个进程同时进行的请求数（默认 5）
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Optional
+
+logger = logging.getLogger("RateLimiter")
+
+DEFAULT_QPS = 5.0
+DEFAULT_MAX_CONCURRENCY = 5
+
+BUCKET_KEY_PREFIX = "ratelimit:"
+
+# 取一个令牌（不足时预支），返回需要等待的毫秒数；使用 Redis 服务器时钟，各进程时钟不一致也不影响
+_RESERVE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now_ms
+tokens = math.min(burst, tokens + math.max(0, now_ms - updated_at) * rate / 1000) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) * 1000 / rate) + 1000)
+if tokens >= 0 then
+    return 0
+end
+return math.ceil(-tokens * 1000 / rate)
+"""
+
+
+def _get_async_redis():
+    try:
+        from core.redis_client import get_async_redis_client
+    except ImportError:
+        from app.core.redis_client import get_async_redis_client
+    return get_async_redis_client()
+
+
+class ProviderRateLimiter:
+    """
+    令牌桶限流 + 并发上限
+
+    用法：
+        async with get_rate_limiter("bocha"):
+            await do_request()
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_concurrency: int):
+        self.name = name
+        self.rate = max(rate, 0.01)
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._redis_failed = False
+        # asyncio.Semaphore 绑定事件循环，按循环分别维护
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._semaphores[loop] = semaphore
+            return semaphore
+
+    async def _reserve_shared(self) -> float:
+        """从 Redis 中的共享令牌桶取一个令牌，返回需要等待的秒数；Redis 不可用时退回进程内令牌桶"""
+        try:
+            delay_ms = await _get_async_redis().eval(
+                _RESERVE_SCRIPT, 1, f"{BUCKET_KEY_PREFIX}{self.name}", self.rate, self.burst
+            )
+        except Exception as e:
+            if not self._redis_failed:
+                logger.warning(f"[{self.name}] shared rate limit unavailable, limiting per process: {e}")
+                self._redis_failed = True
+            return self._reserve()
+        if self._redis_failed:
+            logger.info(f"[{self.name}] shared rate limit available again")
+            self._redis_failed = False
+        return int(delay_ms) / 1000
+
+    def _reserve(self) -> float:
+        """取一个令牌，返回需要等待的秒数（令牌不足时预支，等待后生效）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        await self._semaphore().acquire()
+        try:
+            delay = await self._reserve_shared()
+            if delay > 0:
+                logger.debug(f"[{self.name}] rate limited, waiting {delay:.2f}s")
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._semaphore().release()
+            raise
+
+    def release(self) -> None:
+        self._semaphore().release()
+
+    async def __aenter__(self) -> "ProviderRateLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, qps: Optional[float] = None, max_concurrency: Optional[int] = None) -> ProviderRateLimiter:
+    """获取指定服务商的限流器（每个进程一个实例，令牌桶在 Redis 中共享）"""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            prefix = provider.upper()
+            rate = qps or float(os.getenv(f"{prefix}_RATE_LIMIT_QPS", DEFAULT_QPS))
+            burst = int(os.getenv(f"{prefix}_RATE_LIMIT_BURST", max(1, int(rate))))
+            concurrency = max_concurrency or int(os.getenv(f"{prefix}_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+            limiter = ProviderRateLimiter(provider, rate, burst, concurrency)
+            _limiters[provider] = limiter
+            logger.info(f"Rate limiter for {provider}: {rate} qps, burst {burst}, concurrency {concurrency}")
+        return limiter
@@ -0,0 +1,411 @@
+"""
+DeepResearch V2.0 - 图表代码沙箱进程池
+
+CodeWizard 生成的代码原本在服务进程的线程中 exec：每次重新导入 matplotlib、重建执行环境，
+死循环无法终止，pandas 计算还会和 Web 服务争抢 GIL。这里改为常驻的沙箱进程池：
+1. 每个沙箱进程启动时预先导入 numpy / pandas / matplotlib（Agg 后端），只需准备一次
+2. 进程内设置内存上限（RLIMIT_AS），每次执行前设置 CPU 时间上限（RLIMIT_CPU）
+3. 代码通过管道发送给空闲进程，返回 stdout / stderr 和图表 PNG 字节
+4. 超时或超出资源限制时直接杀掉进程，下次使用时重新启动；执行 SANDBOX_MAX_TASKS 次后回收，避免内存累积
+5. 进程池逻辑与网页正文提取共用（见 process_pool），等待空闲沙箱在事件循环上进行，不占用默认线程池
+
+沙箱进程在执行研究的进程中预热：内联模式下是 API 进程，队列模式下是研究 worker 进程（见 warm_sandbox_pool）。
+
+可通过环境变量配置：
+    SANDBOX_POOL_SIZE     沙箱进程数（默认 min(2, CPU 数)，0 表示在线程中执行，不隔离）
+    SANDBOX_TIMEOUT       单次执行的墙钟超时，秒（默认 60）
+    SANDBOX_CPU_SECONDS   单次执行的 CPU 时间上限，秒（默认 60）
+    SANDBOX_MEMORY_MB     沙箱进程内存上限，MB（默认 2048，0 表示不限制）
+    SANDBOX_MAX_TASKS     沙箱进程执行多少次后重启（默认 50）
+"""
+
+import io
+import os
+import signal
+import asyncio
+import logging
+import threading
+import multiprocessing
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Any, Dict, List, Optional
+
+from .process_pool import PipeProcess, ProcessPool
+
+# 资源限制（仅 Unix 可用）
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+logger = logging.getLogger("SandboxPool")
+
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", str(min(2, os.cpu_count() or 1))))
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "60"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "60"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))
+SANDBOX_MAX_TASKS = int(os.getenv("SANDBOX_MAX_TASKS", "50"))
+
+# 沙箱进程启动（导入数据分析库）的等待时间，秒
+STARTUP_TIMEOUT = 60.0
+
+# 图表中文字体
+CHINESE_FONTS = [
+    'Heiti TC', 'STHeiti', 'PingFang HK', 'Hiragino Sans GB',
+    'SimHei', 'Microsoft YaHei', 'Arial Unicode MS', 'DejaVu Sans'
+]
+
+# 白名单基础模块
+ALLOWED_MODULES = [
+    'pandas', 'numpy', 'matplotlib', 'seaborn',
+    'datetime', 'math', 'statistics', 'json', 'collections', 're'
+]
+
+
+# ==================== 沙箱执行（在沙箱进程中运行） ====================
+
+_environment: Optional[Dict[str, Any]] = None
+
+
+def _prepare_environment() -> Dict[str, Any]:
+    """导入允许的模块并构建执行环境模板（每个进程只执行一次）"""
+    global _environment
+    if _environment is not None:
+        return _environment
+
+    import matplotlib
+    matplotlib.use('Agg')  # 非交互式后端
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import numpy as np
+    import datetime
+    import math
+    import statistics
+    import json as json_module
+    import collections
+    import re as re_module
+    try:
+        import seaborn as sns
+    except ImportError:
+        sns = None
+
+    import builtins
+    original_import = builtins.__import__
+
+    def safe_import(name, globals=None, locals=None, fromlist=(), level=0):
+        """安全的 import 函数，只允许白名单模块"""
+        if name.split('.')[0] in ALLOWED_MODULES:
+            return original_import(name, globals, locals, fromlist, level)
+        raise ImportError(f"Import of '{name}' is not allowed in sandbox")
+
+    safe_builtins = {
+        name: getattr(builtins, name)
+        for name in (
+            'print', 'len', 'range', 'enumerate', 'zip', 'map', 'filter', 'sorted', 'sum',
+            'min', 'max', 'abs', 'round', 'int', 'float', 'str', 'list', 'dict', 'tuple',
+            'set', 'bool', 'isinstance', 'type', 'getattr', 'setattr', 'hasattr', 'callable',
+            'iter', 'next', 'reversed', 'slice', 'all', 'any', 'chr', 'ord', 'hex', 'bin',
+            'oct', 'pow', 'divmod', 'format', 'repr', 'hash', 'id'
+        )
+    }
+    safe_builtins.update({
+        '__import__': safe_import,
+        'True': True,
+        'False': False,
+        'None': None,
+        'input': lambda *args: '',  # 禁用 input
+        'open': None,  # 禁用 open
+    })
+
+    _environment = {
+        '__builtins__': safe_builtins,
+        # 直接提供模块引用（无需import即可使用）
+        'pd': pd,
+        'np': np,
+        'plt': plt,
+        'sns': sns,
+        'pandas': pd,
+        'numpy': np,
+        'matplotlib': matplotlib,
+        # 额外的常用模块
+        'datetime': datetime,
+        'math': math,
+        'statistics': statistics,
+        'json': json_module,
+        'collections': collections,
+        're': re_module,
+    }
+    return _environment
+
+
+def _apply_chart_style(plt) -> None:
+    """预设高级图表样式"""
+    plt.rcdefaults()
+    plt.rcParams['font.sans-serif'] = CHINESE_FONTS
+    plt.rcParams['axes.unicode_minus'] = False
+    plt.rcParams['figure.figsize'] = [12, 7]
+    plt.rcParams['figure.dpi'] = 200
+    plt.rcParams['font.size'] = 12
+    plt.rcParams['axes.titlesize'] = 18
+    plt.rcParams['axes.titleweight'] = 'bold'
+    plt.rcParams['axes.labelsize'] = 14
+    plt.rcParams['xtick.labelsize'] = 12
+    plt.rcParams['ytick.labelsize'] = 12
+    plt.rcParams['legend.fontsize'] = 12
+    plt.rcParams['axes.spines.top'] = False
+    plt.rcParams['axes.spines.right'] = False
+    plt.rcParams['axes.grid'] = True
+    plt.rcParams['grid.alpha'] = 0.3
+    plt.rcParams['grid.linestyle'] = '--'
+
+
+def run_code(code: str) -> Dict[str, Any]:
+    """
+    在当前进程中执行图表代码
+
+    Returns:
+        {"success", "output", "error", "images": [PNG 字节]}
+    """
+    environment = _prepare_environment()
+    plt = environment['plt']
+    exec_globals = dict(environment)
+
+    stdout_capture = io.StringIO()
+    stderr_capture = io.StringIO()
+    images: List[bytes] = []
+
+    try:
+        _apply_chart_style(plt)
+        with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture):
+            exec(code, exec_globals)
+
+        # exec 之后再次强制设置字体（防止 LLM 代码里的 sns.set() 等覆盖）
+        plt.rcParams['font.sans-serif'] = CHINESE_FONTS
+        plt.rcParams['axes.unicode_minus'] = False
+
+        fig = plt.gcf()
+        if fig.get_axes():
+            # 重新应用字体到当前图表的所有文本元素
+            fonts = ['Heiti TC', 'STHeiti', 'PingFang HK', 'Hiragino Sans GB', 'Arial Unicode MS']
+            for ax in fig.get_axes():
+                for text in ax.get_xticklabels() + ax.get_yticklabels():
+                    text.set_fontfamily(fonts)
+                if ax.get_title():
+                    ax.title.set_fontfamily(fonts)
+                if ax.get_xlabel():
+                    ax.xaxis.label.set_fontfamily(fonts)
+                if ax.get_ylabel():
+                    ax.yaxis.label.set_fontfamily(fonts)
+
+            buf = io.BytesIO()
+            fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor='white')
+            images.append(buf.getvalue())
+
+        stderr_value = stderr_capture.getvalue()
+        return {
+            "success": True,
+            "output": stdout_capture.getvalue(),
+            "error": stderr_value if stderr_value else None,
+            "images": images
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "output": stdout_capture.getvalue(),
+            "error": str(e) or type(e).__name__,
+            "images": []
+        }
+    finally:
+        plt.close('all')
+
+
+def _set_cpu_limit(cpu_seconds: int) -> None:
+    """在已用 CPU 时间的基础上设置本次执行的 CPU 上限（超出时进程收到 SIGXCPU 退出）"""
+    if not RESOURCE_AVAILABLE or cpu_seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _set_memory_limit(memory_mb: int) -> None:
+    if not RESOURCE_AVAILABLE or memory_mb <= 0:
+        return
+    limit = memory_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        logger.warning(f"Failed to set sandbox memory limit: {e}")
+
+
+def _worker_main(conn, memory_mb: int, cpu_seconds: int) -> None:
+    """沙箱进程入口：预热后循环接收代码并返回执行结果"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # 单线程数值计算，避免线程池占用虚拟内存和 CPU
+    for name in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(name, "1")
+    os.environ["MPLBACKEND"] = "Agg"
+
+    _set_memory_limit(memory_mb)
+    try:
+        _prepare_environment()
+        conn.send({"ready": True})
+    except Exception as e:
+        conn.send({"ready": False, "error": str(e)})
+        return
+
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, OSError):
+            break
+        if code is None:
+            break
+        _set_cpu_limit(cpu_seconds)
+        conn.send(run_code(code))
+
+
+# ==================== 进程池（在服务进程中运行） ====================
+
+class SandboxError(Exception):
+    """沙箱进程异常退出或无法启动"""
+
+
+class _SandboxProcess(PipeProcess):
+    """单个沙箱进程"""
+
+    def __init__(self, context):
+        super().__init__(context, _worker_main, (SANDBOX_MEMORY_MB, SANDBOX_CPU_SECONDS), "chart-sandbox")
+        self.tasks = 0
+
+    def wait_ready(self, timeout: float) -> None:
+        if not self.conn.poll(timeout):
+            raise SandboxError("sandbox process did not start in time")
+        message = self.conn.recv()
+        if not message.get("ready"):
+            raise SandboxError(f"sandbox process failed to start: {message.get('error')}")
+
+    def run(self, code: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """执行代码，超时返回 None；进程退出时抛出 SandboxError"""
+        self.tasks += 1
+        try:
+            self.conn.send(code)
+            if not self.conn.poll(timeout):
+                return None
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(timeout=1)
+            raise SandboxError(f"sandbox process exited with code {self.process.exitcode}")
+
+
+class SandboxPool(ProcessPool[_SandboxProcess]):
+    """沙箱进程池（线程安全，进程按需启动，达到执行次数上限的进程不再复用）"""
+
+    def __init__(
+        self,
+        size: int = SANDBOX_POOL_SIZE,
+        timeout: float = SANDBOX_TIMEOUT,
+        max_tasks: int = SANDBOX_MAX_TASKS
+    ):
+        super().__init__(size)
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self._context = multiprocessing.get_context("spawn")
+
+    def _spawn(self) -> _SandboxProcess:
+        worker = _SandboxProcess(self._context)
+        try:
+            worker.wait_ready(STARTUP_TIMEOUT)
+        except Exception:
+            worker.kill()
+            raise
+        return worker
+
+    def _reusable(self, worker: _SandboxProcess) -> bool:
+        return worker.tasks < self.max_tasks
+
+    def start(self) -> int:
+        """预先启动全部沙箱进程，返回启动的进程数"""
+        started = super().start()
+        if started:
+            logger.info(f"Started {started} chart sandbox processes")
+        return started
+
+    def execute_blocking(self, code: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """在沙箱进程中执行代码（阻塞调用）"""
+        if self.size <= 0:
+            return run_code(code)
+
+        timeout = timeout or self.timeout
+        try:
+            worker = self.acquire()
+        except Exception as e:
+            logger.error(f"Sandbox unavailable: {e}")
+            return {"success": False, "output": "", "error": f"Sandbox unavailable: {e}", "images": []}
+
+        try:
+            result = worker.run(code, timeout)
+            if result is None:
+                logger.warning(f"Sandbox execution timed out after {timeout}s, killing process {worker.process.pid}")
+                worker.kill()
+                worker = None
+                return {"success": False, "output": "", "error": f"Execution timed out after {timeout:.0f}s", "images": []}
+            return result
+        except SandboxError as e:
+            # 通常是超出 CPU / 内存限制被系统终止
+            logger.warning(f"Sandbox process crashed: {e}")
+            worker.kill()
+            worker = None
+            return {"success": False, "output": "", "error": f"Execution aborted: {e}", "images": []}
+        finally:
+            self.release(worker)
+
+    async def execute(self, code: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        在沙箱进程中执行代码（先在事件循环上等待空闲名额，再在线程中执行）
+
+        Args:
+            code: Python 代码
+            timeout: 墙钟超时，秒（默认 SANDBOX_TIMEOUT）
+
+        Returns:
+            {"success", "output", "error", "images": [PNG 字节]}
+        """
+        async with self.slot():
+            return await asyncio.to_thread(self.execute_blocking, code, timeout)
+
+
+# 单例
+_sandbox_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """获取沙箱进程池实例"""
+    global _sandbox_pool
+    if _sandbox_pool is None:
+        with _pool_lock:
+            if _sandbox_pool is None:
+                _sandbox_pool = SandboxPool()
+    return _sandbox_pool
+
+
+def warm_sandbox_pool() -> None:
+    """
+    在后台线程中预热沙箱进程（导入数据分析库耗时数秒，不阻塞调用方）
+
+    只应在执行研究的进程中调用，其他进程预热的沙箱永远不会被使用。
+    """
+    if SANDBOX_POOL_SIZE > 0:
+        threading.Thread(target=get_sandbox_pool().start, name="sandbox-warmup", daemon=True).start()
+
+
+def shutdown_sandbox_pool() -> None:
+    """关闭沙箱进程池（服务退出时调用）"""
+    global _sandbox_pool
+    if _sandbox_pool is not None:
+        _sandbox_pool.shutdown()
+        _sandbox_pool = None
@@ -79,30 +79,27 @@ class DeepResearchV2Service:
 
         logger.info(f"DeepResearch V2 Service initialized with default model: {self.model}")
 
-    async def research(
+    async def research_events(
         self,
         query: str,
-        session_id: Optional[str] = None,
+        session_id: str,
         kb_name: Optional[str] = None,
         resume: bool = False,
         user_id: Optional[str] = None
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         """
-        执行深度研究（SSE 流式输出）
+        执行深度研究，产出事件字典（用于写入可续传的会话事件流）
 
         Args:
             query: 用户问题
-            session_id: 会话ID（可选）
+            session_id: 会话ID
             kb_name: 知识库名称（可选）
             resume: 是否从检查点恢复
             user_id: 用户ID（用于检查点）
 
         Yields:
-            SSE 格式的事件字符串
+            事件字典
         """
-        if not session_id:
-            session_id = str(uuid.uuid4())
-
         if resume:
             logger.info(f"Resuming research for session {session_id}")
         else:
@@ -110,21 +107,50 @@ class DeepResearchV2Service:
 
         try:
             async for event in self.graph.run(query, session_id, resume=resume, user_id=user_id):
-                # 转换为 SSE 格式
-                yield self._format_sse(event)
+                yield event
 
         except Exception as e:
             logger.error(f"Research error: {e}")
-            yield self._format_sse({
+            yield {
                 "type": "error",
                 "content": str(e)
-            })
+            }
+
+    async def research(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        kb_name: Optional[str] = None,
+        resume: bool = False,
+        user_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        执行深度研究（SSE 流式输出，研究随连接结束而结束）
+
+        Args:
+            query: 用户问题
+            session_id: 会话ID（可选）
+            kb_name: 知识库名称（可选）
+            resume: 是否从检查点恢复
+            user_id: 用户ID（用于检查点）
+
+        Yields:
+            SSE 格式的事件字符串
+        """
+        if not session_id:
+            session_id = str(uuid.uuid4())
+
+        async for event in self.research_events(query, session_id, kb_name, resume, user_id):
+            # 转换为 SSE 格式
+            yield self._format_sse(event)
 
         # 发送结束标记
         yield "data: [DONE]\n\n"
 
     def _format_sse(self, event: Dict[str, Any]) -> str:
-        """格式化为 SSE 事件"""
+        """格式化为 SSE 事件（心跳输出为 SSE 注释行，前端无需处理）"""
+        if event.get("type") == "heartbeat":
+            return f": heartbeat {event.get('timestamp', '')}\n\n"
         return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
 
     async def research_sync(
@@ -160,7 +186,7 @@ class DeepResearchV2Service:
             "insights": state.get("insights", []),
             "iterations": state.get("iteration", 0),
             "phase": state.get("phase", ""),
-            "logs": state.get("logs", [])
+            "logs": list(state.get("logs", []))
         }
 
 
@@ -10,6 +10,8 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 
+from .event_log import EventLog, create_message_log, create_execution_log
+
 
 class ResearchPhase(str, Enum):
     """研究阶段状态机"""
@@ -146,9 +148,9 @@ class ResearchState(TypedDict):
     pending_search_queries: List[str]       # 待执行的补充搜索查询（审核后需要补充的）
 
     # 元数据
-    logs: List[Dict[str, Any]]              # 执行日志
+    logs: EventLog                          # 执行日志（有界环形缓冲）
     errors: List[str]                       # 错误记录
-    messages: List[Dict[str, Any]]          # Agent间消息（用于流式输出）
+    messages: EventLog                      # Agent间消息（用于流式输出，有界环形缓冲）
 
 
 def create_initial_state(query: str, session_id: str) -> ResearchState:
@@ -178,9 +180,9 @@ def create_initial_state(query: str, session_id: str) -> ResearchState:
         unresolved_issues=0,
         quality_score=0.0,
         pending_search_queries=[],
-        logs=[],
+        logs=create_execution_log(session_id),
         errors=[],
-        messages=[]
+        messages=create_message_log(session_id)
     )
 
 
@@ -0,0 +1,346 @@
+"""
+DeepResearch V2.0 - 网页抓取器
+
+供 DeepScout 深度阅读网页使用：
+1. 共享的 httpx.AsyncClient，连接复用（keep-alive）
+2. 按域名限制并发连接数
+3. 流式读取，超过字节上限即截断
+4. 条件请求（ETag / Last-Modified），未变化时直接复用缓存
+5. 磁盘内容缓存（按 URL 的 sha256 分片存储原始 HTML 和提取后的正文），
+   写入后定期清理：删除超过最长保留时间的条目，总大小超过上限时按最近更新时间从旧到新删除
+
+可通过环境变量配置：
+    WEB_FETCH_CACHE_DIR      缓存目录（默认 /tmp/web_fetch_cache）
+    WEB_FETCH_CACHE_TTL      缓存新鲜期，秒；期内不发请求（默认 86400）
+    WEB_FETCH_CACHE_MAX_AGE  缓存最长保留时间，秒；过期后仍可用于条件请求，超过此时间删除（默认 604800）
+    WEB_FETCH_CACHE_MAX_MB   缓存目录大小上限，MB（默认 1024）
+    WEB_FETCH_MAX_BYTES      单个页面最大读取字节数（默认 2MB）
+    WEB_FETCH_PER_HOST       每个域名的最大并发连接数（默认 4）
+    WEB_FETCH_TIMEOUT        请求超时，秒（默认 15）
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+import weakref
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger("WebFetcher")
+
+WEB_FETCH_CACHE_DIR = os.getenv("WEB_FETCH_CACHE_DIR", "/tmp/web_fetch_cache")
+WEB_FETCH_CACHE_TTL = int(os.getenv("WEB_FETCH_CACHE_TTL", "86400"))
+WEB_FETCH_CACHE_MAX_AGE = int(os.getenv("WEB_FETCH_CACHE_MAX_AGE", str(7 * 86400)))
+WEB_FETCH_CACHE_MAX_MB = int(os.getenv("WEB_FETCH_CACHE_MAX_MB", "1024"))
+WEB_FETCH_MAX_BYTES = int(os.getenv("WEB_FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+WEB_FETCH_PER_HOST = int(os.getenv("WEB_FETCH_PER_HOST", "4"))
+WEB_FETCH_TIMEOUT = float(os.getenv("WEB_FETCH_TIMEOUT", "15"))
+
+# 两次缓存清理之间的最短间隔，秒
+CACHE_SWEEP_INTERVAL = 600
+
+USER_AGENT = "Mozilla/5.0 (compatible; DeepResearchBot/2.0)"
+
+# 只处理文本类页面，PDF、图片等直接跳过
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml", "text/plain", "application/xml", "text/xml")
+
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_\-]+)', re.IGNORECASE)
+
+
+def _detect_encoding(content_type: str, head: bytes) -> str:
+    """从 Content-Type 或 <meta charset> 中识别编码"""
+    match = re.search(r"charset=([A-Za-z0-9_\-]+)", content_type or "", re.IGNORECASE)
+    if match:
+        return match.group(1)
+    match = _META_CHARSET_RE.search(head[:4096])
+    if match:
+        return match.group(1).decode("ascii", errors="ignore")
+    return "utf-8"
+
+
+def _decode(body: bytes, encoding: str) -> str:
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+class WebFetcher:
+    """带磁盘缓存的异步网页抓取器"""
+
+    def __init__(
+        self,
+        cache_dir: str = WEB_FETCH_CACHE_DIR,
+        cache_ttl: int = WEB_FETCH_CACHE_TTL,
+        cache_max_age: int = WEB_FETCH_CACHE_MAX_AGE,
+        cache_max_bytes: int = WEB_FETCH_CACHE_MAX_MB * 1024 * 1024,
+        max_bytes: int = WEB_FETCH_MAX_BYTES,
+        per_host_limit: int = WEB_FETCH_PER_HOST,
+        timeout: float = WEB_FETCH_TIMEOUT
+    ):
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self.cache_max_age = cache_max_age
+        self.cache_max_bytes = cache_max_bytes
+        self.max_bytes = max_bytes
+        self.per_host_limit = max(1, per_host_limit)
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._last_sweep = 0.0
+        # httpx 客户端和信号量绑定事件循环，按循环分别维护
+        self._per_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    # ==================== 连接 ====================
+
+    def _loop_resources(self) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            resources = self._per_loop.get(loop)
+            if resources is None:
+                resources = {
+                    "client": httpx.AsyncClient(
+                        follow_redirects=True,
+                        timeout=httpx.Timeout(self.timeout, connect=10.0),
+                        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                        headers={"User-Agent": USER_AGENT},
+                    ),
+                    "host_semaphores": {},
+                }
+                self._per_loop[loop] = resources
+            return resources
+
+    def _host_semaphore(self, resources: Dict[str, Any], host: str) -> asyncio.Semaphore:
+        semaphores: Dict[str, asyncio.Semaphore] = resources["host_semaphores"]
+        semaphore = semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            semaphores[host] = semaphore
+        return semaphore
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的 HTTP 客户端"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            resources = self._per_loop.pop(loop, None)
+        if resources:
+            await resources["client"].aclose()
+
+    # ==================== 磁盘缓存 ====================
+
+    def _cache_path(self, url: str, suffix: str) -> str:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.{suffix}")
+
+    def _read_cache(self, url: str) -> Optional[Dict[str, Any]]:
+        meta_path = self._cache_path(url, "json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._cache_path(url, "html"), "r", encoding="utf-8") as f:
+                meta["html"] = f.read()
+            text_path = self._cache_path(url, "txt")
+            if os.path.exists(text_path):
+                with open(text_path, "r", encoding="utf-8") as f:
+                    meta["text"] = f.read()
+            return meta
+        except Exception as e:
+            logger.warning(f"Failed to read fetch cache for {url}: {e}")
+            return None
+
+    def _write_file(self, path: str, content: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _write_cache(self, url: str, meta: Dict[str, Any], html: Optional[str] = None):
+        try:
+            if html is not None:
+                self._write_file(self._cache_path(url, "html"), html)
+                # 页面内容变化后，旧的正文缓存失效
+                text_path = self._cache_path(url, "txt")
+                if os.path.exists(text_path):
+                    os.remove(text_path)
+            self._write_file(self._cache_path(url, "json"), json.dumps(meta, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"Failed to write fetch cache for {url}: {e}")
+        self._maybe_sweep()
+
+    def _maybe_sweep(self):
+        """距上次清理超过 CACHE_SWEEP_INTERVAL 时清理缓存（同一时间只有一个线程清理）"""
+        if time.time() - self._last_sweep < CACHE_SWEEP_INTERVAL:
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = time.time()
+            self.sweep_cache()
+        except Exception as e:
+            logger.warning(f"Failed to sweep fetch cache: {e}")
+        finally:
+            self._sweep_lock.release()
+
+    def sweep_cache(self) -> int:
+        """
+        清理磁盘缓存：删除超过最长保留时间的条目，总大小超过上限时从最久未更新的条目开始删除
+
+        Returns:
+            删除的条目数
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+
+        # 同一 URL 的 json / html / txt 文件作为一个条目整体删除
+        entries: Dict[str, Dict[str, Any]] = {}
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                digest = item.name.split(".", 1)[0]
+                entry = entries.setdefault(digest, {"paths": [], "size": 0, "mtime": 0.0})
+                entry["paths"].append(item.path)
+                entry["size"] += stat.st_size
+                entry["mtime"] = max(entry["mtime"], stat.st_mtime)
+
+        now = time.time()
+        total = sum(entry["size"] for entry in entries.values())
+        removed = 0
+        for entry in sorted(entries.values(), key=lambda e: e["mtime"]):
+            if now - entry["mtime"] <= self.cache_max_age and total <= self.cache_max_bytes:
+                break
+            for path in entry["paths"]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= entry["size"]
+            removed += 1
+
+        if removed:
+            logger.info(f"Fetch cache sweep removed {removed} entries, {total / 1024 / 1024:.1f}MB left")
+        return removed
+
+    def _write_text(self, url: str, text: str):
+        try:
+            self._write_file(self._cache_path(url, "txt"), text)
+        except Exception as e:
+            logger.warning(f"Failed to write extracted text for {url}: {e}")
+        self._maybe_sweep()
+
+    async def store_text(self, url: str, text: str) -> None:
+        """缓存从页面提取的正文，下次抓取同一页面时直接返回"""
+        if text:
+            await asyncio.to_thread(self._write_text, url, text)
+
+    # ==================== 抓取 ====================
+
+    async def fetch(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        抓取网页
+
+        Args:
+            url: 网页地址
+
+        Returns:
+            {"url", "html", "text", "from_cache"}，text 为已缓存的正文（可能为 None）；
+            请求失败或非文本页面返回 None
+        """
+        host = urlparse(url).netloc
+        if not host:
+            return None
+
+        cached = await asyncio.to_thread(self._read_cache, url)
+        if cached and time.time() - cached.get("fetched_at", 0) < self.cache_ttl:
+            logger.debug(f"Fetch cache hit: {url}")
+            return {"url": url, "html": cached["html"], "text": cached.get("text"), "from_cache": True}
+
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        resources = self._loop_resources()
+        client: httpx.AsyncClient = resources["client"]
+
+        try:
+            async with self._host_semaphore(resources, host):
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached:
+                        logger.debug(f"Not modified: {url}")
+                        meta = {k: v for k, v in cached.items() if k not in ("html", "text")}
+                        meta["fetched_at"] = time.time()
+                        await asyncio.to_thread(self._write_cache, url, meta)
+                        return {"url": url, "html": cached["html"], "text": cached.get("text"), "from_cache": True}
+
+                    if response.status_code != 200:
+                        logger.warning(f"Fetch {url} returned {response.status_code}")
+                        return None
+
+                    content_type = response.headers.get("content-type", "")
+                    if content_type and not content_type.lower().startswith(TEXT_CONTENT_TYPES):
+                        logger.debug(f"Skip non-text content ({content_type}): {url}")
+                        return None
+
+                    chunks = []
+                    size = 0
+                    async for chunk in response.aiter_bytes():
+                        chunks.append(chunk)
+                        size += len(chunk)
+                        if size >= self.max_bytes:
+                            logger.debug(f"Truncated {url} at {size} bytes")
+                            break
+
+                    body = b"".join(chunks)[:self.max_bytes]
+                    etag = response.headers.get("etag")
+                    last_modified = response.headers.get("last-modified")
+
+        except httpx.TimeoutException:
+            logger.warning(f"Fetch timeout: {url}")
+            return None
+        except Exception as e:
+            logger.warning(f"Fetch error for {url}: {e}")
+            return None
+
+        html = _decode(body, _detect_encoding(content_type, body))
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": content_type,
+            "fetched_at": time.time(),
+        }
+        await asyncio.to_thread(self._write_cache, url, meta, html)
+
+        return {"url": url, "html": html, "text": None, "from_cache": False}
+
+
+# 单例
+_web_fetcher: Optional[WebFetcher] = None
+
+
+def get_web_fetcher() -> WebFetcher:
+    """获取网页抓取器实例"""
+    global _web_fetcher
+    if _web_fetcher is None:
+        _web_fetcher = WebFetcher()
+    return _web_fetcher
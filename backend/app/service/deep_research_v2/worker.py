@@ -0,0 +1,204 @@
+"""
+DeepResearch V2.0 - 研究任务 worker 进程
+
+从 Redis 任务队列取出研究任务并执行，事件写入会话事件流，由 API 进程的 SSE 接口订阅。
+每个 worker 进程同时执行 RESEARCH_WORKER_CONCURRENCY 个研究；
+可在多核、多节点上启动任意数量的 worker 实现水平扩展。
+
+启动方式（在 backend/app 目录下）：
+    RESEARCH_JOB_QUEUE=1 python -m service.deep_research_v2.worker
+
+也可以设置 RESEARCH_WORKERS=N，由 API 进程启动时派生 N 个本地 worker 进程
+（多个 uvicorn worker 时只应在其中一个进程上设置，或改用上面的独立启动方式）。
+
+收到 SIGTERM / SIGINT 后不再取新任务，等待正在执行的研究结束后退出。
+API 进程退出时为本地 worker 等待最多 RESEARCH_WORKER_DRAIN_TIMEOUT 秒（默认 1800，与一次研究的时长相当），
+超时仍未结束的 worker 被强制结束，其执行中的研究由其他 worker 回收时标记为中断（不计为失败，可从检查点恢复）。
+容器编排的停止宽限期（如 docker stop 的 10 秒）需相应调大，否则研究会在宽限期结束时被中断。
+worker 定期写心跳并回收已退出 worker 处理列表中的任务（见 jobs.ResearchJobManager.reclaim）。
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import logging
+import multiprocessing
+from typing import List, Set
+
+logger = logging.getLogger("ResearchWorker")
+
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "0"))
+RESEARCH_WORKER_CONCURRENCY = int(os.getenv("RESEARCH_WORKER_CONCURRENCY", "4"))
+RESEARCH_WORKER_DRAIN_TIMEOUT = float(os.getenv("RESEARCH_WORKER_DRAIN_TIMEOUT", "1800"))
+
+# 心跳间隔（须小于 jobs.WORKER_HEARTBEAT_TTL），每次心跳后顺便回收已退出 worker 的任务
+HEARTBEAT_INTERVAL = 10
+
+
+class ResearchWorker:
+    """研究任务 worker"""
+
+    def __init__(self, concurrency: int = RESEARCH_WORKER_CONCURRENCY):
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+        self._running: Set[asyncio.Task] = set()
+
+    def stop(self):
+        """停止取新任务"""
+        if not self._stopping.is_set():
+            logger.info(f"Worker {self.worker_id} stopping, waiting for {len(self._running)} running jobs")
+            self._stopping.set()
+
+    async def _heartbeat_loop(self, manager):
+        """定期写心跳并回收已退出 worker 的任务（执行中的研究结束前一直运行）"""
+        while True:
+            try:
+                await manager.heartbeat(self.worker_id)
+                reclaimed = await manager.reclaim()
+                if reclaimed:
+                    logger.info(f"Worker {self.worker_id} reclaimed {reclaimed} jobs from dead workers")
+            except Exception as e:
+                logger.warning(f"Research worker heartbeat failed: {e}")
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def run(self):
+        """主循环：有空闲名额时从队列取任务"""
+        try:
+            from .jobs import get_job_manager
+        except ImportError:
+            from service.deep_research_v2.jobs import get_job_manager
+
+        try:
+            from .sandbox_pool import warm_sandbox_pool, shutdown_sandbox_pool
+        except ImportError:
+            from service.deep_research_v2.sandbox_pool import warm_sandbox_pool, shutdown_sandbox_pool
+
+        try:
+            from service.search_cache import get_search_cache_stats
+        except ImportError:
+            from app.service.search_cache import get_search_cache_stats
+
+        # 图表代码在本进程的沙箱池中执行，启动时预热
+        warm_sandbox_pool()
+        manager = get_job_manager()
+        slots = asyncio.Semaphore(self.concurrency)
+        logger.info(f"Research worker {self.worker_id} started (concurrency={self.concurrency})")
+        heartbeat = asyncio.create_task(self._heartbeat_loop(manager))
+
+        while not self._stopping.is_set():
+            await slots.acquire()
+            try:
+                spec = await manager.claim(self.worker_id, timeout=5)
+            except Exception as e:
+                logger.warning(f"Failed to claim research job: {e}")
+                slots.release()
+                await asyncio.sleep(5)
+                continue
+
+            if spec is None:
+                slots.release()
+                continue
+
+            logger.info(f"Worker {self.worker_id} running job {spec['session_id']}")
+            task = asyncio.create_task(manager.execute(spec, self.worker_id))
+            self._running.add(task)
+
+            def _done(finished: asyncio.Task):
+                self._running.discard(finished)
+                slots.release()
+                for stats in get_search_cache_stats():
+                    logger.info(f"Search cache stats: {stats}")
+
+            task.add_done_callback(_done)
+
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        heartbeat.cancel()
+        try:
+            await manager.retire(self.worker_id)
+        except Exception as e:
+            logger.warning(f"Failed to remove worker heartbeat: {e}")
+        shutdown_sandbox_pool()
+        logger.info(f"Research worker {self.worker_id} stopped")
+
+
+async def _main(concurrency: int):
+    worker = ResearchWorker(concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except (NotImplementedError, RuntimeError):
+            pass
+    await worker.run()
+
+
+def run_worker(concurrency: int = RESEARCH_WORKER_CONCURRENCY):
+    """worker 进程入口"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    asyncio.run(_main(concurrency))
+
+
+# ==================== 本地 worker 进程 ====================
+
+_processes: List[multiprocessing.Process] = []
+
+
+def start_research_workers(count: int = RESEARCH_WORKERS) -> int:
+    """
+    派生本地 worker 进程（spawn 方式），返回启动的进程数
+
+    研究中的代码沙箱和网页正文提取需要再派生子进程，因此 worker 不能是 daemon 进程；
+    API 进程退出时由 stop_research_workers 结束。
+    """
+    if count <= 0 or _processes:
+        return 0
+    context = multiprocessing.get_context("spawn")
+    for index in range(count):
+        process = context.Process(
+            target=run_worker,
+            args=(RESEARCH_WORKER_CONCURRENCY,),
+            name=f"research-worker-{index}",
+            daemon=False
+        )
+        process.start()
+        _processes.append(process)
+    logger.info(f"Started {count} research worker processes")
+    return count
+
+
+def stop_research_workers(timeout: float = RESEARCH_WORKER_DRAIN_TIMEOUT):
+    """
+    通知本地 worker 进程退出，等待执行中的研究结束
+
+    所有 worker 共用 timeout 秒的等待时间；超时仍在运行的 worker 被强制结束，
+    其执行中的研究留在处理列表中，由其他 worker 回收（见 jobs.ResearchJobManager.reclaim）。
+    """
+    for process in _processes:
+        if process.is_alive():
+            process.terminate()
+    if any(process.is_alive() for process in _processes):
+        logger.info(f"Waiting up to {timeout:.0f}s for research workers to finish running jobs")
+    deadline = time.monotonic() + timeout
+    for process in _processes:
+        process.join(timeout=max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            logger.warning(f"Research worker {process.name} did not exit in {timeout:.0f}s, killing it")
+            process.kill()
+            process.join(timeout=5)
+    _processes.clear()
+
+
+if __name__ == "__main__":
+    # 以 python -m service.deep_research_v2.worker 启动时，确保 backend/app 在导入路径中
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    run_worker()
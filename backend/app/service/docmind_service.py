@@ -1,15 +1,34 @@
-"""DocMind 文档智能解析服务"""
+"""DocMind 文档智能解析服务
+
+入库按流式流水线执行：解析结果按布局分页拉取 → 按句子和 token 预算增量切分 → 分批向量化 → 分批写入 Milvus。
+各阶段通过有界队列衔接（下游处理不过来时上游阻塞），内存占用与文档大小无关，
+先写入的切片在整篇文档处理完之前即可被检索到。
+
+可通过环境变量配置：
+    INGESTION_BATCH_SIZE    每批向量化并写入 Milvus 的切片数（默认 64）
+    INGESTION_QUEUE_SIZE    各阶段之间最多缓冲的批次数（默认 2）
+"""
 import os
 import time
+import queue
 import hashlib
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Set, Tuple, TypeVar
 from alibabacloud_docmind_api20220711.client import Client as DocMindClient
 from alibabacloud_docmind_api20220711 import models as docmind_models
 from alibabacloud_tea_openapi import models as open_api_models
 from alibabacloud_tea_util import models as util_models
 
-from service.embedding_service import generate_embedding
+from service.embedding_service import get_embedding_engine, EmbeddingError
+from service.embedding_cache import content_hash, embed_with_cache
 from service.milvus_service import get_milvus_service
+from service.local_extraction_service import LocalExtractionService, use_local_parser
+from service.text_chunker import TextChunker, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", "64"))
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "2"))
+
+T = TypeVar("T")
 
 
 class DocMindService:
@@ -144,18 +163,17 @@ class DocMindService:
             print(f"获取结果失败: {e}")
             return None
 
-    def collect_all_results(self, task_id: str, layout_step_size: int = 10) -> str:
+    def iter_layout_texts(self, task_id: str, layout_step_size: int = 10) -> Iterator[str]:
         """
-        收集所有解析结果
+        逐页拉取解析结果，按布局块逐个产出文本
 
         Args:
             task_id: 任务ID
             layout_step_size: 步长
 
-        Returns:
-            完整的文本内容
+        Yields:
+            布局块文本（以换行结尾）
         """
-        all_text = ""
         layout_num = 0
 
         while True:
@@ -177,19 +195,9 @@ class DocMindService:
 
             # 提取文本
             for layout in layouts:
-                # 优先使用 markdownContent
-                if hasattr(layout, 'markdown_content') and layout.markdown_content:
-                    all_text += layout.markdown_content + "\n"
-                elif hasattr(layout, 'markdownContent') and layout.markdownContent:
-                    all_text += layout.markdownContent + "\n"
-                elif isinstance(layout, dict):
-                    if layout.get('markdownContent'):
-                        all_text += layout['markdownContent'] + "\n"
-                    elif layout.get('text'):
-                        all_text += layout['text'] + "\n"
-                # 尝试 text 属性
-                elif hasattr(layout, 'text') and layout.text:
-                    all_text += layout.text + "\n"
+                text = self._layout_text(layout)
+                if text:
+                    yield text + "\n"
 
             # 更新下次获取的起始位置
             layout_num += len(layouts)
@@ -198,62 +206,154 @@ class DocMindService:
             if len(layouts) < layout_step_size:
                 break
 
-        return all_text
+    @staticmethod
+    def _layout_text(layout: Any) -> Optional[str]:
+        """提取布局块文本，优先使用 markdownContent"""
+        if hasattr(layout, 'markdown_content') and layout.markdown_content:
+            return layout.markdown_content
+        elif hasattr(layout, 'markdownContent') and layout.markdownContent:
+            return layout.markdownContent
+        elif isinstance(layout, dict):
+            return layout.get('markdownContent') or layout.get('text')
+        # 尝试 text 属性
+        elif hasattr(layout, 'text') and layout.text:
+            return layout.text
+        return None
+
+    def collect_all_results(self, task_id: str, layout_step_size: int = 10) -> str:
+        """
+        收集所有解析结果
+
+        Args:
+            task_id: 任务ID
+            layout_step_size: 步长
+
+        Returns:
+            完整的文本内容
+        """
+        return "".join(self.iter_layout_texts(task_id, layout_step_size))
 
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+def chunk_text(text: str, chunk_size: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
     """
     将文本切分成块
 
     Args:
         text: 原始文本
-        chunk_size: 每块大小
-        overlap: 重叠大小
+        chunk_size: 每块 token 上限
+        overlap: 重叠 token 数
 
     Returns:
         文本块列表
     """
-    if not text:
-        return []
+    return TextChunker(max_tokens=chunk_size, overlap_tokens=overlap).chunk(text)
+
+
+def iter_batches(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """按固定大小分批"""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def prefetch(items: Iterable[T], maxsize: int = INGESTION_QUEUE_SIZE) -> Iterator[T]:
+    """
+    在后台线程中提前消费迭代器，与下游处理并行
+
+    最多缓冲 maxsize 个元素，缓冲满时后台线程阻塞（背压）；上游异常在下游取到该位置时重新抛出。
+    下游提前结束（异常或关闭生成器）时后台线程随之退出。
+
+    Args:
+        items: 上游迭代器
+        maxsize: 最多缓冲的元素数
+
+    Yields:
+        上游元素（顺序不变）
+    """
+    buffer: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+    stopped = threading.Event()
+
+    def put(kind: str, value: Any) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put((kind, value), timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
 
-    chunks = []
-    start = 0
+    def produce():
+        try:
+            for item in items:
+                if not put("item", item):
+                    return
+            put("done", None)
+        except BaseException as e:
+            put("error", e)
+
+    threading.Thread(target=produce, name="ingestion-prefetch", daemon=True).start()
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stopped.set()
 
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
 
-        # 尝试在句子边界切分
-        if end < len(text):
-            for sep in ['。', '！', '？', '.', '!', '?', '\n']:
-                last_sep = chunk.rfind(sep)
-                if last_sep > chunk_size // 2:
-                    chunk = chunk[:last_sep + 1]
-                    end = start + last_sep + 1
-                    break
+def chunk_id_for(doc_id: str, chunk: str, occurrence: int = 0) -> str:
+    """
+    按内容寻址的切片 ID
 
-        if chunk.strip():
-            chunks.append(chunk.strip())
+    同一文档中重复出现的相同内容（如分页重复的表头、页眉）按出现次序区分，
+    第 occurrence 次（从 0 开始）出现的切片 ID 不同，重复的切片都会保留。
+    """
+    key = f"{doc_id}:{content_hash(chunk)}"
+    if occurrence:
+        key = f"{key}:{occurrence}"
+    return hashlib.sha256(key.encode()).hexdigest()
 
-        start = end - overlap
 
-    return chunks
+def legacy_doc_id(file_name: str) -> str:
+    """旧版切片写入时使用的文档 ID（文件名的 MD5），用于清理旧版写入的切片"""
+    return hashlib.md5(file_name.encode()).hexdigest()
 
 
 def process_document_with_docmind(
     file_path: str,
     file_name: str,
     index_name: str,
-    chunk_size: int = 500
+    doc_id: str,
+    chunk_size: int = CHUNK_MAX_TOKENS,
+    progress: Optional[Callable[[str, int], None]] = None,
+    batch_size: int = INGESTION_BATCH_SIZE
 ) -> Dict[str, Any]:
     """
     使用 DocMind 处理文档
 
+    解析结果拉取、切分、向量化和写入 Milvus 按批流水线执行：
+    后台线程拉取并切分下一批、另一个线程向量化，当前线程写入，每批写入后即可检索。
+
+    切片 ID 由文档 ID 和切片内容决定，重新入库时与该文档已写入的切片比对：
+    只有新增或修改的切片需要向量化并写入，旧版本中已不存在的切片最后批量删除。
+    旧版按文件名写入的切片（文档 ID 为文件名的 MD5）在入库成功后一并删除。
+
     Args:
         file_path: 文件路径
         file_name: 文件名
         index_name: ES 索引名
-        chunk_size: 切片大小
+        doc_id: 文档ID（知识库文档使用 Document.id，同一知识库中重新上传同名文件时沿用原文档）
+        chunk_size: 切片 token 上限
+        progress: 进度回调 (阶段, 百分比)，由入库任务用来上报进度
+        batch_size: 每批向量化并写入的切片数
 
     Returns:
         处理结果
@@ -264,11 +364,18 @@ def process_document_with_docmind(
         "document_count": 0,
     }
 
+    def report(stage: str, percent: int):
+        if progress:
+            progress(stage, percent)
+
+    inserted = 0
+
     try:
         print(f"开始处理文档: {file_name}")
+        report("parsing", 5)
 
-        # 1. 初始化服务并提交任务
-        service = DocMindService()
+        # 1. 初始化服务并提交任务（DOCUMENT_PARSER 决定使用 DocMind 还是本地解析）
+        service = LocalExtractionService() if use_local_parser(file_name) else DocMindService()
         task_id = service.submit_job(file_path, file_name)
 
         if not task_id:
@@ -282,76 +389,99 @@ def process_document_with_docmind(
             print(result["message"])
             return result
 
-        # 3. 收集解析结果
-        print("开始收集解析结果...")
-        text = service.collect_all_results(task_id)
-
-        if not text or not text.strip():
-            result["message"] = "文档内容为空"
-            print(result["message"])
-            return result
-
-        print(f"解析到文本长度: {len(text)}")
-
-        # 4. 文本切分
-        chunks = chunk_text(text, chunk_size=chunk_size)
-
-        if not chunks:
-            result["message"] = "文档切分失败"
-            print(result["message"])
-            return result
-
-        print(f"文档切分完成，共 {len(chunks)} 个切片")
-
-        # 5. 生成向量嵌入
-        print("开始生成向量嵌入...")
-        embeddings = generate_embedding(chunks)
-
-        if not embeddings:
-            result["message"] = "向量生成失败: 返回为空"
+        # 3. 已写入的切片（切片 ID 由内容决定，内容未变的切片保留不动）
+        engine = get_embedding_engine()
+        milvus = get_milvus_service()
+        existing = milvus.query_chunk_indices(index_name, doc_id)
+        seen: Set[str] = set()
+        occurrences: Dict[str, int] = {}
+        moved: Dict[str, int] = {}
+
+        def new_chunks(chunks: Iterable[str]) -> Iterator[Tuple[int, str, str]]:
+            """过滤出需要写入的切片：(位置, 切片 ID, 内容)"""
+            for index, chunk in enumerate(chunks):
+                digest = content_hash(chunk)
+                occurrence = occurrences.get(digest, 0)
+                occurrences[digest] = occurrence + 1
+                chunk_id = chunk_id_for(doc_id, chunk, occurrence)
+                seen.add(chunk_id)
+                if chunk_id not in existing:
+                    yield index, chunk_id, chunk
+                elif existing[chunk_id] != index:
+                    # 内容未变但位置变了，只需更新切片索引
+                    moved[chunk_id] = index
+
+        def embed(batch: List[Tuple[int, str, str]]):
+            return batch, embed_with_cache(engine, [chunk for _, _, chunk in batch])
+
+        # 4. 流水线：拉取解析结果 → 切分 → 比对 → 向量化（优先使用缓存）→ 写入 Milvus
+        report("chunking", 40)
+        print(f"开始流式处理解析结果，已有切片 {len(existing)} 个...")
+        chunker = TextChunker(max_tokens=chunk_size)
+        chunks = chunker.chunk_blocks(service.iter_layout_texts(task_id))
+        batches = prefetch(iter_batches(new_chunks(chunks), max(1, batch_size)))
+        embedded = prefetch(embed(batch) for batch in batches)
+
+        batch_count = 0
+        try:
+            for batch, embeddings in embedded:
+                documents = [
+                    {
+                        "id": chunk_id,
+                        "doc_id": doc_id,
+                        "kb_id": index_name,
+                        "filename": file_name,
+                        "content": chunk,
+                        "chunk_index": index,
+                        "vector": embedding.tolist(),
+                    }
+                    for (index, chunk_id, chunk), embedding in zip(batch, embeddings)
+                ]
+
+                milvus.insert_documents(index_name, documents, flush=False)
+                inserted += len(documents)
+                batch_count += 1
+                # 总切片数未知，进度在 50~95 之间逐批逼近
+                report("inserting", 50 + int(45 * (1 - 0.8 ** batch_count)))
+        except EmbeddingError as e:
+            result["message"] = f"向量生成失败: {e}"
             print(result["message"])
-            return result
+            raise
 
-        if len(embeddings) != len(chunks):
-            result["message"] = f"向量生成失败: 数量不匹配 ({len(embeddings)} vs {len(chunks)})"
+        if not seen:
+            result["message"] = "文档内容为空"
             print(result["message"])
             return result
 
-        print(f"向量生成完成，维度: {len(embeddings[0])}")
-
-        # 6. 构建 Milvus 文档
-        doc_id = hashlib.md5(file_name.encode()).hexdigest()
-        documents = []
-
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk_id = hashlib.md5(f"{file_name}_{i}_{chunk[:50]}".encode()).hexdigest()
-
-            doc = {
-                "id": chunk_id,
-                "doc_id": doc_id,
-                "kb_id": index_name,
-                "filename": file_name,
-                "content": chunk,
-                "chunk_index": i,
-                "vector": embedding,
-            }
-            documents.append(doc)
-
-        # 7. 插入 Milvus
-        print(f"开始插入 Milvus，集合: {index_name}")
-        milvus = get_milvus_service()
-        milvus.insert_documents(index_name, documents)
+        # 5. 更新位置变化的切片索引，删除旧版本中已不存在的切片和旧版按文件名写入的切片
+        if moved:
+            milvus.update_chunk_indices(index_name, moved)
+        stale = existing.keys() - seen
+        if stale:
+            milvus.delete_by_ids(index_name, stale)
+        legacy_id = legacy_doc_id(file_name)
+        legacy = milvus.query_chunk_indices(index_name, legacy_id) if legacy_id != doc_id else {}
+        if legacy:
+            milvus.delete_by_doc_id(index_name, legacy_id)
+            stale = stale | legacy.keys()
+        if inserted or moved or stale:
+            milvus.flush(index_name)
 
         result["success"] = True
-        result["message"] = f"成功处理 {len(documents)} 个切片"
-        result["document_count"] = len(documents)
+        result["message"] = (
+            f"成功处理 {len(seen)} 个切片（新增 {inserted} 个，"
+            f"保留 {len(seen) - inserted} 个（其中 {len(moved)} 个更新位置），删除 {len(stale)} 个）"
+        )
+        result["document_count"] = len(seen)
 
         print(f"文档处理完成: {result['message']}")
 
     except Exception as e:
-        result["message"] = f"处理失败: {str(e)}"
+        if not result["message"]:
+            result["message"] = f"处理失败: {str(e)}"
         print(f"文档处理异常: {e}")
         import traceback
         traceback.print_exc()
+        # 已写入的切片按内容寻址，重试时会被识别为已存在而跳过，无需清理
 
     return result
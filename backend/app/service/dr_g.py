@@ -13,15 +13,16 @@ import requests
 import json
 from openai import OpenAI
 import os
-import time
 import re
 import asyncio
-import hashlib
 from typing import Dict, Any, AsyncGenerator, List, Optional, Tuple
 from urllib.parse import urlparse
 from collections import Counter
 import logging
 
+from service.search_cache import get_search_cache
+from service.minhash import NearDuplicateIndex
+
 # --- Configuration ---
 SEARCH_API_KEY = os.getenv("BOCHA_API_KEY", "Bearer sk-392ef5953eaa4c43be43e6daab4e82a4")
 LLM_API_KEY = os.getenv("DASHSCOPE_API_KEY", "sk-f02db5a079ab41588b1cab09ad2777a2")
@@ -29,63 +30,10 @@ LLM_BASE_URL = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/c
 
 # 优化配置
 MAX_CONCURRENT_SEARCHES = 3
-SEARCH_CACHE_TTL = 3600
-CONTENT_SIMILARITY_THRESHOLD = 0.8
+CONTENT_SIMILARITY_THRESHOLD = 0.8  # 字符 3-gram 的 Jaccard 相似度阈值
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- 搜索缓存 ---
-_search_cache: Dict[str, Tuple[List, float]] = {}
-
-
-def get_query_hash(query: str) -> str:
-    """生成查询的哈希值用于缓存"""
-    return hashlib.md5(query.strip().lower().encode()).hexdigest()
-
-
-def get_cached_search(query: str) -> Optional[List]:
-    """获取缓存的搜索结果"""
-    query_hash = get_query_hash(query)
-    if query_hash in _search_cache:
-        results, timestamp = _search_cache[query_hash]
-        if time.time() - timestamp < SEARCH_CACHE_TTL:
-            logging.info(f"Cache hit for query: {query[:50]}...")
-            return results
-        else:
-            del _search_cache[query_hash]
-    return None
-
-
-def set_cached_search(query: str, results: List):
-    """缓存搜索结果"""
-    query_hash = get_query_hash(query)
-    _search_cache[query_hash] = (results, time.time())
-    current_time = time.time()
-    expired_keys = [k for k, (_, t) in _search_cache.items() if current_time - t > SEARCH_CACHE_TTL]
-    for k in expired_keys:
-        del _search_cache[k]
-
-
-def compute_content_similarity(text1: str, text2: str) -> float:
-    """计算两段文本的相似度"""
-    if not text1 or not text2:
-        return 0.0
-    words1 = set(text1.lower().split())
-    words2 = set(text2.lower().split())
-    if not words1 or not words2:
-        return 0.0
-    intersection = len(words1 & words2)
-    union = len(words1 | words2)
-    return intersection / union if union > 0 else 0.0
-
-
-def is_content_duplicate(new_content: str, existing_contents: List[str], threshold: float = CONTENT_SIMILARITY_THRESHOLD) -> bool:
-    """检查内容是否与已有内容重复"""
-    for existing in existing_contents:
-        if compute_content_similarity(new_content, existing) >= threshold:
-            return True
-    return False
-
 
 def serialize_event(event_data: Dict[str, Any]) -> str:
     """将事件数据序列化为JSON字符串"""
@@ -296,6 +244,7 @@ class ResearchService:
     ) -> AsyncGenerator[str, None]:
         """经典研究模式 (保持向后兼容)"""
         memory = []
+        memory_index = NearDuplicateIndex()  # 已收集内容的去重索引
         processed_urls = set()
         current_subqueries = []
         all_subqueries_history = set()
@@ -392,7 +341,6 @@ class ResearchService:
                     search_local=search_local
                 )
 
-                existing_contents = [item['summary'] for item in memory]
                 new_results_count = 0
 
                 for item in search_results_list:
@@ -409,11 +357,10 @@ class ResearchService:
                         if not url or not summary or url in processed_urls:
                             continue
 
-                        if is_content_duplicate(summary, existing_contents):
+                        if not memory_index.add_if_new(summary, CONTENT_SIMILARITY_THRESHOLD):
                             continue
 
                         processed_urls.add(url)
-                        existing_contents.append(summary)
 
                         memory.append({
                             "subquery": subquery,
@@ -669,11 +616,11 @@ async def parallel_search_all(
 
     async def search_web_with_semaphore(query: str) -> Tuple[str, List, str]:
         async with semaphore:
-            cached = get_cached_search(query)
+            cached = await get_search_cache("dr_g").aget(query)
             if cached is not None:
                 return (query, cached, 'web')
             results = await asyncio.to_thread(websearch, query)
-            set_cached_search(query, results)
+            await get_search_cache("dr_g").aset(query, results)
             await asyncio.sleep(0.5)
             return (query, results, 'web')
 
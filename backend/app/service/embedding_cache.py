@@ -0,0 +1,97 @@
+"""切片向量缓存
+
+按切片内容的 SHA-256 持久化向量（chunk_embeddings 表），同一内容在任何文档、任何版本中只向量化一次。
+重新上传修改过的文档时，内容未变的切片直接复用缓存，只有新增或修改的切片调用向量化接口。
+"""
+import hashlib
+import logging
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+from core.database import SessionLocal
+from models.knowledge import ChunkEmbedding
+from service.embedding_service import EmbeddingEngine
+
+logger = logging.getLogger("EmbeddingCache")
+
+
+def content_hash(text: str) -> str:
+    """切片内容哈希"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _model_key(engine: EmbeddingEngine) -> str:
+    return f"{engine.model_name}:{engine.dimensions}"
+
+
+def load_embeddings(model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+    """读取已缓存的向量，返回 {内容哈希: 向量}（缓存不可用时返回空）"""
+    if not hashes:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = db.query(ChunkEmbedding.content_hash, ChunkEmbedding.vector).filter(
+            ChunkEmbedding.model == model,
+            ChunkEmbedding.content_hash.in_(hashes),
+        ).all()
+        return {row.content_hash: np.frombuffer(row.vector, dtype=np.float32) for row in rows}
+    except Exception as e:
+        logger.warning(f"Failed to load cached embeddings: {e}")
+        return {}
+    finally:
+        db.close()
+
+
+def store_embeddings(model: str, vectors: Dict[str, np.ndarray]) -> None:
+    """写入向量缓存（已存在的内容哈希忽略）"""
+    if not vectors:
+        return
+    db = SessionLocal()
+    try:
+        statement = insert(ChunkEmbedding).values([
+            {
+                "model": model,
+                "content_hash": key,
+                "vector": np.asarray(vector, dtype=np.float32).tobytes(),
+            }
+            for key, vector in vectors.items()
+        ]).on_conflict_do_nothing(index_elements=["model", "content_hash"])
+        db.execute(statement)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to store embeddings in cache: {e}")
+    finally:
+        db.close()
+
+
+def embed_with_cache(engine: EmbeddingEngine, texts: List[str]) -> np.ndarray:
+    """
+    向量化切片，优先使用缓存
+
+    Args:
+        engine: 向量化引擎
+        texts: 切片文本
+
+    Returns:
+        float32 矩阵 (len(texts), dimensions)
+    """
+    model = _model_key(engine)
+    hashes = [content_hash(text) for text in texts]
+    cached = load_embeddings(model, list(set(hashes)))
+
+    missing: Dict[str, str] = {}
+    for key, text in zip(hashes, texts):
+        if key not in cached:
+            missing.setdefault(key, text)
+
+    if missing:
+        embeddings = engine.embed_sync(list(missing.values()))
+        computed = dict(zip(missing.keys(), embeddings))
+        store_embeddings(model, computed)
+        cached.update(computed)
+
+    logger.info(f"Embedded {len(texts)} chunks ({len(texts) - len(missing)} from cache)")
+    return np.stack([cached[key] for key in hashes]).astype(np.float32, copy=False)
@@ -2,14 +2,20 @@
 Embedding 服务 - 使用阿里 DashScope
 
 功能：
-1. generate_embedding - 使用 text-embedding-v4 生成向量
-2. rerank_similarity - 使用 DashScope Rerank 重排序
+1. EmbeddingEngine - 异步并发批量向量化（共享客户端、失败重试、返回 float32 矩阵）
+2. generate_embedding - 使用 text-embedding-v4 生成向量（兼容接口）
+3. rerank_similarity - 使用 DashScope Rerank 重排序
 """
 
 import os
-from typing import List, Optional, Tuple
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, List, Optional, Tuple
 import numpy as np
-from openai import OpenAI
+from openai import AsyncOpenAI
 from llama_index.core.data_structs import Node
 from llama_index.core.schema import NodeWithScore
 from llama_index.postprocessor.dashscope_rerank import DashScopeRerank
@@ -17,82 +23,222 @@ from llama_index.postprocessor.dashscope_rerank import DashScopeRerank
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger("EmbeddingService")
+
+
+EMBEDDING_MODEL = "text-embedding-v4"
+EMBEDDING_DIMENSIONS = 1024
+EMBEDDING_BATCH_SIZE = 10  # 阿里云单次请求上限
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "8"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+
+
+class EmbeddingError(Exception):
+    """向量生成失败（重试后仍失败）"""
+    pass
+
+
+class EmbeddingEngine:
+    """
+    异步批量向量化引擎
+
+    - 共享 AsyncOpenAI 客户端（按事件循环维护）
+    - 文本按 max_batch_size 分批，最多 concurrency 个批次并发请求
+    - 单个批次失败时指数退避重试，重试耗尽抛出 EmbeddingError
+    - 返回连续的 float32 矩阵 (len(texts), dimensions)
+
+    同步代码使用 embed_sync，请求在引擎自己的后台事件循环中执行，客户端在多次调用间复用。
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        model_name: str = EMBEDDING_MODEL,
+        dimensions: int = EMBEDDING_DIMENSIONS,
+        max_batch_size: int = EMBEDDING_BATCH_SIZE,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES
+    ):
+        self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
+        self.base_url = base_url or os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.max_batch_size = max_batch_size
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+
+        self._lock = threading.Lock()
+        self._per_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]" = weakref.WeakKeyDictionary()
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _loop_resources(self) -> Dict:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            resources = self._per_loop.get(loop)
+            if resources is None:
+                resources = {
+                    "client": AsyncOpenAI(api_key=self.api_key, base_url=self.base_url),
+                    "semaphore": asyncio.Semaphore(self.concurrency),
+                }
+                self._per_loop[loop] = resources
+            return resources
+
+    async def _embed_batch(self, resources: Dict, batch: List[str], batch_index: int) -> np.ndarray:
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with resources["semaphore"]:
+                    completion = await resources["client"].embeddings.create(
+                        model=self.model_name,
+                        input=batch,
+                        dimensions=self.dimensions,
+                        encoding_format="float"
+                    )
+                data = sorted(completion.data, key=lambda item: item.index)
+                break
+            except Exception as e:
+                last_error = e
+                if attempt < self.max_retries:
+                    delay = min(2 ** attempt, 30) + random.uniform(0, 0.5)
+                    logger.warning(f"Embedding batch {batch_index} failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+        else:
+            raise EmbeddingError(f"Embedding batch {batch_index} failed after {self.max_retries + 1} attempts: {last_error}")
+
+        # 返回的向量数或维度不符时直接失败，避免错位写入结果矩阵
+        if len(data) != len(batch):
+            raise EmbeddingError(f"Embedding batch {batch_index} returned {len(data)} vectors for {len(batch)} texts")
+        widths = {len(item.embedding) for item in data}
+        if widths != {self.dimensions}:
+            raise EmbeddingError(
+                f"Embedding batch {batch_index} returned vectors of dimension {sorted(widths)}, expected {self.dimensions}"
+            )
+        return np.asarray([item.embedding for item in data], dtype=np.float32)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        批量生成向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            float32 矩阵，形状 (len(texts), dimensions)
+
+        Raises:
+            EmbeddingError: 缺少 API Key 或某个批次重试后仍失败
+        """
+        if not self.api_key:
+            raise EmbeddingError("缺少 DASHSCOPE_API_KEY 环境变量")
+
+        result = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        if not texts:
+            return result
+
+        resources = self._loop_resources()
+        starts = list(range(0, len(texts), self.max_batch_size))
+        tasks = [
+            asyncio.ensure_future(self._embed_batch(resources, texts[start:start + self.max_batch_size], i))
+            for i, start in enumerate(starts)
+        ]
+
+        try:
+            for start, vectors in zip(starts, await asyncio.gather(*tasks)):
+                result[start:start + len(vectors)] = vectors
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        return result
+
+    def _get_sync_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._sync_loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="embedding-loop", daemon=True)
+                thread.start()
+                self._sync_loop = loop
+            return self._sync_loop
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        """同步接口：在后台事件循环中执行 embed 并等待结果"""
+        future = asyncio.run_coroutine_threadsafe(self.embed(texts), self._get_sync_loop())
+        return future.result()
+
+
+# 按配置缓存的引擎实例
+_embedding_engines: Dict[Tuple, EmbeddingEngine] = {}
+_embedding_engines_lock = threading.Lock()
+
+
+def get_embedding_engine(
+    api_key: str = None,
+    base_url: str = None,
+    model_name: str = EMBEDDING_MODEL,
+    dimensions: int = EMBEDDING_DIMENSIONS,
+    max_batch_size: int = EMBEDDING_BATCH_SIZE
+) -> EmbeddingEngine:
+    """获取向量化引擎实例（相同配置共享同一个实例）"""
+    key = (api_key, base_url, model_name, dimensions, max_batch_size)
+    with _embedding_engines_lock:
+        engine = _embedding_engines.get(key)
+        if engine is None:
+            engine = EmbeddingEngine(
+                api_key=api_key,
+                base_url=base_url,
+                model_name=model_name,
+                dimensions=dimensions,
+                max_batch_size=max_batch_size
+            )
+            _embedding_engines[key] = engine
+        return engine
+
 
 def generate_embedding(
     text: str | List[str],
     api_key: str = None,
     base_url: str = None,
-    model_name: str = "text-embedding-v4",
-    dimensions: int = 1024,
+    model_name: str = EMBEDDING_MODEL,
+    dimensions: int = EMBEDDING_DIMENSIONS,
     encoding_format: str = "float",
-    max_batch_size: int = 10
+    max_batch_size: int = EMBEDDING_BATCH_SIZE
 ) -> Optional[List[float] | List[List[float]]]:
     """
     生成文本的向量嵌入（使用阿里 text-embedding-v4）
 
+    兼容旧接口，内部使用 EmbeddingEngine 并发分批请求；
+    新代码请直接使用 get_embedding_engine().embed / embed_sync 获取 float32 矩阵。
+
     Args:
         text: 单个文本或文本列表
         api_key: API密钥（默认从环境变量获取）
         base_url: API基础URL（默认从环境变量获取）
         model_name: 模型名称
         dimensions: 向量维度（默认1024）
-        encoding_format: 编码格式
+        encoding_format: 编码格式（仅支持 float）
         max_batch_size: 最大批量大小（阿里云限制为10）
 
     Returns:
-        单个文本时返回向量，文本列表时返回向量列表
+        单个文本时返回向量，文本列表时返回向量列表；失败返回 None
     """
-    api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
-    base_url = base_url or os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
-
-    if not api_key:
-        print("错误: 缺少 DASHSCOPE_API_KEY 环境变量")
+    if not isinstance(text, (str, list)):
         return None
 
+    engine = get_embedding_engine(api_key, base_url, model_name, dimensions, max_batch_size)
+
     try:
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        if isinstance(text, str):
+            return engine.embed_sync([text])[0].tolist()
+        return engine.embed_sync(text).tolist()
+    except EmbeddingError as e:
+        print(f"Embedding 请求失败: {e}")
+        return None
     except Exception as e:
-        print(f"初始化 OpenAI 客户端失败: {e}")
+        print(f"Embedding 请求异常: {e}")
         return None
 
-    # 单个文本
-    if isinstance(text, str):
-        try:
-            completion = client.embeddings.create(
-                model=model_name,
-                input=text,
-                dimensions=dimensions,
-                encoding_format=encoding_format
-            )
-            return completion.data[0].embedding
-        except Exception as e:
-            print(f"Embedding 请求失败: {e}")
-            return None
-
-    # 文本列表 - 分批处理
-    if isinstance(text, list):
-        all_embeddings = []
-
-        for i in range(0, len(text), max_batch_size):
-            batch = text[i:i + max_batch_size]
-
-            try:
-                completion = client.embeddings.create(
-                    model=model_name,
-                    input=batch,
-                    dimensions=dimensions,
-                    encoding_format=encoding_format
-                )
-                batch_embeddings = [item.embedding for item in completion.data]
-                all_embeddings.extend(batch_embeddings)
-            except Exception as e:
-                print(f"Embedding 批量请求失败 (batch {i // max_batch_size + 1}): {e}")
-                all_embeddings.extend([None] * len(batch))
-
-        return all_embeddings
-
-    return None
-
 
 def rerank_similarity(
     query: str,
@@ -0,0 +1,476 @@
+"""文档入库任务服务
+
+上传接口只保存文件并创建入库任务后立即返回；解析、切分、向量化、写入 Milvus 在入库 worker 进程中执行，
+不再占用 API 进程的事件循环：
+1. 任务持久化在 ingestion_jobs 表中，worker 用 SELECT ... FOR UPDATE SKIP LOCKED 领取，多个 worker 互不重复
+2. 每个知识库同时执行的任务数不超过 INGESTION_MAX_PER_KB（领取时按知识库加事务级 advisory lock 后计数）
+3. 失败后按指数退避重试，执行次数达到上限后标记为失败
+4. 执行中定期写心跳；心跳超时的任务（worker 已退出）会被重新领取
+5. 进度写入任务表，并通过 Redis pub/sub 推送到 ingestion:events:{kb_id}
+
+启动方式（在 backend/app 目录下）：
+    python -m service.ingestion_service
+默认由 API 进程启动时派生 INGESTION_WORKERS 个本地 worker 进程，未单独部署 worker 时上传的文档也会被处理。
+同一主机上的多个 API 进程（uvicorn --workers N）通过文件锁 INGESTION_LOCK_FILE 协调，只有取得锁的进程派生 worker；
+单独部署 worker 进程时设置 INGESTION_WORKERS=0。
+
+可通过环境变量配置：
+    INGESTION_WORKERS          API 进程启动时派生的 worker 进程数（默认 1，0 表示不派生）
+    INGESTION_LOCK_FILE        同一主机上只允许一个 API 进程派生 worker 的锁文件（默认在临时目录下）
+    INGESTION_CONCURRENCY      每个 worker 进程同时执行的任务数（默认 2）
+    INGESTION_MAX_PER_KB       每个知识库同时执行的任务数（默认 2）
+    INGESTION_MAX_ATTEMPTS     每个任务的最大执行次数（默认 3）
+    INGESTION_RETRY_DELAY      首次重试的延迟，秒，之后每次翻倍（默认 30）
+    INGESTION_STALE_TIMEOUT    心跳超时，秒（默认 600）
+    INGESTION_POLL_INTERVAL    没有可领取任务时的轮询间隔，秒（默认 2）
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import and_, func, or_, text
+from sqlalchemy.orm import Session
+
+from core.database import SessionLocal
+from models.knowledge import Document, IngestionJob
+
+logger = logging.getLogger("IngestionService")
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "1"))
+INGESTION_CONCURRENCY = int(os.getenv("INGESTION_CONCURRENCY", "2"))
+INGESTION_MAX_PER_KB = int(os.getenv("INGESTION_MAX_PER_KB", "2"))
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+INGESTION_RETRY_DELAY = float(os.getenv("INGESTION_RETRY_DELAY", "30"))
+INGESTION_STALE_TIMEOUT = float(os.getenv("INGESTION_STALE_TIMEOUT", "600"))
+INGESTION_POLL_INTERVAL = float(os.getenv("INGESTION_POLL_INTERVAL", "2"))
+INGESTION_LOCK_FILE = os.getenv(
+    "INGESTION_LOCK_FILE", os.path.join(tempfile.gettempdir(), "deepresearch-ingestion-workers.lock")
+)
+
+EVENT_CHANNEL_PREFIX = "ingestion:events:"
+
+# 每次领取时检查的候选任务数
+CLAIM_BATCH = 20
+
+
+def index_name_for(kb_name: str) -> str:
+    """知识库名称对应的 Milvus 集合名"""
+    return f"kb_{kb_name}".lower().replace(" ", "_")
+
+
+def publish_ingestion_event(kb_id: str, event: Dict[str, Any]) -> None:
+    """推送入库进度事件（Redis 不可用时忽略）"""
+    try:
+        from core.redis_client import get_redis_client
+        get_redis_client().publish(
+            f"{EVENT_CHANNEL_PREFIX}{kb_id}",
+            json.dumps(event, ensure_ascii=False, default=str)
+        )
+    except Exception as e:
+        logger.debug(f"Failed to publish ingestion event: {e}")
+
+
+def enqueue_ingestion(db: Session, doc: Document, kb_name: str) -> IngestionJob:
+    """
+    为文档创建入库任务
+
+    Args:
+        db: 数据库会话（由本函数提交）
+        doc: 已保存的文档记录
+        kb_name: 知识库名称
+
+    Returns:
+        入库任务
+    """
+    job = IngestionJob(
+        document_id=doc.id,
+        knowledge_base_id=doc.knowledge_base_id,
+        index_name=index_name_for(kb_name),
+        file_path=doc.file_path,
+        status="queued",
+        max_attempts=INGESTION_MAX_ATTEMPTS,
+        next_run_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    publish_ingestion_event(str(doc.knowledge_base_id), {"type": "queued", "job": job.to_dict()})
+    return job
+
+
+def cancel_queued_ingestion(db: Session, document_id) -> bool:
+    """
+    取消文档尚未开始执行的入库任务（重新上传同名文件时由新任务取代）
+
+    Args:
+        db: 数据库会话（由调用方提交）
+        document_id: 文档ID
+
+    Returns:
+        文档没有执行中的任务时返回 True；有任务正在执行时不做改动并返回 False
+    """
+    jobs = db.query(IngestionJob).filter(
+        IngestionJob.document_id == document_id,
+        IngestionJob.status.in_(("queued", "running")),
+    ).with_for_update().all()
+    if any(job.status == "running" for job in jobs):
+        return False
+    for job in jobs:
+        IngestionWorker._remove_file(job.file_path)
+        db.delete(job)
+    return True
+
+
+def get_ingestion_job(db: Session, document_id) -> Optional[IngestionJob]:
+    """获取文档最近的入库任务"""
+    return db.query(IngestionJob).filter(
+        IngestionJob.document_id == document_id
+    ).order_by(IngestionJob.created_at.desc()).first()
+
+
+class IngestionWorker:
+    """入库任务 worker（在独立进程中运行，任务在线程池中执行）"""
+
+    def __init__(self, concurrency: int = INGESTION_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = threading.Event()
+        self._running: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def stop(self, *args):
+        """停止领取新任务"""
+        if not self._stopping.is_set():
+            logger.info(f"Ingestion worker {self.worker_id} stopping, waiting for {len(self._running)} running jobs")
+            self._stopping.set()
+
+    # ==================== 领取 ====================
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """领取一个可执行的任务，没有时返回 None"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            stale = now - timedelta(seconds=INGESTION_STALE_TIMEOUT)
+            candidates = db.query(IngestionJob).filter(or_(
+                and_(IngestionJob.status == "queued", IngestionJob.next_run_at <= now),
+                and_(IngestionJob.status == "running", IngestionJob.heartbeat_at < stale),
+            )).order_by(IngestionJob.created_at).with_for_update(skip_locked=True).limit(CLAIM_BATCH).all()
+
+            for job in candidates:
+                if job.status == "running" and (job.attempts or 0) >= job.max_attempts:
+                    # worker 在最后一次执行中退出
+                    self._mark_failed(db, job, "入库 worker 异常退出")
+                    continue
+
+                # 同一知识库的领取串行化，保证计数准确
+                locked = db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(hashtext(:key))"),
+                    {"key": f"ingestion:{job.knowledge_base_id}"}
+                ).scalar()
+                if not locked:
+                    continue
+                running = db.query(func.count(IngestionJob.id)).filter(
+                    IngestionJob.knowledge_base_id == job.knowledge_base_id,
+                    IngestionJob.status == "running",
+                    IngestionJob.heartbeat_at >= stale,
+                ).scalar()
+                if running >= INGESTION_MAX_PER_KB:
+                    continue
+
+                doc = db.query(Document).filter(Document.id == job.document_id).first()
+                if doc is None:
+                    db.delete(job)
+                    continue
+
+                job.status = "running"
+                job.worker_id = self.worker_id
+                job.attempts = (job.attempts or 0) + 1
+                job.stage = "starting"
+                job.progress = 0
+                job.started_at = now
+                job.heartbeat_at = now
+                doc.status = "processing"
+                spec = {
+                    "id": str(job.id),
+                    "document_id": str(job.document_id),
+                    "knowledge_base_id": str(job.knowledge_base_id),
+                    "index_name": job.index_name,
+                    "file_path": job.file_path,
+                    "file_name": doc.filename,
+                    "attempts": job.attempts,
+                    "max_attempts": job.max_attempts,
+                }
+                db.commit()
+                return spec
+
+            db.commit()
+            return None
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _mark_failed(self, db: Session, job: IngestionJob, message: str):
+        job.status = "failed"
+        job.error_message = message
+        job.finished_at = datetime.utcnow()
+        doc = db.query(Document).filter(Document.id == job.document_id).first()
+        if doc is not None:
+            doc.status = "failed"
+            doc.error_message = message
+        self._remove_file(job.file_path)
+
+    # ==================== 执行 ====================
+
+    def _update_progress(self, spec: Dict[str, Any], stage: str, percent: int):
+        db = SessionLocal()
+        try:
+            db.query(IngestionJob).filter(IngestionJob.id == spec["id"]).update({
+                "stage": stage,
+                "progress": percent,
+                "heartbeat_at": datetime.utcnow(),
+            }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Failed to update ingestion progress: {e}")
+        finally:
+            db.close()
+        publish_ingestion_event(spec["knowledge_base_id"], {
+            "type": "progress",
+            "job_id": spec["id"],
+            "document_id": spec["document_id"],
+            "stage": stage,
+            "progress": percent,
+        })
+
+    def execute(self, spec: Dict[str, Any]) -> None:
+        """执行入库任务并记录结果"""
+        from service.docmind_service import process_document_with_docmind
+
+        with self._lock:
+            self._running.add(spec["id"])
+        try:
+            try:
+                result = process_document_with_docmind(
+                    file_path=spec["file_path"],
+                    file_name=spec["file_name"],
+                    index_name=spec["index_name"],
+                    doc_id=spec["document_id"],
+                    progress=lambda stage, percent: self._update_progress(spec, stage, percent),
+                )
+            except Exception as e:
+                result = {"success": False, "message": f"处理失败: {e}", "document_count": 0}
+            self._finish(spec, result)
+        except Exception as e:
+            logger.error(f"Failed to record ingestion result for job {spec['id']}: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(spec["id"])
+
+    def _finish(self, spec: Dict[str, Any], result: Dict[str, Any]):
+        db = SessionLocal()
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.id == spec["id"]).first()
+            doc = db.query(Document).filter(Document.id == spec["document_id"]).first()
+            if job is None or doc is None:
+                # 文档在处理期间被删除
+                self._remove_file(spec["file_path"])
+                return
+
+            now = datetime.utcnow()
+            if result.get("success"):
+                job.status = "completed"
+                job.stage = "completed"
+                job.progress = 100
+                job.error_message = None
+                job.finished_at = now
+                doc.status = "completed"
+                doc.chunk_count = result.get("document_count", 0)
+                doc.error_message = None
+                self._remove_file(spec["file_path"])
+            elif job.attempts < job.max_attempts:
+                delay = INGESTION_RETRY_DELAY * (2 ** (job.attempts - 1))
+                job.status = "queued"
+                job.error_message = result.get("message")
+                job.next_run_at = now + timedelta(seconds=delay)
+                doc.status = "pending"
+                doc.error_message = f"第 {job.attempts} 次处理失败，{int(delay)} 秒后重试: {result.get('message')}"
+                logger.warning(f"Ingestion job {spec['id']} failed (attempt {job.attempts}), retry in {delay:.0f}s")
+            else:
+                self._mark_failed(db, job, result.get("message") or "处理失败")
+            db.commit()
+
+            publish_ingestion_event(spec["knowledge_base_id"], {"type": job.status, "job": job.to_dict()})
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _remove_file(file_path: str):
+        try:
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            logger.warning(f"Failed to remove uploaded file {file_path}: {e}")
+
+    # ==================== 心跳 ====================
+
+    def _heartbeat_loop(self):
+        interval = max(5.0, INGESTION_STALE_TIMEOUT / 5)
+        while True:
+            if self._stopping.is_set():
+                time.sleep(interval)
+            else:
+                self._stopping.wait(interval)
+            with self._lock:
+                job_ids: List[str] = list(self._running)
+            if not job_ids:
+                if self._stopping.is_set():
+                    break
+                continue
+
+            db = SessionLocal()
+            try:
+                db.query(IngestionJob).filter(IngestionJob.id.in_(job_ids)).update(
+                    {"heartbeat_at": datetime.utcnow()}, synchronize_session=False
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Failed to write ingestion heartbeat: {e}")
+            finally:
+                db.close()
+
+    # ==================== 主循环 ====================
+
+    def run(self):
+        """主循环：有空闲名额时领取任务"""
+        logger.info(f"Ingestion worker {self.worker_id} started (concurrency={self.concurrency})")
+        threading.Thread(target=self._heartbeat_loop, name="ingestion-heartbeat", daemon=True).start()
+        slots = threading.Semaphore(self.concurrency)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingestion") as executor:
+            while not self._stopping.is_set():
+                if not slots.acquire(timeout=1.0):
+                    continue
+                try:
+                    spec = self.claim()
+                except Exception as e:
+                    logger.warning(f"Failed to claim ingestion job: {e}")
+                    spec = None
+                if spec is None:
+                    slots.release()
+                    self._stopping.wait(INGESTION_POLL_INTERVAL)
+                    continue
+
+                logger.info(f"Worker {self.worker_id} running ingestion job {spec['id']} ({spec['file_name']}, attempt {spec['attempts']})")
+                future = executor.submit(self.execute, spec)
+                future.add_done_callback(lambda _: slots.release())
+
+        logger.info(f"Ingestion worker {self.worker_id} stopped")
+
+
+def run_ingestion_worker(concurrency: int = INGESTION_CONCURRENCY):
+    """worker 进程入口"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    worker = IngestionWorker(concurrency)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, worker.stop)
+    worker.run()
+
+
+# ==================== 本地 worker 进程 ====================
+
+_processes: List[multiprocessing.Process] = []
+_lock_file = None
+
+
+def _acquire_host_lock() -> bool:
+    """
+    取得本主机的 worker 派生锁（非阻塞），锁在进程退出或 stop_ingestion_workers 时释放
+
+    不支持 fcntl 的平台上不加锁，总是返回 True。
+    """
+    global _lock_file
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    handle = open(INGESTION_LOCK_FILE, "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _lock_file = handle
+    return True
+
+
+def start_ingestion_workers(count: int = INGESTION_WORKERS) -> int:
+    """
+    派生本地入库 worker 进程（spawn 方式），返回启动的进程数
+
+    worker 需要再派生文档解析进程，因此不能是 daemon 进程；API 进程退出时由 stop_ingestion_workers 结束。
+    同一主机上已有其他进程派生了 worker 时不再派生。
+    """
+    if count <= 0 or _processes:
+        return 0
+    if not _acquire_host_lock():
+        logger.info(f"Ingestion workers already started by another process on this host ({INGESTION_LOCK_FILE})")
+        return 0
+    context = multiprocessing.get_context("spawn")
+    for index in range(count):
+        process = context.Process(
+            target=run_ingestion_worker,
+            args=(INGESTION_CONCURRENCY,),
+            name=f"ingestion-worker-{index}",
+            daemon=False
+        )
+        process.start()
+        _processes.append(process)
+    logger.info(f"Started {count} ingestion worker processes")
+    return count
+
+
+def stop_ingestion_workers(timeout: float = 30.0):
+    """通知本地入库 worker 进程退出（执行中的任务完成后退出，超时的任务由心跳超时后重新领取）"""
+    global _lock_file
+    for process in _processes:
+        if process.is_alive():
+            process.terminate()
+    for process in _processes:
+        process.join(timeout=timeout)
+        if process.is_alive():
+            logger.warning(f"Ingestion worker {process.name} did not exit in {timeout}s, killing it")
+            process.kill()
+            process.join(timeout=5)
+    _processes.clear()
+    if _lock_file is not None:
+        _lock_file.close()
+        _lock_file = None
+
+
+if __name__ == "__main__":
+    # 以 python -m service.ingestion_service 启动时，确保 backend/app 在导入路径中
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    run_ingestion_worker()
@@ -0,0 +1,355 @@
+"""本地文档解析服务
+
+不依赖远程 DocMind 任务接口，在本地进程池中解析文档：
+1. PDF（pypdf）按页分段，各段在不同进程中并行提取，结果按页序产出
+2. Word（python-docx）按段落和表格提取，表格转为 Markdown
+3. Excel（openpyxl，只读模式）按工作表提取，每个工作表转为 Markdown 表格
+4. 纯文本类文件直接读取
+
+LocalExtractionService 提供与 DocMindService 相同的 submit_job / wait_for_completion /
+iter_layout_texts / collect_all_results 接口，入库流水线可直接替换使用；
+extract_text 供聊天附件等只需要全文的场景调用。
+
+可通过环境变量配置：
+    DOCUMENT_PARSER               知识库文档解析方式：docmind / local / auto（默认 auto：
+                                  配置了 DOCMIND_ACCESS_KEY_ID 时使用 DocMind，否则本地解析）
+    LOCAL_EXTRACTION_WORKERS      解析进程数（默认 min(4, CPU 数)，0 表示在当前进程中解析）
+    LOCAL_EXTRACTION_PAGE_BATCH   PDF 每个解析任务的页数（默认 8）
+"""
+import os
+import uuid
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("LocalExtraction")
+
+DOCUMENT_PARSER = os.getenv("DOCUMENT_PARSER", "auto").lower()
+LOCAL_EXTRACTION_WORKERS = int(os.getenv("LOCAL_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+LOCAL_EXTRACTION_PAGE_BATCH = int(os.getenv("LOCAL_EXTRACTION_PAGE_BATCH", "8"))
+
+# 文档解析库（可选依赖）
+try:
+    from pypdf import PdfReader
+    PDF_AVAILABLE = True
+except ImportError:
+    try:
+        from PyPDF2 import PdfReader
+        PDF_AVAILABLE = True
+    except ImportError:
+        PDF_AVAILABLE = False
+
+try:
+    import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    DOCX_AVAILABLE = True
+except ImportError:
+    DOCX_AVAILABLE = False
+
+try:
+    import openpyxl
+    XLSX_AVAILABLE = True
+except ImportError:
+    XLSX_AVAILABLE = False
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.py', '.js', '.ts', '.json', '.yaml', '.yml', '.xml', '.csv', '.html'}
+
+# Excel 每个工作表最多提取的行数
+MAX_SHEET_ROWS = 5000
+
+
+class ExtractionError(Exception):
+    """文档无法在本地解析"""
+
+
+def file_extension(file_name: str) -> str:
+    return os.path.splitext(file_name)[1].lower()
+
+
+def supports(file_name: str) -> bool:
+    """本地是否可以解析该类型的文件"""
+    ext = file_extension(file_name)
+    if ext == '.pdf':
+        return PDF_AVAILABLE
+    if ext == '.docx':
+        return DOCX_AVAILABLE
+    if ext == '.xlsx':
+        return XLSX_AVAILABLE
+    return ext in TEXT_EXTENSIONS
+
+
+def use_local_parser(file_name: str) -> bool:
+    """知识库入库是否使用本地解析（由 DOCUMENT_PARSER 决定）"""
+    if DOCUMENT_PARSER == "docmind":
+        return False
+    if DOCUMENT_PARSER == "local":
+        return True
+    return not os.getenv("DOCMIND_ACCESS_KEY_ID") and supports(file_name)
+
+
+# ==================== 解析（在解析进程中运行） ====================
+
+def _markdown_table(rows: List[List[str]]) -> str:
+    """二维表格转为 Markdown，第一行作为表头"""
+    rows = [row for row in rows if any(cell for cell in row)]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+
+    def line(row: List[str]) -> str:
+        cells = [cell.replace("|", "\\|").replace("\n", " ") for cell in row]
+        cells += [""] * (width - len(cells))
+        return "| " + " | ".join(cells) + " |"
+
+    lines = [line(rows[0]), "| " + " | ".join(["---"] * width) + " |"]
+    lines.extend(line(row) for row in rows[1:])
+    return "\n".join(lines)
+
+
+def _pdf_page_count(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """提取 PDF 第 start ~ end-1 页的文本（每页一个元素）"""
+    reader = PdfReader(file_path)
+    texts = []
+    for index in range(start, min(end, len(reader.pages))):
+        try:
+            texts.append(reader.pages[index].extract_text() or "")
+        except Exception as e:
+            # 单页解析失败不影响其他页
+            logger.warning(f"Failed to extract page {index + 1} of {file_path}: {e}")
+            texts.append("")
+    return texts
+
+
+def _extract_docx(file_path: str) -> List[str]:
+    """按文档顺序提取段落和表格（每个段落 / 表格一个元素）"""
+    document = docx.Document(file_path)
+    blocks = []
+    for element in document.element.body.iterchildren():
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'p':
+            text = Paragraph(element, document).text.strip()
+            if text:
+                blocks.append(text)
+        elif tag == 'tbl':
+            table = Table(element, document)
+            rows = [[cell.text.strip() for cell in row.cells] for row in table.rows]
+            text = _markdown_table(rows)
+            if text:
+                blocks.append(text)
+    return blocks
+
+
+def _extract_xlsx(file_path: str) -> List[str]:
+    """每个工作表提取为一个 Markdown 表格"""
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    blocks = []
+    try:
+        for sheet in workbook.worksheets:
+            rows = []
+            for row in sheet.iter_rows(values_only=True):
+                rows.append(["" if value is None else str(value) for value in row])
+                if len(rows) >= MAX_SHEET_ROWS:
+                    break
+            table = _markdown_table(rows)
+            if table:
+                blocks.append(f"## {sheet.title}\n\n{table}")
+    finally:
+        workbook.close()
+    return blocks
+
+
+def _extract_plain(file_path: str) -> List[str]:
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return [f.read()]
+
+
+# ==================== 进程池 ====================
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    """
+    获取解析进程池（spawn 方式启动，避免 fork 多线程服务进程）
+
+    daemon 进程不能派生子进程，在 daemon 进程中调用时返回 None，改为在当前进程中解析。
+    """
+    global _executor
+    if LOCAL_EXTRACTION_WORKERS <= 0 or multiprocessing.current_process().daemon:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=LOCAL_EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Local extraction pool started with {LOCAL_EXTRACTION_WORKERS} workers")
+        return _executor
+
+
+def _reset_executor(broken: ProcessPoolExecutor):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_extraction_pool():
+    """关闭解析进程池"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _plan(file_path: str, file_name: str, page_batch: int) -> List[Tuple[Callable[..., List[str]], tuple]]:
+    """把文档拆成可并行执行的解析任务（按顺序拼接结果即为全文）"""
+    ext = file_extension(file_name)
+    if ext == '.pdf' and PDF_AVAILABLE:
+        pages = _pdf_page_count(file_path)
+        return [
+            (_extract_pdf_pages, (file_path, start, start + page_batch))
+            for start in range(0, pages, page_batch)
+        ]
+    if ext == '.docx' and DOCX_AVAILABLE:
+        return [(_extract_docx, (file_path,))]
+    if ext == '.xlsx' and XLSX_AVAILABLE:
+        return [(_extract_xlsx, (file_path,))]
+    if ext in TEXT_EXTENSIONS:
+        return [(_extract_plain, (file_path,))]
+    raise ExtractionError(f"不支持本地解析的文件类型: {ext or file_name}")
+
+
+def iter_blocks(
+    file_path: str,
+    file_name: Optional[str] = None,
+    page_batch: int = LOCAL_EXTRACTION_PAGE_BATCH
+) -> Iterator[str]:
+    """
+    解析文档，按顺序逐块产出文本（PDF 每页一块）
+
+    解析任务（包括只有一个任务的小文档）在进程池中并行执行，不占用调用进程的 GIL；
+    同时最多提交 2 × 进程数 个任务，消费方处理不过来时不再提交新任务，内存占用与文档大小无关。
+    没有进程池时（LOCAL_EXTRACTION_WORKERS=0 或在 daemon 进程中）在当前线程中解析。
+
+    Args:
+        file_path: 文件路径
+        file_name: 原始文件名（用于判断类型，默认取 file_path）
+        page_batch: PDF 每个解析任务的页数
+
+    Yields:
+        文本块
+    """
+    tasks = _plan(file_path, file_name or file_path, max(1, page_batch))
+    executor = _get_executor()
+    if executor is None:
+        for func, args in tasks:
+            yield from func(*args)
+        return
+
+    window = max(2, LOCAL_EXTRACTION_WORKERS * 2)
+    pending: Deque[Future] = deque()
+    remaining = iter(tasks)
+    try:
+        while True:
+            while len(pending) < window:
+                task = next(remaining, None)
+                if task is None:
+                    break
+                func, args = task
+                pending.append(executor.submit(func, *args))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        logger.error("Local extraction pool is broken, restarting")
+        _reset_executor(executor)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def extract_text(file_path: str, file_name: Optional[str] = None) -> str:
+    """
+    解析文档全文
+
+    Args:
+        file_path: 文件路径
+        file_name: 原始文件名（用于判断类型，默认取 file_path）
+
+    Returns:
+        文本内容（块之间以换行分隔）
+    """
+    return "".join(block + "\n" for block in iter_blocks(file_path, file_name) if block)
+
+
+class LocalExtractionService:
+    """本地文档解析服务（接口与 DocMindService 一致）"""
+
+    def __init__(self, page_batch: int = LOCAL_EXTRACTION_PAGE_BATCH):
+        self.page_batch = page_batch
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def submit_job(self, file_path: str, file_name: str) -> Optional[str]:
+        """
+        登记解析任务（解析在拉取结果时进行）
+
+        Args:
+            file_path: 文件路径
+            file_name: 文件名
+
+        Returns:
+            任务 ID，文件不存在或类型不支持时返回 None
+        """
+        if not os.path.exists(file_path) or not supports(file_name):
+            print(f"本地解析不支持该文件: {file_name}")
+            return None
+        task_id = uuid.uuid4().hex
+        self._jobs[task_id] = {"file_path": file_path, "file_name": file_name}
+        return task_id
+
+    def wait_for_completion(self, task_id: str, poll_interval: int = 5, max_wait: int = 300) -> bool:
+        """本地解析无需等待远程任务"""
+        return task_id in self._jobs
+
+    def iter_layout_texts(self, task_id: str, layout_step_size: int = 10) -> Iterator[str]:
+        """
+        按顺序产出解析文本
+
+        Args:
+            task_id: 任务ID
+            layout_step_size: 与 DocMindService 保持一致，不使用
+
+        Yields:
+            文本块（以换行结尾）
+        """
+        job = self._jobs.pop(task_id)
+        for block in iter_blocks(job["file_path"], job["file_name"], self.page_batch):
+            if block:
+                yield block + "\n"
+
+    def collect_all_results(self, task_id: str, layout_step_size: int = 10) -> str:
+        """
+        收集所有解析结果
+
+        Args:
+            task_id: 任务ID
+            layout_step_size: 与 DocMindService 保持一致，不使用
+
+        Returns:
+            完整的文本内容
+        """
+        return "".join(self.iter_layout_texts(task_id, layout_step_size))
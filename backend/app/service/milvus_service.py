@@ -1,6 +1,7 @@
 """Milvus 向量存储服务"""
 import os
-from typing import List, Dict, Any, Optional
+import json
+from typing import List, Dict, Any, Optional, Iterable
 from pymilvus import (
     connections,
     Collection,
@@ -10,6 +11,11 @@ from pymilvus import (
     utility,
 )
 
+# 按文档查询切片 ID 时每批返回的行数
+QUERY_BATCH_SIZE = 1000
+# 按 ID 删除时每个表达式包含的 ID 数
+DELETE_BATCH_SIZE = 1000
+
 
 class MilvusService:
     """Milvus 向量存储服务"""
@@ -82,6 +88,7 @@ class MilvusService:
         self,
         collection_name: str,
         documents: List[Dict[str, Any]],
+        flush: bool = True,
     ) -> int:
         """
         插入文档
@@ -96,6 +103,7 @@ class MilvusService:
                 - content: 文本内容
                 - chunk_index: 切片索引
                 - vector: 向量
+            flush: 插入后是否立即 flush（分批插入时可在最后调用一次 flush）
 
         Returns:
             插入的文档数量
@@ -114,7 +122,8 @@ class MilvusService:
         # 插入数据
         data = [ids, doc_ids, kb_ids, filenames, contents, chunk_indices, vectors]
         collection.insert(data)
-        collection.flush()
+        if flush:
+            collection.flush()
 
         print(f"成功插入 {len(documents)} 条文档到 {collection_name}")
         return len(documents)
@@ -179,6 +188,107 @@ class MilvusService:
 
         return formatted_results
 
+    def flush(self, collection_name: str) -> None:
+        """
+        将已插入的数据持久化（封存增长段）
+
+        Args:
+            collection_name: 集合名称
+        """
+        if utility.has_collection(collection_name):
+            Collection(collection_name).flush()
+
+    def query_chunk_indices(self, collection_name: str, doc_id: str) -> Dict[str, int]:
+        """
+        查询文档已写入的所有切片 ID 及其切片索引
+
+        Args:
+            collection_name: 集合名称
+            doc_id: 文档ID
+
+        Returns:
+            切片 ID → 切片索引
+        """
+        if not utility.has_collection(collection_name):
+            return {}
+
+        collection = Collection(collection_name)
+        collection.load()
+        iterator = collection.query_iterator(
+            batch_size=QUERY_BATCH_SIZE,
+            expr=f'doc_id == "{doc_id}"',
+            output_fields=["id", "chunk_index"],
+        )
+        indices = {}
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                indices.update((row["id"], row["chunk_index"]) for row in rows)
+        finally:
+            iterator.close()
+        return indices
+
+    def update_chunk_indices(self, collection_name: str, indices: Dict[str, int]) -> int:
+        """
+        更新已有切片的切片索引（读出整行后 upsert，向量不重新计算）
+
+        Args:
+            collection_name: 集合名称
+            indices: 切片 ID → 新的切片索引
+
+        Returns:
+            更新的切片数量
+        """
+        if not indices or not utility.has_collection(collection_name):
+            return 0
+
+        collection = Collection(collection_name)
+        collection.load()
+        ids = list(indices)
+        updated = 0
+        for start in range(0, len(ids), QUERY_BATCH_SIZE):
+            rows = collection.query(
+                expr=f"id in {json.dumps(ids[start:start + QUERY_BATCH_SIZE])}",
+                output_fields=["id", "doc_id", "kb_id", "filename", "content", "vector"],
+            )
+            if not rows:
+                continue
+            collection.upsert([
+                [row["id"] for row in rows],
+                [row["doc_id"] for row in rows],
+                [row["kb_id"] for row in rows],
+                [row["filename"] for row in rows],
+                [row["content"] for row in rows],
+                [indices[row["id"]] for row in rows],
+                [row["vector"] for row in rows],
+            ])
+            updated += len(rows)
+        return updated
+
+    def delete_by_ids(self, collection_name: str, ids: Iterable[str]) -> int:
+        """
+        按切片 ID 批量删除
+
+        Args:
+            collection_name: 集合名称
+            ids: 切片 ID
+
+        Returns:
+            删除的切片数量
+        """
+        ids = list(ids)
+        if not ids or not utility.has_collection(collection_name):
+            return 0
+
+        collection = Collection(collection_name)
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            collection.delete(f"id in {json.dumps(batch)}")
+        print(f"已从 {collection_name} 删除 {len(ids)} 个切片")
+        return len(ids)
+
     def delete_by_doc_id(self, collection_name: str, doc_id: str) -> bool:
         """
         根据文档ID删除所有相关切片
@@ -0,0 +1,171 @@
+"""
+MinHash 近似去重
+
+基于字符 n-gram（对中文有效，不依赖空格分词）的 MinHash 签名，
+配合 LSH 分桶在近似常数时间内找出相似文本的候选集合（LSHIndex），
+或用签名矩阵一次向量化比较全部已有文本（NearDuplicateIndex）。
+"""
+
+import re
+import zlib
+import unicodedata
+from typing import Dict, Hashable, List, Optional, Set
+
+import numpy as np
+
+# 大于 2^32 的素数；x 为 32 位哈希，a、b 取自 [0, 2^31)，a * x + b < 2^63 + 2^31，在 uint64 内不会溢出
+_MERSENNE_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_text(text: str) -> str:
+    """归一化：全半角统一、小写、去掉空白和标点"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return _NON_WORD_RE.sub("", text)
+
+
+def extract_numbers(text: str) -> Set[str]:
+    """提取文本中的数字（用于区分数值不同的事实）"""
+    return set(_NUMBER_RE.findall(unicodedata.normalize("NFKC", text or "")))
+
+
+def shingle_hashes(text: str, ngram: int = 3) -> np.ndarray:
+    """字符 n-gram 的 crc32 哈希集合"""
+    normalized = normalize_text(text)
+    if not normalized:
+        return np.empty(0, dtype=np.uint64)
+    if len(normalized) <= ngram:
+        grams = [normalized]
+    else:
+        grams = [normalized[i:i + ngram] for i in range(len(normalized) - ngram + 1)]
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    return np.unique(hashes)
+
+
+class MinHasher:
+    """MinHash 签名生成器"""
+
+    def __init__(self, num_perm: int = 128, ngram: int = 3, seed: int = 42):
+        self.num_perm = num_perm
+        self.ngram = ngram
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2 ** 31, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """计算文本的 MinHash 签名（uint32 数组，长度 num_perm）"""
+        hashes = shingle_hashes(text, self.ngram)
+        if hashes.size == 0:
+            return np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32)
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return (permuted & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def jaccard(sig1: np.ndarray, sig2: np.ndarray) -> float:
+        """由签名估计 Jaccard 相似度"""
+        return float(np.count_nonzero(sig1 == sig2)) / len(sig1)
+
+
+class LSHIndex:
+    """
+    MinHash LSH 分桶索引
+
+    签名分成 bands 段，每段 rows 个值，任意一段完全相同即成为候选；
+    候选再用签名估计的 Jaccard 相似度过滤。
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[Hashable]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def insert(self, key: Hashable, signature: np.ndarray):
+        """加入索引"""
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def candidates(self, signature: np.ndarray) -> Set[Hashable]:
+        """返回与签名至少一段相同的条目"""
+        result: Set[Hashable] = set()
+        for band, band_key in self._band_keys(signature):
+            result.update(self._buckets[band].get(band_key, ()))
+        return result
+
+    def query(self, signature: np.ndarray, threshold: float) -> List[tuple]:
+        """返回相似度不低于阈值的 (key, 相似度)，按相似度降序"""
+        matches = []
+        for key in self.candidates(signature):
+            score = MinHasher.jaccard(signature, self._signatures[key])
+            if score >= threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches
+
+    def get_signature(self, key: Hashable) -> Optional[np.ndarray]:
+        return self._signatures.get(key)
+
+
+class NearDuplicateIndex:
+    """
+    增量近似去重索引
+
+    所有已加入文本的签名存放在一个按需扩容的 NumPy 矩阵中，
+    新文本与全部已有文本的 Jaccard 估计在一次向量化比较中完成，
+    无需对已有内容重新分词。
+    """
+
+    def __init__(self, num_perm: int = 128, ngram: int = 3, initial_capacity: int = 256):
+        self._hasher = MinHasher(num_perm=num_perm, ngram=ngram)
+        self._matrix = np.empty((initial_capacity, num_perm), dtype=np.uint32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def max_similarity(self, text: str) -> float:
+        """与已有文本的最大估计 Jaccard 相似度"""
+        return self._max_similarity(self._hasher.signature(text))
+
+    def _max_similarity(self, signature: np.ndarray) -> float:
+        if self._size == 0:
+            return 0.0
+        matches = np.count_nonzero(self._matrix[:self._size] == signature, axis=1)
+        return float(matches.max()) / self._hasher.num_perm
+
+    def add(self, text: str) -> None:
+        """加入文本"""
+        self._append(self._hasher.signature(text))
+
+    def _append(self, signature: np.ndarray):
+        if self._size == self._matrix.shape[0]:
+            grown = np.empty((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype=np.uint32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size] = signature
+        self._size += 1
+
+    def is_duplicate(self, text: str, threshold: float) -> bool:
+        """是否与已有文本重复（不加入索引）"""
+        return self.max_similarity(text) >= threshold
+
+    def add_if_new(self, text: str, threshold: float) -> bool:
+        """不重复时加入索引并返回 True，重复时返回 False"""
+        signature = self._hasher.signature(text)
+        if self._max_similarity(signature) >= threshold:
+            return False
+        self._append(signature)
+        return True
@@ -0,0 +1,231 @@
+"""
+搜索结果缓存
+
+两级缓存：
+1. 进程内 LRU（有容量上限和 TTL，命中时无网络开销）
+2. Redis（复用 core/redis_client 的连接池，跨会话、跨 worker 进程共享）
+
+查询先做归一化（NFKC、小写、合并空白）再计算缓存键，
+不同结果格式的调用方使用不同的 namespace，互不干扰。
+命中、未命中和淘汰计数可通过 GET /research/cache/stats 查看（按进程统计，研究 worker 在每个任务结束时记录日志）。
+
+可通过环境变量配置：
+    SEARCH_CACHE_TTL          缓存有效期，秒（默认 3600）
+    SEARCH_CACHE_MAX_ENTRIES  进程内 LRU 容量（默认 1024）
+    SEARCH_CACHE_REDIS        是否启用 Redis 层（默认 1）
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger("SearchCache")
+
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+SEARCH_CACHE_REDIS = os.getenv("SEARCH_CACHE_REDIS", "1").lower() not in ("0", "false", "no")
+
+# Redis 出错后暂停使用 Redis 层的时间（秒），避免每次查询都等待连接失败
+REDIS_RETRY_INTERVAL = 30
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """归一化查询：全半角统一、小写、合并空白"""
+    query = unicodedata.normalize("NFKC", query or "")
+    return _WHITESPACE_RE.sub(" ", query).strip().casefold()
+
+
+class SearchCache:
+    """带进程内 LRU 前置层的 Redis 搜索缓存"""
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: int = SEARCH_CACHE_TTL,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        use_redis: bool = SEARCH_CACHE_REDIS
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.use_redis = use_redis
+
+        self._local: "OrderedDict[str, Tuple[List, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_disabled_until = 0.0
+
+        self._stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "redis_errors": 0}
+
+    # ==================== 键 ====================
+
+    def make_key(self, query: str, **params) -> str:
+        """生成缓存键，params（如 count）参与计算"""
+        raw = normalize_query(query)
+        if params:
+            raw += "|" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+        digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+        return f"search:{self.namespace}:{digest}"
+
+    # ==================== Redis 层 ====================
+
+    def _get_redis(self):
+        if not self.use_redis or time.monotonic() < self._redis_disabled_until:
+            return None
+        if self._redis is None:
+            try:
+                try:
+                    from core.redis_client import get_redis_client
+                except ImportError:
+                    from app.core.redis_client import get_redis_client
+                self._redis = get_redis_client()
+            except Exception as e:
+                logger.warning(f"Redis unavailable for search cache: {e}")
+                self._mark_redis_error()
+                return None
+        return self._redis
+
+    def _mark_redis_error(self):
+        with self._lock:
+            self._stats["redis_errors"] += 1
+        self._redis_disabled_until = time.monotonic() + REDIS_RETRY_INTERVAL
+
+    def _redis_get(self, key: str) -> Optional[List]:
+        client = self._get_redis()
+        if client is None:
+            return None
+        try:
+            value = client.get(key)
+            return json.loads(value) if value else None
+        except Exception as e:
+            logger.warning(f"Search cache redis get error: {e}")
+            self._mark_redis_error()
+            return None
+
+    def _redis_set(self, key: str, results: List):
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            client.setex(key, self.ttl, json.dumps(results, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"Search cache redis set error: {e}")
+            self._mark_redis_error()
+
+    # ==================== 进程内 LRU ====================
+
+    def _local_get(self, key: str) -> Optional[List]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            results, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return results
+
+    def _local_set(self, key: str, results: List, ttl: Optional[float] = None):
+        with self._lock:
+            self._local[key] = (results, time.monotonic() + (ttl if ttl is not None else self.ttl))
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    # ==================== 接口 ====================
+
+    def get(self, query: str, **params) -> Optional[List]:
+        """获取缓存的搜索结果，未命中返回 None"""
+        key = self.make_key(query, **params)
+
+        results = self._local_get(key)
+        if results is not None:
+            with self._lock:
+                self._stats["local_hits"] += 1
+            logger.debug(f"[{self.namespace}] local cache hit: {query[:50]}")
+            return results
+
+        results = self._redis_get(key)
+        if results is not None:
+            with self._lock:
+                self._stats["redis_hits"] += 1
+            logger.info(f"[{self.namespace}] redis cache hit: {query[:50]}")
+            self._local_set(key, results)
+            return results
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, query: str, results: List, **params):
+        """缓存搜索结果（空结果不缓存，避免把服务商的临时故障缓存下来）"""
+        if not results:
+            return
+        key = self.make_key(query, **params)
+        self._local_set(key, results)
+        self._redis_set(key, results)
+        with self._lock:
+            self._stats["sets"] += 1
+
+    async def aget(self, query: str, **params) -> Optional[List]:
+        """异步获取，Redis 访问放到线程中执行"""
+        key = self.make_key(query, **params)
+        if self._local_get(key) is None and self._get_redis() is not None:
+            return await asyncio.to_thread(self.get, query, **params)
+        return self.get(query, **params)
+
+    async def aset(self, query: str, results: List, **params):
+        """异步写入，Redis 访问放到线程中执行"""
+        if self._get_redis() is not None:
+            await asyncio.to_thread(self.set, query, results, **params)
+        else:
+            self.set(query, results, **params)
+
+    def clear_local(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["local_entries"] = len(self._local)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["local_hits"] + stats["redis_hits"]) / lookups, 4) if lookups else 0.0
+        stats["namespace"] = self.namespace
+        return stats
+
+
+# 按 namespace 的单例
+_search_caches: Dict[str, SearchCache] = {}
+_search_caches_lock = threading.Lock()
+
+
+def get_search_cache(namespace: str) -> SearchCache:
+    """获取指定 namespace 的搜索缓存实例"""
+    with _search_caches_lock:
+        search_cache = _search_caches.get(namespace)
+        if search_cache is None:
+            search_cache = SearchCache(namespace)
+            _search_caches[namespace] = search_cache
+        return search_cache
+
+
+def get_search_cache_stats() -> List[Dict[str, Any]]:
+    """获取所有搜索缓存的统计信息"""
+    with _search_caches_lock:
+        caches = list(_search_caches.values())
+    return [c.stats() for c in caches]
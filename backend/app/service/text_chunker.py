@@ -0,0 +1,213 @@
+"""文本切分服务
+
+按句子和 token 预算切分文档，供知识库入库使用：
+1. 单遍分句：一个正则按中英文句末标点（。！？；.!?; 及换行）扫描，每个字符只处理一次
+2. 按 token 预算打包：句子依次放入当前切片，超出预算时输出；重叠部分按整句保留，不重新扫描原文
+3. 版面感知：Markdown 标题开始新的切片（不与上一节内容混在一起）；表格整体放入切片，
+   超出预算时按行拆分并在每段重复表头；超长句子按预算硬切
+4. 流式：输入为布局块（DocMind 布局或本地解析的页）迭代器，边读边输出
+
+token 数优先使用 tiktoken（cl100k_base）计算，编码表无法加载时按中日韩字符 1 个 token、其他字符 4 个 1 个 token 估算。
+
+可通过环境变量配置：
+    CHUNK_MAX_TOKENS       每个切片的 token 上限（默认 500）
+    CHUNK_OVERLAP_TOKENS   相邻切片的重叠 token 数（默认 50）
+"""
+import os
+import re
+import logging
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("TextChunker")
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "500"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+
+# 句子：到句末标点（连同其后的引号、括号和空白）、后跟空白的英文句点、或换行为止；
+# 后面紧跟非空白字符的句点（小数、缩写、网址）不断句
+_SENTENCE_RE = re.compile(
+    r'(?:[^。！？!?；;.\n]|\.(?=\S))*(?:[。！？!?；;]+[”’"\'）)】」]*[ \t]*|\.+\s*|\n+|$)'
+)
+_HEADING_RE = re.compile(r'^\s{0,3}#{1,6}\s')
+_TABLE_RE = re.compile(r'^\s*\|')
+
+# 切片单元类型
+TEXT, HEADING, TABLE = "text", "heading", "table"
+
+Unit = Tuple[str, int, str]  # (文本, token 数, 类型)
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 数：中日韩字符按 1 个，其余字符按 4 个 1 个
+
+    中日韩字符的 UTF-8 编码为 3 字节、ASCII 为 1 字节，由字节数和字符数即可算出中日韩字符数，无需逐字符判断。
+    """
+    chars = len(text)
+    cjk = (len(text.encode("utf-8")) - chars) // 2
+    return cjk + (chars - cjk + 3) // 4
+
+
+_token_counter: Optional[Callable[[str], int]] = None
+
+
+def get_token_counter() -> Callable[[str], int]:
+    """获取 token 计数函数（tiktoken 编码表无法加载时使用估算）"""
+    global _token_counter
+    if _token_counter is None:
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding("cl100k_base")
+            _token_counter = lambda text: len(encoding.encode_ordinary(text))
+        except Exception as e:
+            logger.info(f"tiktoken unavailable ({e}), using token estimation")
+            _token_counter = estimate_tokens
+    return _token_counter
+
+
+def split_sentences(text: str) -> List[str]:
+    """单遍分句（保留原文中的标点和空白，拼接后与原文相同）"""
+    return [sentence for sentence in _SENTENCE_RE.findall(text) if sentence]
+
+
+class TextChunker:
+    """按句子和 token 预算切分文本"""
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        self.max_tokens = max(1, max_tokens)
+        # 重叠不超过预算的一半，保证每个切片都有新内容
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.count_tokens = count_tokens or get_token_counter()
+
+    # ==================== 切分单元 ====================
+
+    def _units(self, block: str) -> Iterator[Unit]:
+        """把一个布局块拆成切分单元：标题行、表格、句子"""
+        table: List[str] = []
+
+        for line in block.splitlines(keepends=True):
+            if _TABLE_RE.match(line):
+                table.append(line)
+                continue
+            if table:
+                yield from self._table_units(table)
+                table = []
+            if _HEADING_RE.match(line):
+                yield line, self.count_tokens(line), HEADING
+            else:
+                # 换行本身是句子边界，逐行分句即可
+                for sentence in split_sentences(line):
+                    yield from self._fit(sentence, TEXT)
+
+        if table:
+            yield from self._table_units(table)
+
+    def _fit(self, text: str, kind: str) -> Iterator[Unit]:
+        """超出预算的单元按字符比例硬切"""
+        tokens = self.count_tokens(text)
+        if tokens <= self.max_tokens:
+            yield text, tokens, kind
+            return
+        size = max(1, len(text) * self.max_tokens // tokens)
+        for start in range(0, len(text), size):
+            piece = text[start:start + size]
+            yield piece, self.count_tokens(piece), kind
+
+    def _table_units(self, lines: List[str]) -> Iterator[Unit]:
+        """表格整体作为一个单元；超出预算时按行拆分，每段重复表头"""
+        table = "".join(lines)
+        tokens = self.count_tokens(table)
+        if tokens <= self.max_tokens:
+            yield table, tokens, TABLE
+            return
+
+        # 表头及分隔行
+        header_size = 2 if len(lines) > 1 and set(lines[1].strip()) <= set("|-: ") else 1
+        header = "".join(lines[:header_size])
+        header_tokens = self.count_tokens(header)
+        rows: List[str] = []
+        row_tokens = header_tokens
+        for line in lines[header_size:]:
+            line_tokens = self.count_tokens(line)
+            if rows and row_tokens + line_tokens > self.max_tokens:
+                yield header + "".join(rows), row_tokens, TABLE
+                rows, row_tokens = [], header_tokens
+            rows.append(line)
+            row_tokens += line_tokens
+        if rows or header_size == len(lines):
+            yield from self._fit(header + "".join(rows), TABLE)
+
+    # ==================== 打包 ====================
+
+    def chunk_blocks(self, blocks: Iterable[str]) -> Iterator[str]:
+        """
+        流式切分布局块
+
+        Args:
+            blocks: 布局块文本（如 DocMind 布局、本地解析的页）
+
+        Yields:
+            切片文本
+        """
+        current: List[Unit] = []
+        current_tokens = 0
+        carried = 0  # current 开头从上一切片带过来的重叠单元数
+
+        def emit() -> Optional[str]:
+            chunk = "".join(text for text, _, _ in current).strip()
+            return chunk or None
+
+        for block in blocks:
+            for unit in self._units(block):
+                text, tokens, kind = unit
+
+                if kind == HEADING:
+                    # 标题开始新的一节，不带重叠
+                    if len(current) > carried:
+                        chunk = emit()
+                        if chunk:
+                            yield chunk
+                    current, current_tokens, carried = [], 0, 0
+
+                if current_tokens + tokens > self.max_tokens:
+                    if len(current) > carried:
+                        chunk = emit()
+                        if chunk:
+                            yield chunk
+                        current, current_tokens = self._overlap(current)
+                    else:
+                        # 只有重叠内容时直接丢弃，不输出重复切片
+                        current, current_tokens = [], 0
+                    carried = len(current)
+                    if current_tokens + tokens > self.max_tokens:
+                        current, current_tokens, carried = [], 0, 0
+
+                current.append(unit)
+                current_tokens += tokens
+
+        if len(current) > carried:
+            chunk = emit()
+            if chunk:
+                yield chunk
+
+    def _overlap(self, units: List[Unit]) -> Tuple[List[Unit], int]:
+        """取末尾不超过重叠预算的整句作为下一切片的开头（标题和表格不重叠）"""
+        tail: List[Unit] = []
+        tokens = 0
+        for unit in reversed(units):
+            if unit[2] != TEXT or tokens + unit[1] > self.overlap_tokens:
+                break
+            tail.append(unit)
+            tokens += unit[1]
+        tail.reverse()
+        return tail, tokens
+
+    def chunk(self, text: str) -> List[str]:
+        """切分一段文本"""
+        if not text:
+            return []
+        return list(self.chunk_blocks([text]))
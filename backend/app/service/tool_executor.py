@@ -12,51 +12,17 @@ Tool Executor - 工具执行器
 import json
 import logging
 import asyncio
-import hashlib
-import time
 import re
-from typing import Dict, Any, List, Optional, Callable, Tuple
+from typing import Dict, Any, List, Optional, Callable
 from collections import Counter
 import requests
 from openai import OpenAI
 
 from .react_controller import ReActContext, ToolType, Tool
+from .search_cache import get_search_cache
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- 缓存配置 ---
-SEARCH_CACHE_TTL = 3600  # 搜索缓存过期时间(秒)
-_search_cache: Dict[str, Tuple[List, float]] = {}
-
-
-def get_query_hash(query: str) -> str:
-    """生成查询的哈希值用于缓存"""
-    return hashlib.md5(query.strip().lower().encode()).hexdigest()
-
-
-def get_cached_search(query: str) -> Optional[List]:
-    """获取缓存的搜索结果"""
-    query_hash = get_query_hash(query)
-    if query_hash in _search_cache:
-        results, timestamp = _search_cache[query_hash]
-        if time.time() - timestamp < SEARCH_CACHE_TTL:
-            logging.info(f"Cache hit for query: {query[:50]}...")
-            return results
-        else:
-            del _search_cache[query_hash]
-    return None
-
-
-def set_cached_search(query: str, results: List):
-    """缓存搜索结果"""
-    query_hash = get_query_hash(query)
-    _search_cache[query_hash] = (results, time.time())
-    # 清理过期缓存
-    current_time = time.time()
-    expired_keys = [k for k, (_, t) in _search_cache.items() if current_time - t > SEARCH_CACHE_TTL]
-    for k in expired_keys:
-        del _search_cache[k]
-
 
 class ToolExecutor:
     """
@@ -151,7 +117,8 @@ class ToolExecutor:
             logging.info(f"Using fallback query: {query}")
 
         # 检查缓存
-        cached = get_cached_search(query)
+        search_cache = get_search_cache("tool_executor")
+        cached = await search_cache.aget(query, count=count)
         if cached is not None:
             return cached
 
@@ -159,7 +126,7 @@ class ToolExecutor:
         results = await asyncio.to_thread(self._websearch_sync, query, count)
 
         # 缓存结果
-        set_cached_search(query, results)
+        await search_cache.aset(query, results, count=count)
 
         return results
 
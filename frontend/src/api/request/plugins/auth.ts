@@ -4,6 +4,7 @@
 import { IRequestPlugin } from './plugin'
 
 const AUTH_STORAGE_KEY = 'auth'
+const ANONYMOUS_ID_STORAGE_KEY = 'anonymous_id'
 
 function getToken(): string | null {
   try {
@@ -18,6 +19,35 @@ function getToken(): string | null {
   return null
 }
 
+function createUUID(): string {
+  if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID()
+  }
+  // 非安全上下文（如局域网 http 访问）没有 randomUUID
+  const bytes = new Uint8Array(16)
+  crypto.getRandomValues(bytes)
+  bytes[6] = (bytes[6] & 0x0f) | 0x40
+  bytes[8] = (bytes[8] & 0x3f) | 0x80
+  const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('')
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`
+}
+
+/**
+ * 未登录用户的匿名标识（后端按它区分未登录用户的研究并发名额和会话归属）
+ */
+function getAnonymousId(): string | null {
+  try {
+    let anonymousId = localStorage.getItem(ANONYMOUS_ID_STORAGE_KEY)
+    if (!anonymousId) {
+      anonymousId = createUUID()
+      localStorage.setItem(ANONYMOUS_ID_STORAGE_KEY, anonymousId)
+    }
+    return anonymousId
+  } catch {
+    return null
+  }
+}
+
 export const authPlugin: IRequestPlugin = {
   preinstall(instance) {
     instance.interceptors.request.use(
@@ -25,6 +55,11 @@ export const authPlugin: IRequestPlugin = {
         const token = getToken()
         if (token) {
           config.headers.Authorization = `Bearer ${token}`
+        } else {
+          const anonymousId = getAnonymousId()
+          if (anonymousId) {
+            config.headers['X-Anonymous-Id'] = anonymousId
+          }
         }
         return config
       },
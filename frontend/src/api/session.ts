@@ -124,6 +124,8 @@ export function chat(
 export function deepsearch(
   params: {
     query: string
+    // 断线重连时传入 research_start / job_queued 事件返回的会话 ID
+    session_id?: string
   },
   options?: AxiosRequestConfig,
 ) {
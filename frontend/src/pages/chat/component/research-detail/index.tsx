@@ -45,7 +45,8 @@ export interface ChartConfig {
   subtitle?: string
   type: 'line' | 'bar' | 'pie' | 'horizontal_bar' | 'radar' | 'sankey' | 'wordcloud' | 'graph'
   echarts_option?: Record<string, unknown>
-  image_base64?: string  // matplotlib 生成的 base64 图片
+  image_url?: string  // matplotlib 生成的图片地址
+  image_base64?: string  // 旧版本内联的 base64 图片
 }
 
 export interface ResearchDetailData {
@@ -8,7 +8,8 @@ interface ChartConfig {
   subtitle?: string
   type: 'line' | 'bar' | 'pie' | 'horizontal_bar' | 'radar' | 'sankey' | 'wordcloud' | 'graph'
   echarts_option?: Record<string, unknown>
-  image_base64?: string  // 支持 matplotlib 生成的图片
+  image_url?: string  // matplotlib 生成的图片地址（内容寻址，可长期缓存）
+  image_base64?: string  // 旧版本内联的 base64 图片
 }
 
 interface VisualizationProps {
@@ -19,7 +20,7 @@ export default function Visualization({ charts }: VisualizationProps) {
   console.log(`[Visualization] 渲染，charts 数量: ${charts?.length || 0}`)
   if (charts?.length) {
     charts.forEach((c, i) => {
-      console.log(`[Visualization] 图表 ${i+1}: id=${c.id}, title=${c.title}, type=${c.type}, has_echarts=${!!c.echarts_option}, has_image=${!!c.image_base64}`)
+      console.log(`[Visualization] 图表 ${i+1}: id=${c.id}, title=${c.title}, type=${c.type}, has_echarts=${!!c.echarts_option}, has_image=${!!(c.image_url || c.image_base64)}`)
     })
   }
 
@@ -42,11 +43,13 @@ export default function Visualization({ charts }: VisualizationProps) {
             {chart.subtitle && <p className={styles.cardSubtitle}>{chart.subtitle}</p>}
           </div>
           <div className={styles.chartContainer}>
-            {chart.image_base64 ? (
-              // 渲染 matplotlib 生成的 base64 图片
+            {chart.image_url || chart.image_base64 ? (
+              // 渲染 matplotlib 生成的图片
               <div className={styles.imageWrapper}>
                 <img
-                  src={`data:image/png;base64,${chart.image_base64}`}
+                  src={chart.image_url
+                    ? `${import.meta.env.VITE_API_BASE || ''}${chart.image_url}`
+                    : `data:image/png;base64,${chart.image_base64}`}
                   alt={chart.title}
                   className={styles.chartImage}
                 />
@@ -92,6 +92,8 @@ export default function Index() {
   // 用于取消请求的 ref
   const readerRef = useRef<ReadableStreamDefaultReader<any> | null>(null)
   const currentSessionIdRef = useRef<string | null>(null)
+  // 深度研究的会话 ID 由服务端生成（research_start / job_queued 事件返回），取消研究时使用
+  const researchSessionIdRef = useRef<string | null>(null)
 
   // 停止生成
   const handleStop = useCallback(async () => {
@@ -108,10 +110,11 @@ export default function Index() {
       readerRef.current = null
     }
 
-    // 调用后端取消 API
-    if (currentSessionIdRef.current) {
+    // 调用后端取消 API（研究在后台运行，断开读取流不会停止研究）
+    const cancelSessionId = researchSessionIdRef.current || currentSessionIdRef.current
+    if (cancelSessionId) {
       try {
-        await api.session.cancelResearch(currentSessionIdRef.current)
+        await api.session.cancelResearch(cancelSessionId)
         console.log('[handleStop] 后端取消请求已发送')
       } catch (e) {
         console.error('[handleStop] 调用取消 API 失败:', e)
@@ -248,6 +251,7 @@ export default function Index() {
         // 存储 reader 和 session ID 用于取消
         readerRef.current = reader
         currentSessionIdRef.current = id || null
+        researchSessionIdRef.current = null
 
         await read(reader)
 
@@ -299,6 +303,11 @@ export default function Index() {
 
           const json = JSON.parse(str)
           if (target.type === ChatType.Deepsearch) {
+            // 记录服务端生成的研究会话 ID，用于取消和断线续传
+            if ((json.type === 'research_start' || json.type === 'job_queued') && json.session_id) {
+              researchSessionIdRef.current = json.session_id
+            }
+
             // 辅助函数：从 V2 格式中提取实际内容
             const extractContent = (data: any): string => {
               if (typeof data === 'string') return data
@@ -460,7 +469,7 @@ export default function Index() {
               const charts = content.charts || []
               console.log(`[前端] 收到 charts 事件，图表数量: ${charts.length}`)
               charts.forEach((c: any, i: number) => {
-                console.log(`[前端] 图表 ${i+1}: id=${c.id}, title=${c.title}, has_echarts=${!!c.echarts_option}, has_image=${!!c.image_base64}`)
+                console.log(`[前端] 图表 ${i+1}: id=${c.id}, title=${c.title}, has_echarts=${!!c.echarts_option}, has_image=${!!(c.image_url || c.image_base64)}`)
               })
 
               // 找到 analyzing 步骤（使用 ref）
@@ -753,6 +762,44 @@ export default function Index() {
                 content: `✍️ 章节「${content.section_title || '未知'}」撰写完成\n字数: ${content.word_count || 0}\n要点: ${(content.key_points || []).join('、')}`,
                 timestamp: Date.now(),
               })
+            } else if (json.type === 'section_delta') {
+              // V2 章节增量事件 - 章节生成过程中实时追加内容
+              const content = json.content || json
+              const delta = content.delta || ''
+              const writingStep = researchStepsRef.current.find(s => s.type === 'writing' || s.type === 'generating')
+              const detail = writingStep ? researchDetailsRef.current.get(writingStep.id) : undefined
+              if (delta && detail) {
+                const sectionId = content.section_id || 'section_streaming'
+                if (!detail.sections) {
+                  detail.sections = []
+                }
+                const section = detail.sections.find(s => s.id === sectionId)
+                if (section) {
+                  section.content += delta
+                  section.wordCount = section.content.length
+                } else {
+                  detail.sections.push({
+                    id: sectionId,
+                    title: content.section_title || '',
+                    content: delta,
+                    wordCount: delta.length,
+                  })
+                }
+                setSelectedResearchDetail({ ...detail })
+                setResearchDataVersion(v => v + 1)
+              }
+            } else if (json.type === 'section_reset') {
+              // V2 章节重新生成事件 - 清空之前推送的增量内容
+              const content = json.content || json
+              const writingStep = researchStepsRef.current.find(s => s.type === 'writing' || s.type === 'generating')
+              const detail = writingStep ? researchDetailsRef.current.get(writingStep.id) : undefined
+              const section = detail?.sections?.find(s => s.id === (content.section_id || 'section_streaming'))
+              if (detail && section) {
+                section.content = ''
+                section.wordCount = 0
+                setSelectedResearchDetail({ ...detail })
+                setResearchDataVersion(v => v + 1)
+              }
             } else if (json.type === 'section_content') {
               // V2 章节内容事件 - 用于"过程报告"tab的流式显示
               const content = json.content || json
@@ -950,7 +997,7 @@ export default function Index() {
               // 解包 content（后端将数据包在 content 里）
               const content = json.content || json
               console.log(`[前端] 收到 chart 事件 (单个图表)`)
-              console.log(`[前端] chart 内容: title=${content.title}, has_echarts=${!!content.echarts_option}, has_image=${!!(content.image || content.image_base64)}`)
+              console.log(`[前端] chart 内容: title=${content.title}, has_echarts=${!!content.echarts_option}, has_image=${!!(content.image_url || content.image || content.image_base64)}`)
 
               // 构建图表对象
               const chartObj = {
@@ -958,6 +1005,7 @@ export default function Index() {
                 type: content.chart_type || 'generated',
                 title: content.title || '数据图表',
                 echarts_option: content.echarts_option,
+                image_url: content.image_url,
                 image_base64: content.image || content.image_base64,
                 data: content.data,
               }